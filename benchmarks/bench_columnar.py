@@ -0,0 +1,231 @@
+"""
+Benchmark de la decodificación columnar (NumPy) frente a la escalar en lotes
+de posiciones H02 (subida de zona ciega "BC") y GPS103. Antes de medir
+verifica que ambas rutas coincidan: coordenadas de ancho atípico y frames
+grandes mezclados (decode_*_frame, la ruta que usa la ingesta).
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_columnar
+    python -m benchmarks.bench_columnar --sizes 100 1000 10000
+"""
+
+import argparse
+import math
+
+from benchmarks.timing import measure
+from src.tcp.parser.columnar import (
+    COLUMNAR_AVAILABLE,
+    COLUMNAR_MIN_MESSAGES,
+    decode_gps103_columns,
+    decode_gps103_frame,
+    decode_h02_columns,
+    decode_h02_frame,
+)
+from src.tcp.parser.gps103 import decode_gps103
+from src.tcp.parser.h02 import decode_h02
+from src.tcp.records import Position
+
+
+def h02_blind_spot_frames(count: int) -> list:
+    """Un frame por posición, como llegan los "BC" al reconectar el equipo."""
+    return [
+        (
+            f"*HQ,42099174{i % 100:02d},BC,{(i // 3600) % 24:02d}{(i // 60) % 60:02d}"
+            f"{i % 60:02d},A,12{i % 60:02d}.{1000 + i % 9000},S,077{i % 60:02d}."
+            f"{2000 + i % 8000},W,{i % 80}.50,{i % 360},{1 + i % 28:02d}0124,"
+            f"FFFFFBFF,716,10,0,0,6#"
+        ).encode("ascii")
+        for i in range(count)
+    ]
+
+
+def gps103_frames(count: int) -> list:
+    return [
+        (
+            f"imei:8640350512{i % 100000:05d},tracker,2401{1 + i % 28:02d}"
+            f"{(i // 3600) % 24:02d}{(i // 60) % 60:02d}{i % 60:02d},,F,"
+            f"123456.000,A,12{i % 60:02d}.{1000 + i % 9000},S,077{i % 60:02d}."
+            f"{2000 + i % 8000},W,{i % 80}.50,{i % 360}.00;"
+        ).encode("ascii")
+        for i in range(count)
+    ]
+
+
+def scalar_positions(decode_function, frames: list) -> list:
+    return [
+        record
+        for frame in frames
+        for record in decode_function(frame)
+        if type(record) is Position
+    ]
+
+
+def _same_positions(expected: list, actual: list) -> bool:
+    if len(expected) != len(actual):
+        return False
+    for left, right in zip(expected, actual):
+        if (left.imei, left.timestamp) != (right.imei, right.timestamp):
+            return False
+        for field in ("latitude", "longitude", "speed", "course"):
+            if not math.isclose(
+                getattr(left, field), getattr(right, field), abs_tol=1e-6
+            ):
+                return False
+    return True
+
+
+def _same_records(expected: list, actual: list) -> bool:
+    if [type(record) for record in expected] != [type(record) for record in actual]:
+        return False
+    return _same_positions(
+        [record for record in expected if type(record) is Position],
+        [record for record in actual if type(record) is Position],
+    )
+
+
+# Coordenadas con anchos atípicos: el corte grados/minutos debe ser el mismo
+# prefijo fijo ([:2]/[:3]) que usan los decodificadores escalares.
+ODD_COORDINATES = [
+    ("123.45", "7712.3"),
+    ("1.5", "12.25"),
+    ("9.99", "12.0"),
+    ("12345.6789", "077123.4567"),
+    ("0.0001", "0.0001"),
+]
+
+
+def odd_width_frames(protocol: str) -> list:
+    frames = []
+    for i, (latitude, longitude) in enumerate(ODD_COORDINATES):
+        if protocol == "h02":
+            frame = (
+                f"*HQ,42099174{i:02d},V1,120000,A,{latitude},S,{longitude},W,"
+                f"10.50,90,1{i}0124,FFFFFBFF#"
+            )
+        else:
+            frame = (
+                f"imei:86403505120000{i},tracker,24011{i}120000,,F,120000.000,A,"
+                f"{latitude},S,{longitude},W,10.50,90.00;"
+            )
+        frames.append(frame.encode("ascii"))
+    return frames
+
+
+def mixed_h02_frame(count: int) -> bytes:
+    """Frame H02 grande con posiciones, latidos, alarmas y filas inválidas."""
+    messages = []
+    for i in range(count):
+        imei = f"42099174{i % 100:02d}"
+        if i % 10 == 3:
+            messages.append(f"*HQ,{imei},V4,V1,20240101120000#")
+        elif i % 10 == 7:
+            messages.append(f"*HQ,{imei},XT,1#")
+        else:
+            latitude, longitude = ODD_COORDINATES[i % len(ODD_COORDINATES)]
+            validity = "V" if i % 13 == 0 else "A"
+            date = "320124" if i % 17 == 0 else f"{1 + i % 28:02d}0124"
+            command = "ALRM" if i % 11 == 0 else "V1"
+            messages.append(
+                f"*HQ,{imei},{command},120000,{validity},{latitude},S,{longitude},"
+                f"W,{i % 80}.50,{i % 360},{date},FFFFFBFF#"
+            )
+    return "".join(messages).encode("ascii")
+
+
+def gps103_frame(count: int, invalid_date: bool = False) -> bytes:
+    """Frame GPS103 grande con eventos, logins y latidos intercalados."""
+    expressions = []
+    for i in range(count):
+        imei = f"8640350512{i % 100000:05d}"
+        if i % 10 == 3:
+            expressions.append(f"##,imei:{imei},A;")
+        elif i % 10 == 7:
+            expressions.append(f"{imei};")
+        else:
+            latitude, longitude = ODD_COORDINATES[i % len(ODD_COORDINATES)]
+            event = "help me" if i % 11 == 0 else "tracker"
+            month = "13" if invalid_date and i == count - 1 else "01"
+            expressions.append(
+                f"imei:{imei},{event},24{month}{1 + i % 28:02d}120000,,F,"
+                f"120000.000,A,{latitude},S,{longitude},W,{i % 80}.50,"
+                f"{i % 360}.00;"
+            )
+    return "".join(expressions).encode("ascii")
+
+
+def _decode_or_error(decode_function, frame: bytes):
+    try:
+        return decode_function(frame), None
+    except ValueError as e:
+        return None, str(e)
+
+
+def verify_parity():
+    """Falla si la ruta columnar no da exactamente lo mismo que la escalar."""
+    for name, decode, decode_columns in (
+        ("h02", decode_h02, decode_h02_columns),
+        ("gps103", decode_gps103, decode_gps103_columns),
+    ):
+        frames = odd_width_frames(name)
+        expected = scalar_positions(decode, frames)
+        if not expected or not _same_positions(
+            expected, decode_columns(frames).to_records()
+        ):
+            raise SystemExit(f"Coordenadas de ancho atípico difieren en '{name}'")
+
+    size = COLUMNAR_MIN_MESSAGES * 2
+    for name, decode, decode_frame, frame in (
+        ("h02", decode_h02, decode_h02_frame, mixed_h02_frame(size)),
+        ("gps103", decode_gps103, decode_gps103_frame, gps103_frame(size)),
+        (
+            "gps103 fecha inválida",
+            decode_gps103,
+            decode_gps103_frame,
+            gps103_frame(size, invalid_date=True),
+        ),
+    ):
+        expected, expected_error = _decode_or_error(decode, frame)
+        actual, actual_error = _decode_or_error(decode_frame, frame)
+        if expected_error != actual_error or (
+            expected is not None and not _same_records(expected, actual)
+        ):
+            raise SystemExit(f"El frame columnar difiere del escalar en '{name}'")
+
+
+CASES = {
+    "h02_bc": (h02_blind_spot_frames, decode_h02, decode_h02_columns),
+    "gps103": (gps103_frames, decode_gps103, decode_gps103_columns),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    args = parser.parse_args()
+    if not COLUMNAR_AVAILABLE:
+        raise SystemExit("NumPy no está instalado.")
+    verify_parity()
+
+    print(
+        f"{'caso':<8} {'lote':>6} {'escalar µs':>11} {'columnas µs':>12} "
+        f"{'registros µs':>13} {'mejora':>7}"
+    )
+    for name, (build_frames, decode, decode_columns) in CASES.items():
+        for size in args.sizes:
+            frames = build_frames(size)
+            expected = scalar_positions(decode, frames)
+            if not _same_positions(expected, decode_columns(frames).to_records()):
+                raise SystemExit(f"La decodificación columnar difiere en '{name}'")
+            scalar_us = measure(lambda batch: scalar_positions(decode, batch), frames)
+            columns_us = measure(decode_columns, frames)
+            records_us = measure(
+                lambda batch: decode_columns(batch).to_records(), frames
+            )
+            print(
+                f"{name:<8} {size:>6} {scalar_us:>11.1f} {columns_us:>12.1f} "
+                f"{records_us:>13.1f} {scalar_us / columns_us:>6.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark de las búsquedas en el caché de dispositivos de WebSocketManager
+(índices id / uniqueid) frente a la búsqueda lineal original, por tamaño de
+flota. Con índices el costo por búsqueda no depende del tamaño de la flota.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_device_index
+    python -m benchmarks.bench_device_index --sizes 1000 20000 100000
+"""
+
+import argparse
+import asyncio
+import random
+
+from benchmarks.timing import measure
+from src.ws.ws_manager import WebSocketManager
+
+LOOKUPS_PER_CALL = 100
+
+
+def build_fleet(size: int) -> list:
+    return [
+        {
+            "id": index + 1,
+            "uniqueid": f"8640350{index:08d}",
+            "name": f"Unidad {index}",
+            "status": "online",
+        }
+        for index in range(size)
+    ]
+
+
+def legacy_get_device_by_uniqueid(devices: list, uniqueid: str) -> dict | None:
+    target_uniqueid = str(uniqueid)
+    for device in devices:
+        if device.get("uniqueid") == target_uniqueid:
+            return device
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1000, 5000, 20000, 50000]
+    )
+    args = parser.parse_args()
+
+    manager = WebSocketManager()
+    rng = random.Random(1)
+    print(
+        f"{'flota':>7} {'lineal µs':>10} {'uniqueid µs':>12} {'id µs':>8} "
+        f"{'mejora':>8}"
+    )
+    for size in args.sizes:
+        fleet = build_fleet(size)
+        asyncio.run(manager.save_devices(fleet))
+        targets = [rng.choice(fleet) for _ in range(LOOKUPS_PER_CALL)]
+        uniqueids = [device["uniqueid"] for device in targets]
+        ids = [device["id"] for device in targets]
+        for uniqueid in uniqueids:
+            if manager.get_device_by_uniqueid(uniqueid) is not (
+                legacy_get_device_by_uniqueid(fleet, uniqueid)
+            ):
+                raise SystemExit(f"El índice difiere de la búsqueda lineal ({size})")
+
+        # Microsegundos por búsqueda (cada llamada hace LOOKUPS_PER_CALL).
+        legacy_us = (
+            measure(
+                lambda keys: [legacy_get_device_by_uniqueid(fleet, k) for k in keys],
+                uniqueids,
+                min_seconds=0.2,
+            )
+            / LOOKUPS_PER_CALL
+        )
+        uniqueid_us = (
+            measure(
+                lambda keys: [manager.get_device_by_uniqueid(k) for k in keys],
+                uniqueids,
+            )
+            / LOOKUPS_PER_CALL
+        )
+        id_us = (
+            measure(lambda keys: [manager.get_device_by_id(k) for k in keys], ids)
+            / LOOKUPS_PER_CALL
+        )
+        print(
+            f"{size:>7} {legacy_us:>10.2f} {uniqueid_us:>12.3f} {id_us:>8.3f} "
+            f"{legacy_us / uniqueid_us:>7.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
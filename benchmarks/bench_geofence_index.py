@@ -0,0 +1,140 @@
+"""
+Benchmark de la evaluación de geozonas por posición según cuántas tiene
+asignadas el dispositivo: WKT parseado por geozona (check_geofence_event),
+geozonas compiladas recorridas una por una y GeofenceIndex (caja envolvente +
+grilla, prueba exacta solo de las cercanas). Verifica que los tres
+produzcan los mismos eventos. Las variantes sin estado por geozona compilada
+y por índice viven acá: en producción PositionUpdater usa
+GeofenceIndex.containing_ids() con el estado guardado por dispositivo.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_geofence_index
+    python -m benchmarks.bench_geofence_index --sizes 10 100 1000 5000
+"""
+
+import argparse
+
+from benchmarks.corpora import geofence_set_corpus
+from benchmarks.timing import measure
+from src.utils.geofence import CompiledGeofence, GeofenceIndex, check_geofence_event
+
+MOVES = 200
+# El recorrido con WKT por geozona es muy lento con muchas geozonas.
+WKT_MOVES = 20
+
+
+def position_dict(point: tuple) -> dict:
+    """(latitud, longitud) en el formato de posición de check_geofence_event."""
+    return {"latitude": point[0], "longitude": point[1]}
+
+
+def check_compiled_geofence_event(geofence, prev_position, current_position):
+    """
+    Como check_geofence_event, con una CompiledGeofence: sin parsear el WKT
+    ni construir geometrías por posición.
+
+    Returns:
+        str: "geofenceEnter", "geofenceExit" o None (si no hubo cambio)
+    """
+    prev_inside = geofence.contains(prev_position[0], prev_position[1])
+    current_inside = geofence.contains(current_position[0], current_position[1])
+    if not prev_inside and current_inside:
+        return "geofenceEnter"
+    if prev_inside and not current_inside:
+        return "geofenceExit"
+    return None
+
+
+def check_geofence_index_events(index, prev_position, current_position) -> list:
+    """
+    Transiciones de todas las geozonas de un GeofenceIndex entre dos
+    posiciones. Equivale a check_compiled_geofence_event sobre cada geozona,
+    pero solo evalúa exactamente las cercanas a cada punto.
+
+    Returns:
+        list: (CompiledGeofence, "geofenceEnter" | "geofenceExit"), en el
+        orden de las geozonas del índice.
+    """
+    prev_inside = index.containing(prev_position[0], prev_position[1])
+    current_inside = index.containing(current_position[0], current_position[1])
+    if prev_inside == current_inside:
+        return []
+    prev_set = set(prev_inside)
+    current_set = set(current_inside)
+    geofences = index.geofences
+    events = []
+    for position in sorted(prev_set.symmetric_difference(current_set)):
+        event_type = "geofenceEnter" if position in current_set else "geofenceExit"
+        events.append((geofences[position], event_type))
+    return events
+
+
+def wkt_events(areas: list, moves: list) -> list:
+    events = []
+    for prev_point, curr_point in moves:
+        prev_position = position_dict(prev_point)
+        curr_position = position_dict(curr_point)
+        for index, area in enumerate(areas):
+            event_type = check_geofence_event(area, prev_position, curr_position)
+            if event_type:
+                events.append((index, event_type))
+    return events
+
+
+def compiled_events(geofences: list, moves: list) -> list:
+    events = []
+    for prev_point, curr_point in moves:
+        for geofence in geofences:
+            event_type = check_compiled_geofence_event(geofence, prev_point, curr_point)
+            if event_type:
+                events.append((geofence.id, event_type))
+    return events
+
+
+def indexed_events(index: GeofenceIndex, moves: list) -> list:
+    events = []
+    for prev_point, curr_point in moves:
+        for geofence, event_type in check_geofence_index_events(
+            index, prev_point, curr_point
+        ):
+            events.append((geofence.id, event_type))
+    return events
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    args = parser.parse_args()
+
+    print(
+        f"{'geozonas':>8} {'WKT µs':>10} {'compiladas µs':>14} {'índice µs':>10} "
+        f"{'vs WKT':>8} {'vs compiladas':>14} {'eventos':>8}"
+    )
+    for size in args.sizes:
+        areas, moves = geofence_set_corpus(size, MOVES)
+        geofences = [CompiledGeofence(i, "", area) for i, area in enumerate(areas)]
+        index = GeofenceIndex(geofences)
+        expected = compiled_events(geofences, moves)
+        if indexed_events(index, moves) != expected:
+            raise SystemExit(f"El índice difiere de la evaluación completa ({size})")
+        if wkt_events(areas, moves[:WKT_MOVES]) != compiled_events(
+            geofences, moves[:WKT_MOVES]
+        ):
+            raise SystemExit(f"Las geozonas compiladas difieren del WKT ({size})")
+
+        # Microsegundos por posición (todas las geozonas del dispositivo).
+        wkt_us = (
+            measure(lambda m: wkt_events(areas, m), moves[:WKT_MOVES], min_seconds=0.2)
+            / WKT_MOVES
+        )
+        compiled_us = measure(lambda m: compiled_events(geofences, m), moves) / MOVES
+        indexed_us = measure(lambda m: indexed_events(index, m), moves) / MOVES
+        print(
+            f"{size:>8} {wkt_us:>10.1f} {compiled_us:>14.1f} {indexed_us:>10.1f} "
+            f"{wkt_us / indexed_us:>7.0f}x {compiled_us / indexed_us:>13.1f}x "
+            f"{len(expected):>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
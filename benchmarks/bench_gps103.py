@@ -0,0 +1,47 @@
+"""
+Micro-benchmark de decode_gps103 frente a la implementación original.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_gps103
+"""
+
+from benchmarks.legacy_parsers import legacy_decode_gps103
+from benchmarks.timing import measure
+from src.tcp.parser.gps103 import decode_gps103
+
+SAMPLE_PAYLOADS = {
+    "tracker": (
+        "imei:864035051234567,tracker,240101120000,,F,120000.000,A,"
+        "1203.12345,S,07702.12345,W,12.50,152.30;"
+    ),
+    "evento": (
+        "imei:864035051234567,acc on,240101120000,,F,120000.000,A,"
+        "1203.12345,S,07702.12345,W,0.00,0;"
+    ),
+    "conexion": "##,imei:864035051234567,A;864035051234567;",
+    "lote_20": "".join(
+        f"imei:8640350512345{i:02d},tracker,2401011200{i:02d},,F,1200{i:02d}.000,A,"
+        f"1203.{1000 + i},S,07702.{2000 + i},W,{i}.00,{i * 10}.00;"
+        for i in range(20)
+    ),
+}
+
+
+def main():
+    print(f"{'payload':<10} {'original µs':>12} {'actual µs':>10} {'mejora':>8}")
+    for name, payload in SAMPLE_PAYLOADS.items():
+        # El original recibía str; el actual recibe los bytes del pipeline.
+        raw = payload.encode("utf-8")
+        expected = legacy_decode_gps103(payload)
+        if [record.to_dict() for record in decode_gps103(raw)] != expected:
+            raise SystemExit(f"decode_gps103 difiere del original para '{name}'")
+        legacy_us = measure(legacy_decode_gps103, payload)
+        current_us = measure(decode_gps103, raw)
+        print(
+            f"{name:<10} {legacy_us:>12.2f} {current_us:>10.2f} "
+            f"{legacy_us / current_us:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Micro-benchmark de decode_h02 frente a la implementación original.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_h02
+"""
+
+from benchmarks.legacy_parsers import legacy_decode_h02
+from benchmarks.timing import measure
+from src.tcp.parser.h02 import decode_h02
+
+V1_FRAME = (
+    "*HQ,4209917484,V1,123456,A,1203.1234,S,07702.1234,W,12.50,152,170124,"
+    "FFFFFBFF,716,10,0,0,6#"
+)
+SAMPLE_PAYLOADS = {
+    "v1": V1_FRAME,
+    "conexion": "*HQ,4209917484,V4,V1,20240117123456#",
+    "lote_20": "".join(
+        f"*HQ,42099174{i:02d},V1,1234{i:02d},A,1203.{1000 + i},S,07702.{2000 + i},W,"
+        f"{i}.00,{i * 10},170124,FFFFFBFF,716,10,0,0,6#"
+        for i in range(20)
+    ),
+}
+
+
+def main():
+    print(f"{'payload':<10} {'original µs':>12} {'actual µs':>10} {'mejora':>8}")
+    for name, payload in SAMPLE_PAYLOADS.items():
+        # El original recibía str; el actual recibe los bytes del pipeline.
+        raw = payload.encode("utf-8")
+        # En los mensajes que el decodificador original soporta, el resultado es el mismo.
+        current = [record.to_dict() for record in decode_h02(raw)]
+        if current != legacy_decode_h02(payload):
+            raise SystemExit(f"decode_h02 difiere del original para '{name}'")
+        legacy_us = measure(legacy_decode_h02, payload)
+        current_us = measure(decode_h02, raw)
+        print(
+            f"{name:<10} {legacy_us:>12.2f} {current_us:>10.2f} "
+            f"{legacy_us / current_us:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Benchmark de throughput de decode_teltonika (Codec 8 / 8E).
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_teltonika
+    python -m benchmarks.bench_teltonika grabacion.bin   # paquetes grabados del puerto 6027
+
+Sin grabación se usan los ejemplos de la documentación de Teltonika y
+paquetes generados con posición y eventos. Antes de medir se verifica que
+TeltonikaFramer entregue los paquetes completos de un fragmento aunque les
+siga basura, y que un paquete sin fix GPS genere un registro de conexión.
+"""
+
+import argparse
+import struct
+import time
+
+from benchmarks.timing import measure
+from src.tcp.parser.registry import PORT_TELTONIKA
+from src.tcp.parser.teltonika import (
+    AVL_RECORD,
+    CODEC_8,
+    CODEC_8_EXTENDED,
+    TeltonikaFramer,
+    crc16_ibm,
+    decode_teltonika,
+)
+from src.tcp.parser.stream import DEFAULT_MAX_FRAME_SIZE
+from src.tcp.recorder import iter_recording
+from src.tcp.records import Connection, Position
+from src.utils import serialization
+
+IMEI = "356307042441013"
+HANDSHAKE = struct.pack(">H", len(IMEI)) + IMEI.encode("ascii")
+
+# Ejemplos publicados en la documentación del protocolo.
+DOC_CODEC_8 = (
+    "000000000000003608010000016B40D8EA30010000000000000000000000000000000105021503"
+    "010101425E0F01F10000601A014E0000000000000000010000C7CF"
+)
+DOC_CODEC_8_EXTENDED = (
+    "000000000000004A8E010000016B412CEE0001000000000000000000000000000000000100050001"
+    "00010100010011001D00010010015E2C880002000B000000003544C87A000E000000001DD7E06A"
+    "00000100002994"
+)
+
+
+def build_avl_packet(records: list, codec: int = CODEC_8) -> bytes:
+    """
+    Arma un paquete AVL con registros (timestamp_ms, lat, lon, velocidad,
+    rumbo, io_evento, valor_io_evento). Cada registro lleva un IO de 1 byte
+    (el de evento) y otro de 4 bytes, como un FMB típico.
+    """
+    extended = codec == CODEC_8_EXTENDED
+    count = ">H" if extended else ">B"
+    io_id = ">H" if extended else ">B"
+    data = bytearray(struct.pack(">BB", codec, len(records)))
+    for timestamp_ms, lat, lon, speed, course, event_io, event_value in records:
+        data += AVL_RECORD.pack(
+            timestamp_ms,
+            0,
+            round(lon * 10_000_000),
+            round(lat * 10_000_000),
+            150,
+            course,
+            9,
+            speed,
+        )
+        data += struct.pack(io_id, event_io) + struct.pack(count, 2)
+        data += struct.pack(count, 1) + struct.pack(io_id, event_io or 1)
+        data += struct.pack(">B", event_value)
+        data += struct.pack(count, 0)
+        data += (
+            struct.pack(count, 1) + struct.pack(io_id, 66) + struct.pack(">I", 12800)
+        )
+        data += struct.pack(count, 0)
+        if extended:
+            data += struct.pack(">H", 0)
+    data += struct.pack(">B", len(records))
+    return (
+        b"\x00\x00\x00\x00"
+        + struct.pack(">I", len(data))
+        + bytes(data)
+        + struct.pack(">I", crc16_ibm(data))
+    )
+
+
+def _generated_records(count: int, with_events: bool = False) -> list:
+    base_ms = 1704110400000
+    return [
+        (
+            base_ms + i * 10_000,
+            -12.05 - i * 0.0001,
+            -77.04 - i * 0.0001,
+            40 + i,
+            (i * 15) % 360,
+            239 if with_events and i % 5 == 0 else 0,
+            1,
+        )
+        for i in range(count)
+    ]
+
+
+SAMPLE_PAYLOADS = {
+    "doc_codec8": (HANDSHAKE + bytes.fromhex(DOC_CODEC_8)).hex(),
+    "doc_codec8e": (HANDSHAKE + bytes.fromhex(DOC_CODEC_8_EXTENDED)).hex(),
+    "codec8_1": (HANDSHAKE + build_avl_packet(_generated_records(1))).hex(),
+    "codec8_25": (HANDSHAKE + build_avl_packet(_generated_records(25, True))).hex(),
+    "codec8e_25": (
+        HANDSHAKE + build_avl_packet(_generated_records(25, True), CODEC_8_EXTENDED)
+    ).hex(),
+}
+
+
+def verify_framer():
+    """Paquetes completos seguidos de basura: se entregan y solo se descarta la cola."""
+    packet = build_avl_packet(_generated_records(2))
+    cases = {
+        "mismo fragmento": [HANDSHAKE + packet + b"\xff" * 8],
+        "handshake aparte": [HANDSHAKE, packet + b"\xff" * 8],
+        "dos paquetes": [HANDSHAKE, packet + packet + b"\xff" * 8],
+    }
+    for name, fragments in cases.items():
+        framer = TeltonikaFramer(DEFAULT_MAX_FRAME_SIZE)
+        positions = 0
+        for fragment in fragments:
+            complete = framer.feed(fragment.hex().encode("ascii"))
+            if complete:
+                positions += sum(
+                    type(record) is Position for record in decode_teltonika(complete)
+                )
+        expected = 2 * sum(fragment.count(packet) for fragment in fragments)
+        if positions != expected or framer.pending:
+            raise SystemExit(
+                f"TeltonikaFramer ({name}): {positions} posiciones de {expected}, "
+                f"{framer.pending} bytes pendientes."
+            )
+
+
+def verify_no_fix():
+    """Paquetes sin fix GPS (los de la documentación) generan una conexión."""
+    no_fix_cases = {
+        "codec 8": HANDSHAKE + bytes.fromhex(DOC_CODEC_8),
+        "codec 8E": HANDSHAKE + bytes.fromhex(DOC_CODEC_8_EXTENDED),
+    }
+    for name, payload in no_fix_cases.items():
+        kinds = [type(record) for record in decode_teltonika(payload.hex())]
+        if kinds != [Connection]:
+            raise SystemExit(f"Teltonika sin fix ({name}): {kinds}")
+    # Con posiciones en el mismo flujo no hace falta la conexión.
+    payload = HANDSHAKE + build_avl_packet(_generated_records(2))
+    kinds = [
+        type(record)
+        for record in decode_teltonika((payload + bytes.fromhex(DOC_CODEC_8)).hex())
+    ]
+    if Connection in kinds or Position not in kinds:
+        raise SystemExit(f"Teltonika sin fix (con posiciones): {kinds}")
+
+
+def recorded_payloads(path: str) -> list:
+    """Campo "data" de los wrappers del puerto Teltonika de una grabación."""
+    payloads = []
+    for _, wrapper in iter_recording(path):
+        try:
+            frame = serialization.loads(wrapper)
+        except ValueError:
+            continue
+        if isinstance(frame, dict) and frame.get("port") == PORT_TELTONIKA:
+            payloads.append(frame.get("data") or "")
+    return payloads
+
+
+def bench_recording(path: str):
+    payloads = recorded_payloads(path)
+    if not payloads:
+        raise SystemExit(f"{path} no tiene wrappers del puerto {PORT_TELTONIKA}.")
+    total_bytes = sum(len(payload) // 2 for payload in payloads)
+    started = time.perf_counter()
+    records = 0
+    errors = 0
+    for payload in payloads:
+        try:
+            records += len(decode_teltonika(payload))
+        except ValueError:
+            errors += 1
+    elapsed = time.perf_counter() - started
+    print(
+        f"{len(payloads)} wrappers, {records} registros, {errors} errores en "
+        f"{elapsed * 1000:.1f} ms: {len(payloads) / elapsed:,.0f} wrappers/s, "
+        f"{total_bytes / elapsed / 1e6:.1f} MB/s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("recording", nargs="?", help="Grabación de TCP_RECORD_PATH")
+    args = parser.parse_args()
+    verify_framer()
+    verify_no_fix()
+    if args.recording:
+        bench_recording(args.recording)
+        return
+    print(f"{'payload':<12} {'registros':>9} {'µs':>9} {'registros/s':>12}")
+    for name, payload in SAMPLE_PAYLOADS.items():
+        records = len(decode_teltonika(payload))
+        elapsed_us = measure(decode_teltonika, payload)
+        rate = records / elapsed_us * 1e6 if records else 0
+        print(f"{name:<12} {records:>9} {elapsed_us:>9.2f} {rate:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
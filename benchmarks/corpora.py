@@ -0,0 +1,273 @@
+"""
+Corpus representativos por protocolo para la suite de benchmarks.
+
+Cada protocolo tiene cuatro variantes, generadas de forma determinista
+(semilla fija) con los dispositivos simulados de src.tcp.loadgen:
+
+    clean        un frame válido por wrapper, como el tráfico normal
+    noisy        mezcla de posiciones, eventos, conexiones y latidos, con
+                 basura de la red entre frames
+    multi_frame  varios frames concatenados en un mismo wrapper
+    malformed    frames truncados o con caracteres alterados
+
+Los protocolos de texto tienen además la variante bulk: descargas de zona
+ciega con BULK_FRAME_COUNT posiciones por wrapper, suficientes para que
+gps103 y h02 tomen la ruta columnar de la ingesta.
+"""
+
+import random
+import struct
+
+from benchmarks.bench_teltonika import HANDSHAKE, build_avl_packet
+from src.tcp.loadgen import SimulatedDevice, corrupt_frame
+from src.tcp.parser.columnar import COLUMNAR_MIN_MESSAGES
+from src.tcp.parser.teltonika import CODEC_8, CODEC_8_EXTENDED
+
+CORPUS_SEED = 20240101
+CORPUS_SIZE = 200
+MULTI_FRAME_COUNT = 20
+BULK_FRAME_COUNT = 2 * COLUMNAR_MIN_MESSAGES
+# 2024-01-01 12:00:00 UTC: las fechas del corpus no dependen del reloj.
+CORPUS_START = 1704110400
+CORPUS_CENTER = (-12.0464, -77.0428)
+CORPUS_RADIUS_M = 15_000
+
+# Basura que el forwarder entrega a veces entre frames (saltos de línea,
+# keepalives vacíos, restos de un frame anterior).
+NETWORK_NOISE = ("\r\n", "\n", "\x00", " ", "0,0;", "#")
+
+GPS103_EVENTS = ("acc on", "acc off", "help me", "low battery", "move")
+
+
+def _devices(protocol: str, count: int, rng: random.Random) -> list:
+    return [
+        SimulatedDevice(
+            f"8640350{index:08d}",
+            protocol,
+            CORPUS_CENTER,
+            CORPUS_RADIUS_M,
+            "route",
+            rng,
+        )
+        for index in range(count)
+    ]
+
+
+def _position_frames(protocol: str, count: int, rng: random.Random) -> list:
+    devices = _devices(protocol, max(1, count // 10), rng)
+    frames = []
+    for index in range(count):
+        device = devices[index % len(devices)]
+        now = CORPUS_START + index * 10
+        device.step(now)
+        frames.append(device.build_frame(now)[0])
+    return frames
+
+
+def _gps103_extra(device: SimulatedDevice, now: float, rng: random.Random) -> str:
+    choice = rng.random()
+    if choice < 0.4:
+        return device.build_frame(now, rng.choice(GPS103_EVENTS))[0]
+    if choice < 0.7:
+        return device.login_frame()
+    return f"{device.imei};"
+
+
+def _h02_extra(device: SimulatedDevice, now: float, rng: random.Random) -> str:
+    choice = rng.random()
+    if choice < 0.3:
+        return f"*HQ,{device.imei},V4,V1,20240101{120000 + rng.randint(0, 5959):06d}#"
+    if choice < 0.6:
+        return f"*HQ,{device.imei},XT,1,100#"
+    frame = device.build_frame(now)[0]
+    if choice < 0.8:
+        # Alarma con el mismo formato de ubicación que V1.
+        return frame.replace(",V1,", ",ALRM,", 1)
+    # Sin fix GPS: el decodificador lo descarta.
+    return frame.replace(",A,", ",V,", 1)
+
+
+def _osmand_extra(device: SimulatedDevice, now: float, rng: random.Random) -> str:
+    frame = device.build_frame(now)[0]
+    return frame.replace("POST /?", "GET /?", 1).replace(
+        "\r\n\r\n", "\r\nUser-Agent: Traccar Client\r\n\r\n", 1
+    )
+
+
+_EXTRA_FRAMES = {
+    "gps103": _gps103_extra,
+    "h02": _h02_extra,
+    "osmand": _osmand_extra,
+}
+
+
+def _noisy_frames(protocol: str, count: int, rng: random.Random) -> list:
+    devices = _devices(protocol, max(1, count // 10), rng)
+    frames = []
+    for index in range(count):
+        device = devices[index % len(devices)]
+        now = CORPUS_START + index * 10
+        device.step(now)
+        if rng.random() < 0.5:
+            frame = device.build_frame(now)[0]
+        else:
+            frame = _EXTRA_FRAMES[protocol](device, now, rng)
+        if rng.random() < 0.3:
+            frame = rng.choice(NETWORK_NOISE) + frame
+        if rng.random() < 0.3:
+            frame += rng.choice(NETWORK_NOISE)
+        frames.append(frame)
+    return frames
+
+
+def text_corpus(protocol: str, variant: str, size: int = CORPUS_SIZE) -> list:
+    """Frames (bytes) de gps103, h02 u osmand para una variante."""
+    rng = random.Random(f"{CORPUS_SEED}-{protocol}-{variant}")
+    if variant == "clean":
+        frames = _position_frames(protocol, size, rng)
+    elif variant == "noisy":
+        frames = _noisy_frames(protocol, size, rng)
+    elif variant == "multi_frame":
+        positions = _position_frames(protocol, size * MULTI_FRAME_COUNT, rng)
+        frames = [
+            "".join(positions[start : start + MULTI_FRAME_COUNT])
+            for start in range(0, len(positions), MULTI_FRAME_COUNT)
+        ]
+    elif variant == "bulk":
+        # Menos wrappers: cada uno trae BULK_FRAME_COUNT posiciones.
+        positions = _position_frames(
+            protocol, max(1, size // 10) * BULK_FRAME_COUNT, rng
+        )
+        frames = [
+            "".join(positions[start : start + BULK_FRAME_COUNT])
+            for start in range(0, len(positions), BULK_FRAME_COUNT)
+        ]
+    elif variant == "malformed":
+        frames = [
+            corrupt_frame(frame, rng) for frame in _position_frames(protocol, size, rng)
+        ]
+    else:
+        raise ValueError(f"Variante de corpus desconocida: {variant}")
+    return [frame.encode("utf-8") for frame in frames]
+
+
+def _teltonika_records(rng: random.Random, count: int) -> list:
+    base_ms = CORPUS_START * 1000
+    return [
+        (
+            base_ms + index * 10_000,
+            CORPUS_CENTER[0] + rng.uniform(-0.1, 0.1),
+            CORPUS_CENTER[1] + rng.uniform(-0.1, 0.1),
+            rng.randint(0, 90),
+            rng.randint(0, 359),
+            rng.choice((0, 0, 0, 239, 252)),
+            rng.randint(0, 1),
+        )
+        for index in range(count)
+    ]
+
+
+def teltonika_corpus(variant: str, size: int = CORPUS_SIZE) -> list:
+    """Wrappers Teltonika (hexadecimal en bytes, como los entrega el forwarder)."""
+    rng = random.Random(f"{CORPUS_SEED}-teltonika-{variant}")
+    frames = []
+    for _ in range(size):
+        if variant == "clean":
+            raw = HANDSHAKE + build_avl_packet(_teltonika_records(rng, 1))
+        elif variant == "noisy":
+            codec = rng.choice((CODEC_8, CODEC_8_EXTENDED))
+            raw = HANDSHAKE
+            if rng.random() < 0.8:
+                raw += build_avl_packet(
+                    _teltonika_records(rng, rng.randint(1, 5)), codec
+                )
+        elif variant == "multi_frame":
+            raw = HANDSHAKE + b"".join(
+                build_avl_packet(_teltonika_records(rng, 5))
+                for _ in range(MULTI_FRAME_COUNT // 5)
+            )
+        elif variant == "malformed":
+            packet = bytearray(build_avl_packet(_teltonika_records(rng, 3)))
+            if rng.random() < 0.5:
+                del packet[rng.randint(10, len(packet) - 1) :]
+            else:
+                # CRC inválido: el paquete se descarta.
+                packet[-4:] = struct.pack(">I", rng.randint(0, 0xFFFF))
+            raw = HANDSHAKE + bytes(packet)
+        else:
+            raise ValueError(f"Variante de corpus desconocida: {variant}")
+        frames.append(raw.hex().encode("ascii"))
+    return frames
+
+
+def geofence_corpus(size: int = CORPUS_SIZE) -> list:
+    """(geozona, posición anterior, posición actual) con entradas, salidas y sin cambio."""
+    rng = random.Random(f"{CORPUS_SEED}-geofence")
+    center_lat, center_lon = CORPUS_CENTER
+    items = []
+    for index in range(size):
+        lat = center_lat + rng.uniform(-0.05, 0.05)
+        lon = center_lon + rng.uniform(-0.05, 0.05)
+        half = rng.uniform(0.005, 0.02)
+        if index % 2:
+            corners = [
+                (lat - half, lon - half),
+                (lat - half, lon + half),
+                (lat + half, lon + half),
+                (lat + half, lon - half),
+                (lat - half, lon - half),
+            ]
+            geofence = "POLYGON ((" + ", ".join(f"{a} {b}" for a, b in corners) + "))"
+        else:
+            geofence = f"CIRCLE ({lat} {lon}, {half * 111_320:.1f})"
+        inside = (lat + rng.uniform(-half, half) / 2, lon)
+        outside = (lat + half * 3, lon + half * 3)
+        prev_point, curr_point = rng.choice(
+            ((inside, outside), (outside, inside), (inside, inside), (outside, outside))
+        )
+        items.append((geofence, prev_point, curr_point))
+    return items
+
+
+def geofence_set_corpus(fences: int, size: int = CORPUS_SIZE) -> tuple:
+    """
+    Geozonas de un dispositivo repartidas por la ciudad y pares (posición
+    anterior, posición actual) de un recorrido, como los que evalúa
+    PositionUpdater por cada posición.
+
+    Returns:
+        tuple: (lista de áreas WKT, lista de (anterior, actual))
+    """
+    rng = random.Random(f"{CORPUS_SEED}-geofence-set-{fences}")
+    center_lat, center_lon = CORPUS_CENTER
+    spread = CORPUS_RADIUS_M / 111_320
+    areas = []
+    for index in range(fences):
+        lat = center_lat + rng.uniform(-spread, spread)
+        lon = center_lon + rng.uniform(-spread, spread)
+        half = rng.uniform(0.002, 0.01)
+        if index % 2:
+            corners = [
+                (lat - half, lon - half),
+                (lat - half, lon + half),
+                (lat + half, lon + half),
+                (lat + half, lon - half),
+                (lat - half, lon - half),
+            ]
+            areas.append(
+                "POLYGON ((" + ", ".join(f"{a} {b}" for a, b in corners) + "))"
+            )
+        else:
+            areas.append(f"CIRCLE ({lat} {lon}, {half * 111_320:.1f})")
+    lat = center_lat + rng.uniform(-spread, spread)
+    lon = center_lon + rng.uniform(-spread, spread)
+    moves = []
+    for _ in range(size):
+        # Pasos de ~100-500 m: el recorrido entra y sale de las geozonas.
+        next_lat = lat + rng.uniform(-0.004, 0.004)
+        next_lon = lon + rng.uniform(-0.004, 0.004)
+        if abs(next_lat - center_lat) > spread or abs(next_lon - center_lon) > spread:
+            next_lat, next_lon = center_lat, center_lon
+        moves.append(((lat, lon), (next_lat, next_lon)))
+        lat, lon = next_lat, next_lon
+    return areas, moves
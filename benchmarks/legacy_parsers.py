@@ -0,0 +1,307 @@
+"""
+Copias congeladas de los decodificadores originales.
+
+Sirven como referencia en los benchmarks: miden la mejora y verifican que
+los decodificadores actuales devuelven exactamente los mismos registros.
+"""
+
+import re
+from datetime import datetime, timedelta
+from src.utils.common import get_datetime_now
+
+
+def legacy_sumar_horas(fecha_str, horas):
+    # Convertir la cadena a un objeto datetime
+    fecha = datetime.strptime(fecha_str, "%Y-%m-%d %H:%M:%S")
+
+    # Sumar las horas
+    nueva_fecha = fecha + timedelta(hours=horas)
+
+    # Retornar la nueva fecha en formato de cadena
+    return nueva_fecha.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def legacy_decode_gps103(raw_data):
+    # decoder = Gps103Decoder(raw_data)
+    # return decoder.parse()
+
+    # Si el string está vacío o no contiene punto y coma, no hay expresiones válidas
+    if not raw_data or ";" not in raw_data:
+        return []
+
+    # Dividir la cadena en múltiples expresiones
+    expressions = []
+    current = ""
+
+    # Reconstruir correctamente las expresiones
+    for char in raw_data:
+        current += char
+        if char == ";":
+            expressions.append(current)
+            current = ""
+
+    # Si queda algo pendiente sin punto y coma, ignorarlo
+    results = []
+
+    # Mapeo de tipos de eventos
+    event_type_map = {
+        "acc on": "ignitionOn",
+        "acc off": "ignitionOff",
+        "help me": "sos",
+        "low battery": "lowBattery",
+        "move": "deviceMoving",
+        "speed": "deviceOverspeed",
+        "stockade": "geofenceAlarm",
+        "ac alarm": "armAlarm",
+        "acc alarm": "disarmAlarm",
+        "door alarm": "doorAlarm",
+        "sensor alarm": "alarm",
+        "accident alarm": "accidentAlarm",
+    }
+
+    for expression in expressions:
+        if not expression or not expression.endswith(";"):
+            continue
+
+        # Caso 1: Solo IMEI seguido de punto y coma (conexión simple)
+        imei_pattern = r"^(\d+);$"
+        imei_match = re.match(imei_pattern, expression)
+
+        if imei_match:
+            results.append(
+                {
+                    "type": "conexion",
+                    "imei": imei_match.group(1),
+                    "datetime": get_datetime_now(),
+                }
+            )
+            continue
+
+        # Caso 2: Conexión con formato especial (##,imei:IMEI,A;)
+        special_conn_pattern = r".*?imei:(\d+),.*?;$"
+        special_conn_match = re.match(special_conn_pattern, expression)
+
+        if (
+            special_conn_match
+            and "tracker" not in expression
+            and not any(event in expression for event in event_type_map)
+        ):
+            results.append(
+                {
+                    "type": "conexion",
+                    "imei": special_conn_match.group(1),
+                    "datetime": get_datetime_now(),
+                }
+            )
+            continue
+
+        # Caso 3: Eventos
+        event_pattern = (
+            r"imei:(\d+),(.*?),(\d{12}).*?,A,(\d+\.\d+),([NS]),(\d+\.\d+),([EW]).*?;$"
+        )
+        event_match = re.match(event_pattern, expression)
+
+        if event_match and any(
+            event in event_match.group(2) for event in event_type_map
+        ):
+            imei, event_text, datetime_str, lat, lat_dir, lon, lon_dir = (
+                event_match.groups()
+            )
+
+            # Determinar el tipo de evento
+            event_type = event_text
+            for key in event_type_map:
+                if key in event_text:
+                    event_type = event_type_map[key]
+                    break
+
+            # Formatear datetime
+            if len(datetime_str) == 12:
+                formatted_datetime = f"20{datetime_str[0:2]}-{datetime_str[2:4]}-{datetime_str[4:6]} {datetime_str[6:8]}:{datetime_str[8:10]}:{datetime_str[10:12]}"
+            else:
+                # Si el formato es diferente (como 0809231929)
+                formatted_datetime = f"20{datetime_str[0:2]}-{datetime_str[2:4]}-{datetime_str[4:6]} {datetime_str[6:8]}:{datetime_str[8:10]}:{datetime_str[10:12]}"
+
+            # Procesar latitud
+            lat_degrees = float(lat[:2])
+            lat_minutes = float(lat[2:])
+            latitude = lat_degrees + (lat_minutes / 60)
+            if lat_dir == "S":
+                latitude = -latitude
+
+            # Procesar longitud
+            lon_degrees = float(lon[:3])
+            lon_minutes = float(lon[3:])
+            longitude = lon_degrees + (lon_minutes / 60)
+            if lon_dir == "W":
+                longitude = -longitude
+
+            results.append(
+                {
+                    "type": "event",
+                    "event_type": event_type,
+                    "imei": imei,
+                    "datetime": legacy_sumar_horas(formatted_datetime, 5),
+                    "latitude": latitude,
+                    "longitude": longitude,
+                }
+            )
+            continue
+
+        # Caso 4: Posición completa (tracker)
+        position_pattern = (
+            r"imei:(\d+),tracker,(\d{12}).*?,A,(\d+\.\d+),([NS]),(\d+\.\d+),([EW]).*?;$"
+        )
+        position_match = re.match(position_pattern, expression)
+
+        if position_match:
+            imei, datetime_str, lat, lat_dir, lon, lon_dir = position_match.groups()
+
+            # Formatear datetime
+            formatted_datetime = f"20{datetime_str[0:2]}-{datetime_str[2:4]}-{datetime_str[4:6]} {datetime_str[6:8]}:{datetime_str[8:10]}:{datetime_str[10:12]}"
+
+            # Procesar latitud
+            lat_degrees = float(lat[:2])
+            lat_minutes = float(lat[2:])
+            latitude = lat_degrees + (lat_minutes / 60)
+            if lat_dir == "S":
+                latitude = -latitude
+
+            # Procesar longitud
+            lon_degrees = float(lon[:3])
+            lon_minutes = float(lon[3:])
+            longitude = lon_degrees + (lon_minutes / 60)
+            if lon_dir == "W":
+                longitude = -longitude
+
+            # Extraer velocidad y rumbo si están presentes
+            speed = 0.0
+            course = 0.0
+
+            speed_course_pattern = r",[EW],(\d+\.\d+),(\d+\.\d+)"
+            speed_course_match = re.search(speed_course_pattern, expression)
+            if speed_course_match:
+                speed = (
+                    float(speed_course_match.group(1)) * 1.852
+                )  # Convertir de nudos a km/h
+                course = float(speed_course_match.group(2))
+
+            results.append(
+                {
+                    "type": "position",
+                    "imei": imei,
+                    "datetime": legacy_sumar_horas(formatted_datetime, 5),
+                    "latitude": latitude,
+                    "longitude": longitude,
+                    "speed": speed,
+                    "course": course,
+                }
+            )
+
+    return results
+
+
+def legacy_decode_h02(full_string):
+    # decoder = H02ProtocolDecoder(full_string)
+    # return decoder.parse()
+
+    results = []
+
+    # Dividir la cadena en mensajes individuales
+    # Usamos una expresión regular para encontrar todos los mensajes que terminan con #
+    messages = re.findall(r"(?:\*?HQ,[^#]+#)", full_string)
+
+    for raw_message in messages:
+        # Verificar si el mensaje tiene el formato correcto
+        if not (
+            raw_message.startswith("*HQ,") or raw_message.startswith("HQ,")
+        ) or not raw_message.endswith("#"):
+            # print({"error": "Formato de mensaje inválido", "raw": raw_message})
+            continue
+
+        # Normalizar el mensaje (asegurar que comience con *HQ)
+        if raw_message.startswith("HQ,"):
+            raw_message = "*" + raw_message
+
+        # Caso 1: Mensaje de conexión (*HQ,numero,V4,V1,numero#)
+        connection_pattern = r"\*HQ,(\d+),V4,V1,(\d+)#"
+        connection_match = re.match(connection_pattern, raw_message)
+
+        if connection_match:
+            imei = connection_match.group(1)
+            datetime_str = connection_match.group(2)
+
+            # Formatear la fecha y hora (asumiendo formato YYYYMMDDhhmmss)
+            formatted_datetime = None
+            if len(datetime_str) == 14:
+                try:
+                    dt = datetime.strptime(datetime_str, "%Y%m%d%H%M%S")
+                    formatted_datetime = dt.strftime("%Y-%m-%d %H:%M:%S")
+                except ValueError:
+                    formatted_datetime = datetime_str
+
+            result = {
+                "type": "conexion",
+                "imei": imei,
+                "datetime": formatted_datetime or datetime_str,
+            }
+            results.append(result)
+            continue
+
+        # Caso 2: Mensaje de posición (*HQ,imei,V1,time,A,lat,S,lon,W,speed,course,date,...)
+        position_pattern = r"\*HQ,(\d+),V1,(\d{6}),A,([\d\.]+),(N|S),([\d\.]+),(E|W),([\d\.]+),(\d+),(\d{6})"
+        position_match = re.search(position_pattern, raw_message)
+
+        if position_match:
+            imei = position_match.group(1)
+            time_str = position_match.group(2)
+            lat_raw = position_match.group(3)
+            lat_dir = position_match.group(4)
+            lon_raw = position_match.group(5)
+            lon_dir = position_match.group(6)
+            speed = position_match.group(7)
+            course = position_match.group(8)
+            date_str = position_match.group(9)
+
+            # Formatear la hora (hhmmss -> hh:mm:ss)
+            formatted_time = f"{time_str[:2]}:{time_str[2:4]}:{time_str[4:6]}"
+
+            # Formatear la fecha (ddmmyy -> yyyy-mm-dd)
+            day = date_str[:2]
+            month = date_str[2:4]
+            year = "20" + date_str[4:6]
+            formatted_date = f"{year}-{month}-{day}"
+
+            # Formatear fecha y hora completa
+            formatted_datetime = f"{formatted_date} {formatted_time}"
+
+            # Procesar la latitud
+            lat_degrees = float(lat_raw[:2])
+            lat_minutes = float(lat_raw[2:])
+            latitude = lat_degrees + (lat_minutes / 60.0)
+            if lat_dir == "S":
+                latitude = -latitude
+
+            # Procesar la longitud
+            lon_degrees = float(lon_raw[:3])
+            lon_minutes = float(lon_raw[3:])
+            longitude = lon_degrees + (lon_minutes / 60.0)
+            if lon_dir == "W":
+                longitude = -longitude
+
+            result = {
+                "type": "position",
+                "imei": imei,
+                "datetime": formatted_datetime,
+                "latitude": round(latitude, 6),
+                "longitude": round(longitude, 6),
+                "speed": float(speed) * 1.852,  # Convertir de nudos a km/h
+                "course": float(course),
+            }
+            results.append(result)
+            continue
+
+        # Si no coincide con ninguno de los patrones conocidos
+        # print({"error": "Formato de mensaje no reconocido", "raw": raw_message})
+
+    return results
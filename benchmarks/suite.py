@@ -0,0 +1,508 @@
+"""
+Suite de benchmarks y regresión de rendimiento: decodificadores (gps103, h02,
+osmand, teltonika, tal como los registra la ingesta en
+build_default_registry) con corpus clean / noisy / multi_frame / malformed
+(y bulk en los protocolos de texto),
+check_geofence_event (WKT por llamada y geozona compilada), GeofenceIndex
+con las geozonas de un dispositivo, la búsqueda en el caché de dispositivos y
+el fan-out de WebSocket. Por caso reporta frames/s, latencia p50/p99 y bytes
+asignados por frame, y compara con la línea base guardada en
+benchmarks/baseline.json.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.suite                      # medir y comparar con la base
+    python -m benchmarks.suite --filter h02         # solo los casos que coinciden
+    python -m benchmarks.suite --update-baseline    # guardar la medición como base
+
+Sale con código 1 si algún caso es más lento que la base por encima de
+--tolerance (frames/s o p99) o asigna más memoria por frame por encima de
+--alloc-tolerance. Los tiempos dependen de la máquina: la base del
+repositorio sirve de referencia; para comparar un cambio en otra máquina,
+generar primero la base con --update-baseline sobre la rama sin el cambio.
+
+Los bytes por frame son deterministas: tras el calentamiento se miden con
+tracemalloc ALLOCATION_ROUNDS pasadas sobre todo el corpus (mínimo por frame),
+sin gc y con la salida descartada, independientemente de --min-seconds. Los tiempos
+se toman en TIMING_ROUNDS rondas: frames/s es la mejor ronda y p99 la mediana
+de los p99 de cada ronda. La diferencia entre la mejor y la peor ronda de cada
+métrica ("spread" y "p99_spread") se guarda en la base; la tolerancia efectiva
+de cada métrica es el mayor entre --tolerance y su spread. --update-baseline
+repite la suite BASELINE_RUNS veces y guarda la mediana de cada métrica con
+el spread mayor entre el de las rondas y el observado entre corridas (la
+máquina varía más entre corridas que dentro de una). Un caso marcado como
+regresión se vuelve a medir hasta CONFIRM_RUNS veces conservando el mejor
+frames/s y el mejor p99: una regresión real se repite en cada medición y una
+pausa pasajera de la máquina no.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+from benchmarks.bench_geofence_index import (
+    check_compiled_geofence_event,
+    check_geofence_index_events,
+    position_dict,
+)
+from benchmarks.corpora import (
+    geofence_corpus,
+    geofence_set_corpus,
+    teltonika_corpus,
+    text_corpus,
+)
+from src.tcp.parser.registry import build_default_registry
+from src.utils.geofence import CompiledGeofence, GeofenceIndex, check_geofence_event
+from src.ws.ws_manager import WebSocketManager
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+CORPUS_VARIANTS = ("clean", "noisy", "multi_frame", "malformed")
+TEXT_CORPUS_VARIANTS = (*CORPUS_VARIANTS, "bulk")
+
+DEFAULT_MIN_SECONDS = 0.5
+DEFAULT_TOLERANCE = 0.25
+DEFAULT_ALLOC_TOLERANCE = 0.10
+# Pasadas completas sobre el corpus medidas con tracemalloc (cantidad fija).
+ALLOCATION_ROUNDS = 3
+TIMING_ROUNDS = 5
+# Corridas completas de la suite al guardar la línea base.
+BASELINE_RUNS = 3
+# Remediciones de un caso marcado como regresión antes de fallar.
+CONFIRM_RUNS = 2
+
+FANOUT_CLIENTS = 2000
+FANOUT_USERS = 400
+LOOKUP_FLEET_SIZE = 20000
+INDEX_GEOFENCES = 100
+
+
+class BenchCase:
+    """function(item) se llama una vez por elemento del corpus (un "frame")."""
+
+    def __init__(self, name: str, function, items: list, is_async: bool = False):
+        self.name = name
+        self.function = function
+        self.items = items
+        self.is_async = is_async
+
+
+class _DiscardOutput(io.TextIOBase):
+    """Descarta lo que se imprime sin acumularlo (no ensucia la medición)."""
+
+    def write(self, text):
+        return len(text)
+
+
+class _NullWebSocket:
+    """Socket de prueba: el envío no hace I/O, se mide solo el fan-out."""
+
+    __slots__ = ()
+
+    async def send_frame(self, payload, message_type):
+        return None
+
+
+def _fanout_case() -> BenchCase:
+    manager = WebSocketManager()
+    manager.state_publisher = None
+    manager.clients = {
+        _NullWebSocket(): {"userid": index % FANOUT_USERS, "username": f"u{index}"}
+        for index in range(FANOUT_CLIENTS)
+    }
+    messages = [
+        (
+            user_id,
+            {
+                "type": "position",
+                "deviceid": user_id,
+                "latitude": -12.0464,
+                "longitude": -77.0428,
+                "speed": 32.5,
+                "course": 152.0,
+                "lastupdate": "2024-01-01 12:00:00",
+            },
+        )
+        for user_id in range(FANOUT_USERS)
+    ]
+
+    async def send(item):
+        user_id, message = item
+        await manager.send_to_all_clients_by_userid(user_id, message)
+
+    return BenchCase("ws_fanout", send, messages, is_async=True)
+
+
+def _device_lookup_case() -> BenchCase:
+    manager = WebSocketManager()
+    fleet = [
+        {"id": index + 1, "uniqueid": f"8640350{index:08d}"}
+        for index in range(LOOKUP_FLEET_SIZE)
+    ]
+    asyncio.run(manager.save_devices(fleet))
+    uniqueids = [device["uniqueid"] for device in fleet[:: LOOKUP_FLEET_SIZE // 200]]
+    return BenchCase("ws_device_lookup", manager.get_device_by_uniqueid, uniqueids)
+
+
+def _geofence_index_case() -> BenchCase:
+    areas, moves = geofence_set_corpus(INDEX_GEOFENCES)
+    index = GeofenceIndex(
+        [CompiledGeofence(position, "", area) for position, area in enumerate(areas)]
+    )
+    return BenchCase(
+        f"geofence.index_{INDEX_GEOFENCES}",
+        lambda move: check_geofence_index_events(index, *move),
+        moves,
+    )
+
+
+def build_cases() -> list:
+    # La misma función que corre la ingesta (p. ej. decode_h02_frame).
+    decoders = build_default_registry().specs
+    cases = []
+    for protocol in ("gps103", "h02", "osmand"):
+        for variant in TEXT_CORPUS_VARIANTS:
+            cases.append(
+                BenchCase(
+                    f"{protocol}.{variant}",
+                    decoders[protocol].decode,
+                    text_corpus(protocol, variant),
+                )
+            )
+    for variant in CORPUS_VARIANTS:
+        cases.append(
+            BenchCase(
+                f"teltonika.{variant}",
+                decoders["teltonika"].decode,
+                teltonika_corpus(variant),
+            )
+        )
+    cases.append(
+        BenchCase(
+            "geofence.check_event",
+            lambda item: check_geofence_event(*item),
+            [
+                (area, position_dict(prev_point), position_dict(curr_point))
+                for area, prev_point, curr_point in geofence_corpus()
+            ],
+        )
+    )
+    cases.append(
+        BenchCase(
+            "geofence.compiled_event",
+            lambda item: check_compiled_geofence_event(*item),
+            [
+                (CompiledGeofence(index, "", area), prev_point, curr_point)
+                for index, (area, prev_point, curr_point) in enumerate(
+                    geofence_corpus()
+                )
+            ],
+        )
+    )
+    cases.append(_geofence_index_case())
+    cases.append(_device_lookup_case())
+    cases.append(_fanout_case())
+    return cases
+
+
+def _percentile(sorted_values: list, fraction: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _time_sync(case: BenchCase, min_seconds: float) -> list:
+    function, items = case.function, case.items
+    durations = []
+    deadline = time.perf_counter() + min_seconds
+    while time.perf_counter() < deadline:
+        for item in items:
+            started = time.perf_counter_ns()
+            function(item)
+            durations.append(time.perf_counter_ns() - started)
+    return durations
+
+
+async def _time_async(case: BenchCase, min_seconds: float) -> list:
+    function, items = case.function, case.items
+    durations = []
+    deadline = time.perf_counter() + min_seconds
+    while time.perf_counter() < deadline:
+        for item in items:
+            started = time.perf_counter_ns()
+            await function(item)
+            durations.append(time.perf_counter_ns() - started)
+    return durations
+
+
+def _allocated_bytes_sync(case: BenchCase) -> list:
+    peaks = []
+    for item in case.items:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        case.function(item)
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    return peaks
+
+
+async def _allocated_bytes_async(case: BenchCase) -> list:
+    peaks = []
+    for item in case.items:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        await case.function(item)
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    return peaks
+
+
+def _measure_allocations(case: BenchCase, run) -> list:
+    """
+    Pico de bytes de cada frame del corpus: el mínimo de ALLOCATION_ROUNDS
+    pasadas. Antes corren una pasada sin medir y otra medida que se descarta
+    (llenan cachés perezosas y las estructuras de tracemalloc); el gc queda
+    apagado para que una colección no caiga dentro de un frame al azar. El
+    mínimo descarta el redimensionado periódico de cachés internas (p. ej.
+    el lru_cache de urlsplit), que cae en un frame distinto en cada pasada.
+    """
+
+    def one_round() -> list:
+        if case.is_async:
+            return run(_allocated_bytes_async(case))
+        return _allocated_bytes_sync(case)
+
+    one_round()
+    gc.collect()
+    gc.disable()
+    tracemalloc.start()
+    try:
+        one_round()
+        rounds = [one_round() for _ in range(ALLOCATION_ROUNDS)]
+    finally:
+        tracemalloc.stop()
+        gc.enable()
+    return [min(peaks) for peaks in zip(*rounds)]
+
+
+def run_case(case: BenchCase, min_seconds: float) -> dict:
+    """Mide un caso: frames/s, latencias p50/p99 (µs) y bytes asignados por frame."""
+    loop = asyncio.new_event_loop() if case.is_async else None
+    run = loop.run_until_complete if loop is not None else None
+    # decode_osmand informa los registros malformados con print().
+    with contextlib.redirect_stdout(_DiscardOutput()):
+        try:
+            peaks = _measure_allocations(case, run)
+            durations = []
+            rates = []
+            round_p99s = []
+            for _ in range(TIMING_ROUNDS):
+                gc.collect()
+                if run is not None:
+                    round_durations = run(
+                        _time_async(case, min_seconds / TIMING_ROUNDS)
+                    )
+                else:
+                    round_durations = _time_sync(case, min_seconds / TIMING_ROUNDS)
+                rates.append(len(round_durations) / (sum(round_durations) / 1e9))
+                round_durations.sort()
+                round_p99s.append(_percentile(round_durations, 0.99))
+                durations.extend(round_durations)
+        finally:
+            if loop is not None:
+                loop.close()
+    durations.sort()
+    return {
+        "frames_per_second": round(max(rates), 1),
+        "p50_us": round(_percentile(durations, 0.50) / 1000, 2),
+        "p99_us": round(statistics.median(round_p99s) / 1000, 2),
+        "spread": round(max(rates) / min(rates) - 1, 2),
+        "p99_spread": round(max(round_p99s) / min(round_p99s) - 1, 2),
+        "bytes_per_frame": round(sum(peaks) / len(peaks)),
+    }
+
+
+def _spread(values: list) -> float:
+    return max(values) / min(values) - 1
+
+
+def merge_runs(runs: list) -> dict:
+    """Mediana de cada métrica de varias corridas de un caso, con su spread."""
+    if len(runs) == 1:
+        return runs[0]
+    rates = [run["frames_per_second"] for run in runs]
+    p99s = [run["p99_us"] for run in runs]
+    return {
+        "frames_per_second": round(statistics.median(rates), 1),
+        "p50_us": round(statistics.median(run["p50_us"] for run in runs), 2),
+        "p99_us": round(statistics.median(p99s), 2),
+        "spread": round(max(_spread(rates), *(run["spread"] for run in runs)), 2),
+        "p99_spread": round(
+            max(_spread(p99s), *(run["p99_spread"] for run in runs)), 2
+        ),
+        # Determinista: igual en todas las corridas.
+        "bytes_per_frame": max(run["bytes_per_frame"] for run in runs),
+    }
+
+
+def best_of(result: dict, retry: dict) -> dict:
+    """Combina una remedición con la medición previa del mismo caso."""
+    return {
+        **result,
+        "frames_per_second": max(
+            result["frames_per_second"], retry["frames_per_second"]
+        ),
+        "p99_us": min(result["p99_us"], retry["p99_us"]),
+    }
+
+
+def compare_with_baseline(
+    results: dict, baseline: dict, tolerance: float, alloc_tolerance: float
+) -> list:
+    """Devuelve las regresiones como textos "caso: métrica base -> actual"."""
+    regressions = []
+    for name, current in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        # Un caso que ya variaba mucho al guardar la base no falla por ruido.
+        rate_tolerance = max(tolerance, reference.get("spread", 0.0))
+        p99_tolerance = max(tolerance, reference.get("p99_spread", 0.0))
+        if current["frames_per_second"] < reference["frames_per_second"] * (
+            1 - rate_tolerance
+        ):
+            regressions.append(
+                f"{name}: frames/s {reference['frames_per_second']:,.0f} -> "
+                f"{current['frames_per_second']:,.0f}"
+            )
+        if current["p99_us"] > reference["p99_us"] * (1 + p99_tolerance):
+            regressions.append(
+                f"{name}: p99 {reference['p99_us']:.2f} µs -> {current['p99_us']:.2f} µs"
+            )
+        if current["bytes_per_frame"] > reference["bytes_per_frame"] * (
+            1 + alloc_tolerance
+        ):
+            regressions.append(
+                f"{name}: bytes/frame {reference['bytes_per_frame']} -> "
+                f"{current['bytes_per_frame']}"
+            )
+    return regressions
+
+
+def load_baseline(path: str) -> dict:
+    try:
+        with open(path, encoding="utf-8") as baseline_file:
+            return json.load(baseline_file).get("cases", {})
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(path: str, results: dict):
+    document = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cases": results,
+    }
+    with open(path, "w", encoding="utf-8") as baseline_file:
+        json.dump(document, baseline_file, indent=2, sort_keys=True)
+        baseline_file.write("\n")
+
+
+def _change(current: float, reference: float | None) -> str:
+    if not reference:
+        return "-"
+    return f"{(current - reference) / reference * 100:+.0f}%"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--filter", default="", help="Subcadena del nombre del caso")
+    parser.add_argument("--min-seconds", type=float, default=DEFAULT_MIN_SECONDS)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument(
+        "--alloc-tolerance", type=float, default=DEFAULT_ALLOC_TOLERANCE
+    )
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument(
+        "--runs",
+        type=int,
+        help=f"Corridas completas (por defecto {BASELINE_RUNS} con --update-baseline, 1 sin)",
+    )
+    args = parser.parse_args(argv)
+    runs = args.runs or (BASELINE_RUNS if args.update_baseline else 1)
+
+    baseline = load_baseline(args.baseline)
+    cases = [case for case in build_cases() if args.filter in case.name]
+    measurements = {case.name: [] for case in cases}
+    # Corridas completas (no repeticiones seguidas de cada caso) para que
+    # el spread entre corridas refleje cómo varía la máquina en el tiempo.
+    for run_index in range(runs):
+        if runs > 1:
+            print(f"Corrida {run_index + 1}/{runs}...", file=sys.stderr)
+        for case in cases:
+            measurements[case.name].append(run_case(case, args.min_seconds))
+
+    results = {}
+    print(
+        f"{'caso':<22} {'frames/s':>11} {'Δ':>6} {'±':>5} {'p50 µs':>8} "
+        f"{'p99 µs':>8} {'Δ':>6} {'±':>5} {'bytes/frame':>11}"
+    )
+    for case in cases:
+        result = merge_runs(measurements[case.name])
+        results[case.name] = result
+        reference = baseline.get(case.name, {})
+        print(
+            f"{case.name:<22} {result['frames_per_second']:>11,.0f} "
+            f"{_change(result['frames_per_second'], reference.get('frames_per_second')):>6} "
+            f"{result['spread'] * 100:>4.0f}% {result['p50_us']:>8.2f} {result['p99_us']:>8.2f} "
+            f"{_change(result['p99_us'], reference.get('p99_us')):>6} "
+            f"{result['p99_spread'] * 100:>4.0f}% {result['bytes_per_frame']:>11,}"
+        )
+
+    if args.update_baseline:
+        if args.filter:
+            # Actualizar solo los casos medidos y conservar el resto.
+            results = {**baseline, **results}
+        save_baseline(args.baseline, results)
+        print(f"Línea base guardada en {args.baseline}.")
+        return 0
+    if not baseline:
+        print("Sin línea base: ejecutar con --update-baseline para crearla.")
+        return 0
+    for _ in range(CONFIRM_RUNS):
+        flagged = [
+            case
+            for case in cases
+            if compare_with_baseline(
+                {case.name: results[case.name]},
+                baseline,
+                args.tolerance,
+                args.alloc_tolerance,
+            )
+        ]
+        if not flagged:
+            break
+        print(f"Volviendo a medir {', '.join(case.name for case in flagged)}...")
+        for case in flagged:
+            results[case.name] = best_of(
+                results[case.name], run_case(case, args.min_seconds)
+            )
+    regressions = compare_with_baseline(
+        results, baseline, args.tolerance, args.alloc_tolerance
+    )
+    if regressions:
+        print("\nRegresiones respecto de la línea base:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print("\nSin regresiones respecto de la línea base.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,21 @@
+import time
+
+
+def measure(function, payload, min_seconds: float = 0.5) -> float:
+    """Devuelve microsegundos por llamada (mejor de 3 rondas)."""
+    iterations = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(iterations):
+            function(payload)
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds / 5:
+            break
+        iterations *= 2
+    best = elapsed
+    for _ in range(2):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            function(payload)
+        best = min(best, time.perf_counter() - started)
+    return best / iterations * 1e6
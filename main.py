@@ -1,16 +1,30 @@
 import asyncio
 import logging
+import os
 from src.tcp.tcp_server import TCPServer
+from src.tcp.cluster import (
+    BrokerControl,
+    ClusterStateReceiver,
+    start_broker_processes,
+    stop_broker_processes,
+)
 from src.ws.ws_server import WebSocketServer
 from src.utils.logger_config import setup_logging
 
 setup_logging()  # Configurar logging al inicio
 logger = logging.getLogger(__name__)
 
+# Número de procesos del broker TCP. Con más de 1, el broker corre en procesos
+# aparte (SO_REUSEPORT) y este proceso solo sirve WebSocket/HTTP.
+BROKER_PROCESSES = int(os.getenv("BROKER_PROCESSES", 1))
+
 
 async def main():
-    tcp_server = TCPServer()
+    tcp_server = TCPServer() if BROKER_PROCESSES <= 1 else None
     ws_server = WebSocketServer()
+    state_receiver = None
+    broker_control = None
+    broker_processes = []
 
     # Crear una lista de tareas a ejecutar y limpiar
     server_tasks = []
@@ -18,8 +32,16 @@ async def main():
         logger.info("Iniciando servidores TCP y WebSocket...")
 
         # Crear tareas para cada servidor
-        tcp_task = asyncio.create_task(tcp_server.start(), name="TCPServerTask")
-        server_tasks.append(tcp_task)
+        if tcp_server:
+            tcp_task = asyncio.create_task(tcp_server.start(), name="TCPServerTask")
+            server_tasks.append(tcp_task)
+        else:
+            state_receiver = ClusterStateReceiver(ws_server.ws_manager)
+            await state_receiver.start()
+            broker_control = BrokerControl(BROKER_PROCESSES)
+            broker_control.start()
+            ws_server.broker_control = broker_control
+            broker_processes = start_broker_processes(BROKER_PROCESSES)
 
         ws_task = asyncio.create_task(ws_server.start(), name="WebSocketServerTask")
         server_tasks.append(ws_task)
@@ -53,6 +75,14 @@ async def main():
             await asyncio.gather(*server_tasks, return_exceptions=True)
             logger.info("Tareas de servidor finalizadas o canceladas.")
 
+        if broker_processes:
+            await asyncio.to_thread(stop_broker_processes, broker_processes)
+            logger.info("Procesos del broker TCP detenidos.")
+        if state_receiver:
+            await state_receiver.stop()
+        if broker_control:
+            await broker_control.stop()
+
         # Limpieza específica de recursos de cada servidor
         # TCPServer cierra su sesión HTTP en su propio finally de start()
         if tcp_server and tcp_server.event_notifier:
@@ -19,29 +19,22 @@ class DeviceGeofenceController:
         }
         self.db = Database(**self.db_config)
 
-    def get_geofences(self, device_id):
-        connection = (
-            self.db.get_connection()
-        )
+    def get_all_device_geofences(self):
+        """Todas las asignaciones dispositivo-geozona en una sola consulta (carga masiva)."""
+        connection = self.db.get_connection()
         if connection and connection.is_connected():
             try:
                 cursor = connection.cursor(dictionary=True)
-                query = "SELECT g.name, g.area FROM tc_device_geofence dg JOIN tc_geofences g ON dg.geofenceid = g.id WHERE dg.deviceid = %s"
-                cursor.execute(query, (device_id,))
-                geofences = (
-                    cursor.fetchall()
-                )
+                query = "SELECT dg.deviceid, g.id AS geofenceid, g.name, g.area FROM tc_device_geofence dg JOIN tc_geofences g ON dg.geofenceid = g.id"
+                cursor.execute(query)
+                rows = cursor.fetchall()
                 cursor.close()
-                return geofences
+                return rows
             except mysql.connector.Error as e:
-                logger.error(
-                    f"Error de BD en get_geofences para device_id {device_id}: {e}"
-                )
+                logger.error(f"Error de BD en get_all_device_geofences: {e}")
                 self.db.close_connection()
                 return None
-        logger.warning(
-            f"get_geofences: No se pudo obtener conexión para device_id {device_id}"
-        )
+        logger.warning("get_all_device_geofences: No se pudo obtener conexión")
         return None
 
     def close(self):
@@ -0,0 +1,330 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import struct
+import zlib
+
+from src.utils import serialization
+
+logger = logging.getLogger(__name__)
+
+# Modo multi-proceso: N workers del broker comparten el puerto JSON con
+# SO_REUSEPORT. Cada IMEI pertenece a un único worker (crc32(imei) % N), que
+# mantiene el estado de ese dispositivo. Los frames que llegan a otro worker se
+# reenvían al dueño por un socket Unix local, y los cambios de estado se
+# publican al proceso del servidor WebSocket. En sentido inverso, el proceso
+# WebSocket envía operaciones de control (p. ej. invalidar cachés) al socket
+# de control de cada worker.
+DEFAULT_CLUSTER_SOCKET_DIR = "/tmp/ws-interceptor"
+FRAME_HEADER = struct.Struct("!I")
+MAX_CLUSTER_FRAME_SIZE = 10 * 1024 * 1024
+MAX_PENDING_MESSAGES = 10000
+RECONNECT_DELAY = 1.0  # segundos
+
+OP_DEVICE_STATE = "device"
+OP_USER_MESSAGE = "user"
+# Del proceso WebSocket a cada worker: recargar el caché indicado en "target".
+OP_INVALIDATE = "invalidate"
+INVALIDATE_DEVICES = "devices"
+INVALIDATE_GEOFENCES = "geofences"
+
+
+def owner_for_imei(imei: str | bytes, worker_count: int) -> int:
+    if isinstance(imei, str):
+        imei = imei.encode()
+    return zlib.crc32(imei) % worker_count
+
+
+def worker_socket_path(socket_dir: str, worker_index: int) -> str:
+    return os.path.join(socket_dir, f"broker-{worker_index}.sock")
+
+
+def worker_control_socket_path(socket_dir: str, worker_index: int) -> str:
+    return os.path.join(socket_dir, f"broker-{worker_index}-control.sock")
+
+
+def ws_tier_socket_path(socket_dir: str) -> str:
+    return os.path.join(socket_dir, "ws-tier.sock")
+
+
+async def start_unix_listener(path: str, handler):
+    """Crea el socket Unix en path (eliminando uno huérfano de una ejecución previa)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        os.unlink(path)
+    return await asyncio.start_unix_server(
+        handler, path=path, limit=MAX_CLUSTER_FRAME_SIZE
+    )
+
+
+async def read_cluster_frames(reader: asyncio.StreamReader):
+    """Itera los mensajes con prefijo de longitud de un socket del clúster."""
+    while True:
+        try:
+            header = await reader.readexactly(FRAME_HEADER.size)
+            (frame_length,) = FRAME_HEADER.unpack(header)
+            if frame_length > MAX_CLUSTER_FRAME_SIZE:
+                logger.error(
+                    f"Mensaje de clúster de {frame_length} bytes excede el máximo. Cerrando."
+                )
+                return
+            yield await reader.readexactly(frame_length)
+        except asyncio.IncompleteReadError:
+            return
+
+
+async def serve_cluster_messages(reader, writer, apply):
+    """Aplica con apply(mensaje) cada mensaje JSON de una conexión del clúster."""
+    try:
+        async for payload in read_cluster_frames(reader):
+            try:
+                await apply(serialization.loads(payload))
+            except Exception as e:
+                logger.error(f"Error aplicando mensaje del clúster: {e}", exc_info=True)
+    finally:
+        writer.close()
+
+
+class PeerLink:
+    """
+    Conexión saliente persistente hacia un socket Unix del clúster.
+
+    send() nunca bloquea: encola el mensaje y una tarea lo escribe,
+    reconectando si el otro extremo se reinicia. Si la cola se llena, el
+    mensaje se descarta y se contabiliza.
+    """
+
+    def __init__(self, path: str, name: str):
+        self.path = path
+        self.name = name
+        self.dropped = 0
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=MAX_PENDING_MESSAGES)
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name=f"PeerLink-{self.name}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def send(self, payload: bytes):
+        try:
+            self._queue.put_nowait(FRAME_HEADER.pack(len(payload)) + payload)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning(
+                    f"Cola hacia {self.name} llena: {self.dropped} mensajes descartados."
+                )
+
+    async def _run(self):
+        while True:
+            try:
+                _, writer = await asyncio.open_unix_connection(self.path)
+            except OSError:
+                await asyncio.sleep(RECONNECT_DELAY)
+                continue
+            logger.info(f"Conectado a {self.name} ({self.path}).")
+            try:
+                while True:
+                    writer.write(await self._queue.get())
+                    # Escribir todo lo pendiente antes de esperar al drain.
+                    while not self._queue.empty():
+                        writer.write(self._queue.get_nowait())
+                    await writer.drain()
+            except (ConnectionError, OSError) as e:
+                logger.warning(f"Conexión con {self.name} perdida: {e}. Reintentando.")
+            finally:
+                writer.close()
+
+
+class BrokerCluster:
+    """Pertenencia de IMEIs y enlaces de un worker del broker con el resto del clúster."""
+
+    def __init__(
+        self, worker_index: int, worker_count: int, socket_dir: str | None = None
+    ):
+        self.worker_index = worker_index
+        self.worker_count = worker_count
+        self.socket_dir = socket_dir or os.getenv(
+            "CLUSTER_SOCKET_DIR", DEFAULT_CLUSTER_SOCKET_DIR
+        )
+        self.peers = {
+            index: PeerLink(
+                worker_socket_path(self.socket_dir, index), f"broker-{index}"
+            )
+            for index in range(worker_count)
+            if index != worker_index
+        }
+        self.state_link = PeerLink(ws_tier_socket_path(self.socket_dir), "ws-tier")
+        self._server: asyncio.AbstractServer | None = None
+        self._control_server: asyncio.AbstractServer | None = None
+
+    def owner_for_imei(self, imei: str | bytes) -> int:
+        return owner_for_imei(imei, self.worker_count)
+
+    def forward_frame(self, owner_index: int, device_port: int, raw_gps_data: bytes):
+        # El wrapper es JSON: el frame vuelve a str solo para reenviarlo.
+        data = raw_gps_data.decode("utf-8", errors="replace")
+        self.peers[owner_index].send(
+            serialization.dumps({"port": device_port, "data": data})
+        )
+
+    def publish_state(self, message: dict):
+        self.state_link.send(serialization.dumps(message))
+
+    async def start(self, forwarded_connection_handler, apply_control=None):
+        """apply_control(mensaje) recibe las operaciones del proceso WebSocket."""
+        self._server = await start_unix_listener(
+            worker_socket_path(self.socket_dir, self.worker_index),
+            forwarded_connection_handler,
+        )
+        if apply_control is not None:
+            self._control_server = await start_unix_listener(
+                worker_control_socket_path(self.socket_dir, self.worker_index),
+                lambda reader, writer: serve_cluster_messages(
+                    reader, writer, apply_control
+                ),
+            )
+        for link in self.peers.values():
+            link.start()
+        self.state_link.start()
+        logger.info(
+            f"Worker {self.worker_index}/{self.worker_count} del broker unido al clúster en {self.socket_dir}."
+        )
+
+    async def stop(self):
+        for link in [*self.peers.values(), self.state_link]:
+            await link.stop()
+        for server in (self._server, self._control_server):
+            if server is not None:
+                server.close()
+                await server.wait_closed()
+        self._server = None
+        self._control_server = None
+
+
+class BrokerControl:
+    """
+    Enlaces del proceso WebSocket hacia el socket de control de cada worker.
+
+    Los cachés contra los que se evalúan las posiciones (dispositivos,
+    geozonas) viven en cada worker; los endpoints de actualización los
+    invalidan por acá. Si un worker está reiniciando, PeerLink guarda el
+    mensaje hasta reconectar.
+    """
+
+    def __init__(self, worker_count: int, socket_dir: str | None = None):
+        socket_dir = socket_dir or os.getenv(
+            "CLUSTER_SOCKET_DIR", DEFAULT_CLUSTER_SOCKET_DIR
+        )
+        self.links = [
+            PeerLink(
+                worker_control_socket_path(socket_dir, index),
+                f"broker-{index}-control",
+            )
+            for index in range(worker_count)
+        ]
+
+    def start(self):
+        for link in self.links:
+            link.start()
+
+    async def stop(self):
+        for link in self.links:
+            await link.stop()
+
+    def invalidate(self, target: str):
+        payload = serialization.dumps({"op": OP_INVALIDATE, "target": target})
+        for link in self.links:
+            link.send(payload)
+
+
+class ClusterStateReceiver:
+    """Aplica en el proceso WebSocket los cambios publicados por los workers del broker."""
+
+    def __init__(self, ws_manager, socket_dir: str | None = None):
+        self.ws_manager = ws_manager
+        self.socket_dir = socket_dir or os.getenv(
+            "CLUSTER_SOCKET_DIR", DEFAULT_CLUSTER_SOCKET_DIR
+        )
+        self._server: asyncio.AbstractServer | None = None
+
+    async def start(self):
+        self._server = await start_unix_listener(
+            ws_tier_socket_path(self.socket_dir), self._handle_connection
+        )
+        logger.info(f"Receptor de estado del clúster escuchando en {self.socket_dir}.")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_connection(self, reader, writer):
+        await serve_cluster_messages(reader, writer, self._apply)
+
+    async def _apply(self, message: dict):
+        op = message.get("op")
+        if op == OP_DEVICE_STATE:
+            self.ws_manager.apply_device_state(message.get("device") or {})
+        elif op == OP_USER_MESSAGE:
+            await self.ws_manager.send_to_all_clients_by_userid(
+                message.get("userid"), message.get("message")
+            )
+        else:
+            logger.warning(f"Operación de clúster desconocida: {op}")
+
+
+def _run_broker_worker(worker_index: int, worker_count: int):
+    """Punto de entrada de cada proceso worker del broker."""
+    from src.utils.logger_config import setup_logging
+
+    setup_logging()
+    try:
+        asyncio.run(_broker_worker_main(worker_index, worker_count))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _broker_worker_main(worker_index: int, worker_count: int):
+    from src.tcp.tcp_server import TCPServer
+
+    # terminate() del proceso padre cancela la tarea para que start() limpie recursos.
+    asyncio.get_running_loop().add_signal_handler(
+        signal.SIGTERM, asyncio.current_task().cancel
+    )
+    tcp_server = TCPServer(cluster=BrokerCluster(worker_index, worker_count))
+    await tcp_server.ws_manager._load_initial_devices_cache()
+    await tcp_server.start()
+
+
+def start_broker_processes(worker_count: int) -> list:
+    """Lanza worker_count procesos del broker que comparten el puerto con SO_REUSEPORT."""
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    for worker_index in range(worker_count):
+        process = context.Process(
+            target=_run_broker_worker,
+            args=(worker_index, worker_count),
+            name=f"BrokerWorker-{worker_index}",
+        )
+        process.start()
+        processes.append(process)
+    logger.info(f"{worker_count} procesos del broker TCP iniciados.")
+    return processes
+
+
+def stop_broker_processes(processes: list, timeout: float = 10.0):
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+    for process in processes:
+        process.join(timeout)
@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DECODE_CHUNK_SIZE = 64
+
+
+def decode_frames_chunk(jobs: list) -> list:
+    """
+    Decodifica un lote de frames. Se ejecuta en el proceso del pool o inline.
+
+    Args:
+        jobs (list): Tuplas (decoder_function, raw_data). Las funciones de los
+            parsers son de módulo, así que se serializan por referencia.
+
+    Returns:
+        list: Por cada frame, (True, registros) o (False, "descripción del error").
+            Solo viajan de vuelta los dicts normalizados, nunca el texto crudo.
+    """
+    results = []
+    for decoder_function, raw_data in jobs:
+        try:
+            results.append((True, decoder_function(raw_data)))
+        except Exception as e:
+            results.append((False, f"{type(e).__name__}: {e}"))
+    return results
+
+
+class DecodePool:
+    """
+    Decodificación de protocolos fuera del event loop.
+
+    Con processes > 0 los lotes se decodifican en un ProcessPoolExecutor para
+    que una ráfaga de frames no congele el loop (y con él los envíos por
+    WebSocket). Con processes = 0, o si el pool se rompe, se decodifica inline.
+    """
+
+    def __init__(self, processes: int = 0, chunk_size: int = DEFAULT_DECODE_CHUNK_SIZE):
+        self.processes = max(0, processes)
+        self.chunk_size = max(1, chunk_size)
+        self._executor: ProcessPoolExecutor | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._executor is not None
+
+    def start(self):
+        if self.processes == 0 or self._executor is not None:
+            return
+        # "spawn" evita heredar el estado del loop y los sockets del proceso padre.
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        logger.info(
+            f"Pool de decodificación iniciado con {self.processes} procesos (lotes de {self.chunk_size})."
+        )
+
+    async def decode(self, jobs: list) -> list:
+        if self._executor is None:
+            return decode_frames_chunk(jobs)
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor, decode_frames_chunk, jobs)
+        except BrokenProcessPool:
+            logger.error(
+                "Pool de decodificación roto. Se continúa decodificando inline."
+            )
+            self.shutdown()
+            return decode_frames_chunk(jobs)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            logger.info("Pool de decodificación detenido.")
@@ -0,0 +1,575 @@
+"""
+Generador de carga sintética para el broker JSON (puerto 7005).
+
+Simula una flota de dispositivos GPS103, H02 y OsmAnd que se mueven por
+caminatas aleatorias o rutas cerradas, y envía sus frames envueltos en
+{"port", "data"} al broker. Opcionalmente conecta clientes WebSocket para
+medir la demora extremo a extremo (frame enviado -> posición vista por el
+cliente). Los IMEIs deben existir en Traccar para que las posiciones
+lleguen a los clientes WebSocket.
+
+Uso:
+    python -m src.tcp.loadgen --devices 5000 --interval 10 --duration 120
+    python -m src.tcp.loadgen --devices 2000 --mix gps103=2,h02=1,osmand=1 \\
+        --event-ratio 0.01 --malformed-ratio 0.001 --framing newline \\
+        --ws-url "ws://127.0.0.1:7006/?u=usuario&p=clave"
+"""
+
+import argparse
+import asyncio
+import heapq
+import logging
+import math
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from src.tcp.parser.registry import PORT_COBAN, PORT_SINOTRACK, PORT_TRACCAR_CLIENT
+from src.tcp.pipeline_stats import StageLatency
+from src.tcp.replay import REPLAY_FRAMINGS, encode_for_framing
+from src.utils import serialization
+
+logger = logging.getLogger(__name__)
+
+PROTOCOL_PORTS = {
+    "gps103": PORT_COBAN,
+    "h02": PORT_SINOTRACK,
+    "osmand": PORT_TRACCAR_CLIENT,
+}
+
+# Eventos GPS103 que el decodificador reconoce (palabra clave del frame).
+DEFAULT_EVENT_MIX = "acc on=4,acc off=4,low battery=1,help me=0.2"
+# Los equipos GPS103 reportan en hora de Perú; el decodificador suma 5 horas.
+GPS103_UTC_OFFSET = timedelta(hours=-5)
+
+KNOTS_PER_KMH = 1 / 1.852
+EARTH_METERS_PER_DEGREE = 111_320.0
+MAX_PENDING_POSITIONS_PER_DEVICE = 64
+
+
+def parse_weights(value: str) -> dict[str, float]:
+    """Convierte "a=1,b=0.5" en {"a": 1.0, "b": 0.5}."""
+    weights = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        name, _, weight = item.partition("=")
+        weights[name.strip()] = float(weight) if weight else 1.0
+    return weights
+
+
+def format_nmea_coordinate(value: float, degree_digits: int) -> tuple[str, float]:
+    """
+    Formatea grados decimales como (d)ddmm.mmmm y devuelve también el valor
+    que obtendrá el decodificador a partir de ese texto.
+    """
+    degrees = int(abs(value))
+    minutes = round((abs(value) - degrees) * 60, 4)
+    if minutes >= 60:
+        degrees, minutes = degrees + 1, 0.0
+    text = f"{degrees:0{degree_digits}d}{minutes:07.4f}"
+    decoded = float(text[:degree_digits]) + float(text[degree_digits:]) / 60
+    return text, decoded
+
+
+class SimulatedDevice:
+    """Estado de movimiento de un dispositivo simulado."""
+
+    def __init__(
+        self,
+        imei: str,
+        protocol: str,
+        center: tuple[float, float],
+        radius_m: float,
+        path_mode: str,
+        rng: random.Random,
+    ):
+        self.imei = imei
+        self.protocol = protocol
+        self.port = PROTOCOL_PORTS[protocol]
+        self.rng = rng
+        self.path_mode = path_mode
+        self.center = center
+        self.radius_m = radius_m
+        self.latitude, self.longitude = self._random_point()
+        self.course = rng.uniform(0, 360)
+        self.speed_kmh = rng.uniform(0, 60)
+        self.route = []
+        self.route_index = 0
+        if path_mode == "route":
+            self.route = [self._random_point() for _ in range(rng.randint(4, 12))]
+            self.latitude, self.longitude = self.route[0]
+            self.route_index = 1
+        self.last_step_at = None
+
+    def _random_point(self) -> tuple[float, float]:
+        distance = self.radius_m * math.sqrt(self.rng.random())
+        bearing = self.rng.uniform(0, 2 * math.pi)
+        return self._offset(self.center, distance, bearing)
+
+    @staticmethod
+    def _offset(origin, distance_m: float, bearing_rad: float) -> tuple[float, float]:
+        latitude, longitude = origin
+        d_lat = distance_m * math.cos(bearing_rad) / EARTH_METERS_PER_DEGREE
+        d_lon = (
+            distance_m
+            * math.sin(bearing_rad)
+            / (EARTH_METERS_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+        )
+        return latitude + d_lat, longitude + d_lon
+
+    def step(self, now: float):
+        """Avanza la posición según el tiempo transcurrido desde el último reporte."""
+        elapsed = 0.0 if self.last_step_at is None else now - self.last_step_at
+        self.last_step_at = now
+        # Paradas ocasionales para generar reportes con velocidad 0.
+        if self.rng.random() < 0.05:
+            self.speed_kmh = 0.0 if self.speed_kmh else self.rng.uniform(10, 60)
+        distance = self.speed_kmh / 3.6 * elapsed
+        if self.path_mode == "route":
+            target = self.route[self.route_index]
+            d_lat = (target[0] - self.latitude) * EARTH_METERS_PER_DEGREE
+            d_lon = (
+                (target[1] - self.longitude)
+                * EARTH_METERS_PER_DEGREE
+                * math.cos(math.radians(self.latitude))
+            )
+            remaining = math.hypot(d_lat, d_lon)
+            self.course = math.degrees(math.atan2(d_lon, d_lat)) % 360
+            if distance >= remaining:
+                self.latitude, self.longitude = target
+                self.route_index = (self.route_index + 1) % len(self.route)
+                return
+        else:
+            self.course = (self.course + self.rng.gauss(0, 25)) % 360
+            # Volver hacia el centro si la caminata se aleja demasiado.
+            d_lat = (self.center[0] - self.latitude) * EARTH_METERS_PER_DEGREE
+            d_lon = (self.center[1] - self.longitude) * EARTH_METERS_PER_DEGREE
+            if math.hypot(d_lat, d_lon) > self.radius_m:
+                self.course = math.degrees(math.atan2(d_lon, d_lat)) % 360
+        self.latitude, self.longitude = self._offset(
+            (self.latitude, self.longitude), distance, math.radians(self.course)
+        )
+
+    def build_frame(self, now: float, event: str | None = None) -> tuple[str, tuple]:
+        """Devuelve (frame crudo, (lat, lon) esperadas tras decodificar)."""
+        if self.protocol == "gps103":
+            return self._gps103_frame(now, event or "tracker")
+        if self.protocol == "h02":
+            return self._h02_frame(now)
+        return self._osmand_frame(now)
+
+    def login_frame(self) -> str | None:
+        if self.protocol == "gps103":
+            return f"##,imei:{self.imei},A;"
+        return None
+
+    def _nmea_position(self):
+        lat_text, lat_decoded = format_nmea_coordinate(self.latitude, 2)
+        lon_text, lon_decoded = format_nmea_coordinate(self.longitude, 3)
+        lat_dir = "S" if self.latitude < 0 else "N"
+        lon_dir = "W" if self.longitude < 0 else "E"
+        if lat_dir == "S":
+            lat_decoded = -lat_decoded
+        if lon_dir == "W":
+            lon_decoded = -lon_decoded
+        return lat_text, lat_dir, lon_text, lon_dir, (lat_decoded, lon_decoded)
+
+    def _gps103_frame(self, now: float, keyword: str):
+        lat_text, lat_dir, lon_text, lon_dir, expected = self._nmea_position()
+        local = datetime.fromtimestamp(now, tz=timezone.utc) + GPS103_UTC_OFFSET
+        frame = (
+            f"imei:{self.imei},{keyword},{local:%y%m%d%H%M%S},,F,"
+            f"{local:%H%M%S}.000,A,{lat_text},{lat_dir},{lon_text},{lon_dir},"
+            f"{self.speed_kmh * KNOTS_PER_KMH:.2f},{self.course:.0f};"
+        )
+        return frame, expected
+
+    def _h02_frame(self, now: float):
+        lat_text, lat_dir, lon_text, lon_dir, expected = self._nmea_position()
+        utc = datetime.fromtimestamp(now, tz=timezone.utc)
+        frame = (
+            f"*HQ,{self.imei},V1,{utc:%H%M%S},A,{lat_text},{lat_dir},{lon_text},"
+            f"{lon_dir},{self.speed_kmh * KNOTS_PER_KMH:.2f},{self.course:.0f},"
+            f"{utc:%d%m%y},FFFFFBFF,716,10,0,0,6#"
+        )
+        return frame, expected
+
+    def _osmand_frame(self, now: float):
+        latitude = round(self.latitude, 6)
+        longitude = round(self.longitude, 6)
+        frame = (
+            f"POST /?id={self.imei}&timestamp={int(now)}&lat={latitude}"
+            f"&lon={longitude}&speed={self.speed_kmh:.2f}&bearing={self.course:.1f}"
+            f"&altitude=150&accuracy=5&batt=87 HTTP/1.1\r\n"
+            f"Host: 127.0.0.1:5055\r\nContent-Length: 0\r\n\r\n"
+        )
+        return frame, (latitude, longitude)
+
+
+def corrupt_frame(frame: str, rng: random.Random) -> str:
+    """Genera un frame malformado: truncado o con caracteres alterados."""
+    if rng.random() < 0.5:
+        return frame[: rng.randint(1, max(1, len(frame) - 2))]
+    chars = list(frame)
+    for _ in range(max(1, len(chars) // 10)):
+        chars[rng.randrange(len(chars))] = rng.choice("#;,*?&=x\x00")
+    return "".join(chars)
+
+
+def position_key(latitude: float, longitude: float) -> tuple:
+    return round(latitude, 5), round(longitude, 5)
+
+
+class LoadGenStats:
+    def __init__(self):
+        self.frames = 0
+        self.events = 0
+        self.malformed = 0
+        self.wrappers = 0
+        self.send_errors = 0
+        self.ws_messages = 0
+        self.send_latency = StageLatency()  # write + drain de un wrapper
+        self.schedule_lag = StageLatency()  # retraso del envío respecto al previsto
+        self.end_to_end = StageLatency()  # frame enviado -> visto por WebSocket
+        self.window_frames = 0
+        self.window_started_at = time.perf_counter()
+
+    def window_report(self, target_fps: float) -> str:
+        now = time.perf_counter()
+        elapsed = max(now - self.window_started_at, 1e-9)
+        fps = self.window_frames / elapsed
+        self.window_frames = 0
+        self.window_started_at = now
+        line = (
+            f"{fps:.0f} frames/s (objetivo {target_fps:.0f}), "
+            f"retraso p99 {self.schedule_lag.percentile(99) * 1000:.1f}ms, "
+            f"envío p99 {self.send_latency.percentile(99) * 1000:.2f}ms"
+        )
+        if self.end_to_end.count:
+            line += (
+                f", extremo a extremo p50 {self.end_to_end.percentile(50):.2f}s "
+                f"p99 {self.end_to_end.percentile(99):.2f}s"
+            )
+        return line
+
+    def final_report(self, elapsed: float, target_fps: float) -> str:
+        elapsed = max(elapsed, 1e-9)
+        lines = [
+            f"Duración: {elapsed:.1f}s",
+            f"Frames: {self.frames} ({self.events} eventos, {self.malformed} malformados) "
+            f"en {self.wrappers} wrappers, {self.send_errors} errores de envío",
+            f"Throughput sostenido: {self.frames / elapsed:.1f} frames/s "
+            f"(objetivo {target_fps:.1f})",
+        ]
+        for name, stage, scale, unit in (
+            ("Retraso vs. horario", self.schedule_lag, 1000, "ms"),
+            ("Latencia de envío", self.send_latency, 1000, "ms"),
+            ("Extremo a extremo (WebSocket)", self.end_to_end, 1, "s"),
+        ):
+            if stage.count:
+                lines.append(
+                    f"{name}: p50 {stage.percentile(50) * scale:.3f}{unit} "
+                    f"p99 {stage.percentile(99) * scale:.3f}{unit} "
+                    f"max {stage.max * scale:.3f}{unit} ({stage.count} muestras)"
+                )
+        if self.ws_messages and not self.end_to_end.count:
+            lines.append(
+                f"{self.ws_messages} mensajes WebSocket sin posiciones simuladas "
+                "(¿IMEIs registrados en Traccar?)"
+            )
+        return "\n".join(lines)
+
+
+class FleetLoadGenerator:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        protocol_weights = parse_weights(args.mix)
+        unknown = set(protocol_weights) - set(PROTOCOL_PORTS)
+        if unknown:
+            raise ValueError(f"Protocolos desconocidos en --mix: {sorted(unknown)}")
+        protocols = list(protocol_weights)
+        self.event_mix = parse_weights(args.event_mix)
+        self.devices = [
+            SimulatedDevice(
+                imei=f"{args.imei_prefix}{index:0{args.imei_digits}d}",
+                protocol=self.rng.choices(
+                    protocols, weights=[protocol_weights[p] for p in protocols]
+                )[0],
+                center=(args.center_lat, args.center_lon),
+                radius_m=args.radius_km * 1000,
+                path_mode=args.path,
+                rng=self.rng,
+            )
+            for index in range(args.devices)
+        ]
+        self.devices_by_imei = {device.imei: device for device in self.devices}
+        self.stats = LoadGenStats()
+        # imei -> {clave de posición: instante de envío}, para medir extremo a extremo.
+        self.pending_positions: dict[str, dict] = {}
+        self.target_fps = args.devices / args.interval
+
+    def _random_event(self) -> str:
+        events = list(self.event_mix)
+        return self.rng.choices(events, weights=[self.event_mix[e] for e in events])[0]
+
+    def _remember_position(self, imei: str, key: tuple, sent_at: float):
+        pending = self.pending_positions.setdefault(imei, {})
+        pending[key] = sent_at
+        if len(pending) > MAX_PENDING_POSITIONS_PER_DEVICE:
+            del pending[next(iter(pending))]
+
+    def _next_frame(self, device: SimulatedDevice, now_wall: float, sent_at: float):
+        device.step(now_wall)
+        event = None
+        if device.protocol == "gps103" and self.rng.random() < self.args.event_ratio:
+            event = self._random_event()
+            self.stats.events += 1
+        frame, expected = device.build_frame(now_wall, event)
+        if self.rng.random() < self.args.malformed_ratio:
+            self.stats.malformed += 1
+            return corrupt_frame(frame, self.rng)
+        if event is None:  # Los eventos no actualizan la posición del dispositivo.
+            self._remember_position(device.imei, position_key(*expected), sent_at)
+        return frame
+
+    def _wrap(self, frames: list[dict]) -> bytes:
+        wrapper = frames[0] if len(frames) == 1 else frames
+        return encode_for_framing(serialization.dumps(wrapper), self.args.framing)
+
+    async def _produce(self, queues: list[asyncio.Queue], deadline: float):
+        """Programa los reportes de cada dispositivo con un heap de próximos envíos."""
+        started = time.perf_counter()
+        schedule = [
+            (started + self.rng.uniform(0, self.args.interval), index)
+            for index in range(len(self.devices))
+        ]
+        heapq.heapify(schedule)
+        # Frames de conexión al inicio (como hacen los equipos al conectarse).
+        logins = [
+            {"port": device.port, "data": frame}
+            for device in self.devices
+            if (frame := device.login_frame())
+        ]
+        for start in range(0, len(logins), self.args.batch):
+            await queues[start % len(queues)].put(
+                self._wrap(logins[start : start + self.args.batch])
+            )
+
+        batch: list[dict] = []
+        connection_index = 0
+        while schedule:
+            due_at, index = schedule[0]
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            if due_at > now:
+                if batch:
+                    await queues[connection_index].put(self._wrap(batch))
+                    connection_index = (connection_index + 1) % len(queues)
+                    batch = []
+                await asyncio.sleep(min(due_at - now, deadline - now))
+                continue
+            heapq.heapreplace(schedule, (due_at + self.args.interval, index))
+            self.stats.schedule_lag.add(now - due_at)
+            device = self.devices[index]
+            batch.append(
+                {
+                    "port": device.port,
+                    "data": self._next_frame(device, time.time(), now),
+                }
+            )
+            self.stats.frames += 1
+            self.stats.window_frames += 1
+            if len(batch) >= self.args.batch:
+                await queues[connection_index].put(self._wrap(batch))
+                connection_index = (connection_index + 1) % len(queues)
+                batch = []
+        if batch:
+            await queues[connection_index].put(self._wrap(batch))
+
+    async def _send(self, queue: asyncio.Queue):
+        host, port, framing = self.args.host, self.args.port, self.args.framing
+        writer = None
+        try:
+            while True:
+                payload = await queue.get()
+                if payload is None:
+                    break
+                started = time.perf_counter()
+                try:
+                    if framing == "eof":
+                        _, eof_writer = await asyncio.open_connection(host, port)
+                        eof_writer.write(payload)
+                        eof_writer.write_eof()
+                        await eof_writer.drain()
+                        eof_writer.close()
+                    else:
+                        if writer is None:
+                            _, writer = await asyncio.open_connection(host, port)
+                        writer.write(payload)
+                        await writer.drain()
+                except (ConnectionError, OSError) as e:
+                    self.stats.send_errors += 1
+                    logger.warning(f"Error enviando a {host}:{port}: {e}")
+                    if writer is not None:
+                        writer.close()
+                        writer = None
+                    continue
+                self.stats.send_latency.add(time.perf_counter() - started)
+                self.stats.wrappers += 1
+        finally:
+            if writer is not None:
+                writer.close()
+
+    async def _watch_websocket(self, session, url: str):
+        """Cliente WebSocket que mide cuándo aparece cada posición enviada."""
+        import aiohttp
+
+        while True:
+            try:
+                async with session.ws_connect(url) as ws:
+                    logger.info(f"Cliente WebSocket conectado a {url}")
+                    async for msg in ws:
+                        if msg.type != aiohttp.WSMsgType.TEXT:
+                            continue
+                        self.stats.ws_messages += 1
+                        self._observe_devices(
+                            serialization.loads(msg.data).get("devices") or [],
+                            time.perf_counter(),
+                        )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"WebSocket {url}: {e}. Reintentando en 2s.")
+            await asyncio.sleep(2)
+
+    def _observe_devices(self, devices: list, seen_at: float):
+        for device in devices:
+            pending = self.pending_positions.get(str(device.get("uniqueid")))
+            if not pending:
+                continue
+            latitude, longitude = device.get("latitude"), device.get("longitude")
+            if latitude is None or longitude is None:
+                continue
+            sent_at = pending.pop(position_key(latitude, longitude), None)
+            if sent_at is not None:
+                self.stats.end_to_end.add(seen_at - sent_at)
+
+    async def _report_periodically(self):
+        while True:
+            await asyncio.sleep(self.args.report_interval)
+            logger.info(self.stats.window_report(self.target_fps))
+
+    async def run(self) -> LoadGenStats:
+        logger.info(
+            f"Simulando {len(self.devices)} dispositivos ({self.args.mix}), "
+            f"reporte cada {self.args.interval}s -> {self.target_fps:.0f} frames/s "
+            f"hacia {self.args.host}:{self.args.port} ({self.args.framing})."
+        )
+        queues = [
+            asyncio.Queue(maxsize=self.args.queue_size)
+            for _ in range(self.args.connections)
+        ]
+        senders = [asyncio.create_task(self._send(q)) for q in queues]
+        background = [asyncio.create_task(self._report_periodically())]
+        session = None
+        if self.args.ws_url:
+            import aiohttp
+
+            session = aiohttp.ClientSession()
+            background += [
+                asyncio.create_task(self._watch_websocket(session, url))
+                for url in self.args.ws_url
+            ]
+        started = time.perf_counter()
+        elapsed = None
+        try:
+            await self._produce(queues, started + self.args.duration)
+            for q in queues:
+                await q.put(None)
+            await asyncio.gather(*senders)
+            elapsed = time.perf_counter() - started
+            if session is not None and self.args.ws_grace > 0:
+                # Dar tiempo a que las últimas posiciones lleguen a los clientes.
+                await asyncio.sleep(self.args.ws_grace)
+        finally:
+            if elapsed is None:
+                elapsed = time.perf_counter() - started
+            for task in [*senders, *background]:
+                task.cancel()
+            await asyncio.gather(*senders, *background, return_exceptions=True)
+            if session is not None:
+                await session.close()
+        print(self.stats.final_report(elapsed, self.target_fps))
+        return self.stats
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Generador de carga sintética multi-protocolo para el broker JSON."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7005)
+    parser.add_argument("--framing", choices=REPLAY_FRAMINGS, default="length")
+    parser.add_argument("--connections", type=int, default=1)
+    parser.add_argument(
+        "--batch", type=int, default=1, help="Frames por wrapper (lote)"
+    )
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument(
+        "--interval", type=float, default=10.0, help="Segundos entre reportes"
+    )
+    parser.add_argument("--duration", type=float, default=60.0, help="Segundos")
+    parser.add_argument(
+        "--mix", default="gps103=1,h02=1,osmand=1", help="Pesos por protocolo"
+    )
+    parser.add_argument("--path", choices=("random", "route"), default="random")
+    parser.add_argument("--center-lat", type=float, default=-12.0464)
+    parser.add_argument("--center-lon", type=float, default=-77.0428)
+    parser.add_argument("--radius-km", type=float, default=20.0)
+    parser.add_argument(
+        "--event-ratio",
+        type=float,
+        default=0.0,
+        help="Probabilidad de que un reporte GPS103 sea un evento",
+    )
+    parser.add_argument("--event-mix", default=DEFAULT_EVENT_MIX)
+    parser.add_argument("--malformed-ratio", type=float, default=0.0)
+    parser.add_argument("--imei-prefix", default="86")
+    parser.add_argument("--imei-digits", type=int, default=13)
+    parser.add_argument(
+        "--ws-url",
+        action="append",
+        default=[],
+        help="URL WebSocket (ws://host:7006/?u=...&p=...); repetible",
+    )
+    parser.add_argument(
+        "--ws-grace",
+        type=float,
+        default=10.0,
+        help="Segundos de espera final para mediciones WebSocket",
+    )
+    parser.add_argument("--report-interval", type=float, default=5.0)
+    parser.add_argument("--queue-size", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=None)
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    if args.devices < 1 or args.interval <= 0 or args.connections < 1:
+        print("--devices, --interval y --connections deben ser positivos.")
+        return 2
+    args.batch = max(1, args.batch)
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    stats = asyncio.run(FleetLoadGenerator(args).run())
+    return 0 if not stats.send_errors else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,475 @@
+from src.tcp.parser.gps103 import (
+    _GPS103_EVENT_TYPES,
+    GPS103_EVENT_KEYS_PATTERN,
+    GPS103_EVENT_PATTERN,
+    GPS103_HOURS_OFFSET,
+    GPS103_POSITION_PATTERN,
+    GPS103_SPEED_COURSE_PATTERN,
+    decode_gps103,
+)
+from src.tcp.parser.h02 import (
+    H02_COMMAND_HANDLERS,
+    KNOTS_TO_KMH,
+    _has_valid_location,
+    _split_messages,
+    decode_h02,
+)
+from src.tcp.records import Position
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional: sin él se usa el decodificador escalar.
+    np = None
+
+# Decodificación columnar de lotes de posiciones (subidas de zona ciega "BC",
+# historial reproducido, wrappers con muchos frames). Cada frame se separa en
+# campos una sola vez en Python; la conversión NMEA -> grados decimales, el
+# signo del hemisferio, nudos -> km/h, el rumbo y las fechas se hacen sobre
+# arrays de NumPy para todo el lote. El resultado son columnas (PositionColumns)
+# para consumidores masivos o, con to_records(), los Position de siempre.
+#
+# En la ingesta, decode_h02_frame / decode_gps103_frame son los decodificadores
+# H02 y GPS103 del registro: un frame con COLUMNAR_MIN_MESSAGES mensajes o más
+# convierte sus posiciones en arrays y el resto (conexiones, latidos, alarmas)
+# con los manejadores escalares, conservando el orden de los mensajes.
+
+COLUMNAR_AVAILABLE = np is not None
+
+H02_POSITION_COMMANDS = (b"V1", b"VI1", b"BC")
+
+# Las coordenadas H02 se redondean a 6 decimales, igual que en decode_h02.
+H02_COORDINATE_DECIMALS = 6
+
+# Por debajo de ~100 posiciones por llamada el decodificador escalar es más
+# rápido (python -m benchmarks.bench_columnar).
+COLUMNAR_MIN_MESSAGES = 100
+
+
+class PositionColumns:
+    """
+    Posiciones de un lote en columnas. imei es un array de objetos (str);
+    timestamp (segundos epoch UTC) es int64; latitude, longitude, speed (km/h)
+    y course (grados) son float64. Todas tienen la misma longitud.
+    """
+
+    __slots__ = ("imei", "timestamp", "latitude", "longitude", "speed", "course")
+
+    def __init__(self, imei, timestamp, latitude, longitude, speed, course):
+        self.imei = imei
+        self.timestamp = timestamp
+        self.latitude = latitude
+        self.longitude = longitude
+        self.speed = speed
+        self.course = course
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def select(self, mask) -> "PositionColumns":
+        """Solo las filas donde mask es True."""
+        return PositionColumns(
+            self.imei[mask],
+            self.timestamp[mask],
+            self.latitude[mask],
+            self.longitude[mask],
+            self.speed[mask],
+            self.course[mask],
+        )
+
+    def to_records(self) -> list:
+        """Convierte las columnas en registros Position."""
+        return [
+            Position(imei, timestamp, latitude, longitude, speed, course)
+            for imei, timestamp, latitude, longitude, speed, course in zip(
+                self.imei.tolist(),
+                self.timestamp.tolist(),
+                self.latitude.tolist(),
+                self.longitude.tolist(),
+                self.speed.tolist(),
+                self.course.tolist(),
+            )
+        ]
+
+    def __repr__(self):
+        return f"PositionColumns({len(self)} posiciones)"
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("La decodificación columnar requiere NumPy instalado.")
+
+
+def _float_column(values: list):
+    """
+    bytes -> float64 para todo el lote. Si algún valor no es numérico se
+    convierte fila a fila y esas filas quedan marcadas como inválidas.
+
+    Returns:
+        tuple: (array float64, máscara de filas válidas o None si lo son todas)
+    """
+    try:
+        return np.array(values, dtype=np.bytes_).astype(np.float64), None
+    except ValueError:
+        column = np.zeros(len(values), dtype=np.float64)
+        valid = np.ones(len(values), dtype=bool)
+        for index, value in enumerate(values):
+            try:
+                column[index] = float(value)
+            except ValueError:
+                valid[index] = False
+        return column, valid
+
+
+def nmea_to_decimal_columns(degrees, minutes, hemispheres: list, negative_hemisphere):
+    """
+    Grados + minutos / 60 para arrays ya separados en grados y minutos, con
+    signo negativo donde el hemisferio es negative_hemisphere (b"S" o b"W").
+    El corte lo hace quien llama, igual que los decodificadores escalares:
+    los 2 primeros caracteres de la latitud y los 3 de la longitud.
+    """
+    decimal = degrees + minutes / 60.0
+    negative = np.array(hemispheres, dtype=np.bytes_) == negative_hemisphere
+    return np.where(negative, -decimal, decimal)
+
+
+def device_dates_to_epoch(dates: list, layout: str, utc_offset_seconds: int = 0):
+    """
+    Fechas de 12 dígitos ASCII -> segundos epoch UTC, para todo el lote.
+
+    layout indica el orden de los pares de dígitos: "yymmddhhmmss" (GPS103)
+    o "ddmmyyhhmmss" (H02, fecha + hora del mensaje). Los dígitos deben estar
+    validados (isdigit / regex) antes de llamar.
+
+    Returns:
+        tuple: (array int64, máscara de fechas válidas del calendario)
+    """
+    digits = (
+        np.frombuffer(b"".join(dates), dtype=np.uint8).reshape(len(dates), 12) - 48
+    ).astype(np.int64)
+    pairs = digits[:, 0::2] * 10 + digits[:, 1::2]
+    year = 2000 + pairs[:, layout.index("yy") // 2]
+    month = pairs[:, layout.index("mm") // 2]
+    day = pairs[:, layout.index("dd") // 2]
+    hour, minute, second = pairs[:, 3], pairs[:, 4], pairs[:, 5]
+
+    month_start = ((year - 1970) * 12 + month - 1).astype("datetime64[M]")
+    first_day = month_start.astype("datetime64[D]")
+    days_in_month = ((month_start + 1).astype("datetime64[D]") - first_day).astype(
+        np.int64
+    )
+    valid = (
+        (month >= 1)
+        & (month <= 12)
+        & (day >= 1)
+        & (day <= days_in_month)
+        & (hour < 24)
+        & (minute < 60)
+        & (second < 60)
+    )
+    epoch = (
+        (first_day.astype(np.int64) + day - 1) * 86400
+        + hour * 3600
+        + minute * 60
+        + second
+        - utc_offset_seconds
+    )
+    return epoch, valid
+
+
+class _PositionRows:
+    """Campos crudos (bytes) de las posiciones de un lote, una lista por columna."""
+
+    __slots__ = (
+        "imeis",
+        "dates",
+        "lat_degrees",
+        "lat_minutes",
+        "lat_hemispheres",
+        "lon_degrees",
+        "lon_minutes",
+        "lon_hemispheres",
+        "speeds",
+        "courses",
+    )
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, [])
+
+    def __len__(self):
+        return len(self.imeis)
+
+    def add(self, imei, date, lat, lat_dir, lon, lon_dir, speed, course):
+        self.imeis.append(imei.decode("ascii"))
+        self.dates.append(date)
+        # Mismo corte fijo que los decodificadores escalares (lat[:2], lon[:3]).
+        self.lat_degrees.append(lat[:2])
+        self.lat_minutes.append(lat[2:])
+        self.lat_hemispheres.append(lat_dir)
+        self.lon_degrees.append(lon[:3])
+        self.lon_minutes.append(lon[3:])
+        self.lon_hemispheres.append(lon_dir)
+        self.speeds.append(speed)
+        self.courses.append(course)
+
+    def to_columns(self, date_layout: str, utc_offset_seconds: int = 0, decimals=None):
+        """
+        Returns:
+            tuple: (PositionColumns con todas las filas, máscara de filas
+                válidas). Una fila es inválida si algún campo no es numérico
+                o la fecha no existe, los mismos casos en que el
+                decodificador escalar lanza ValueError.
+        """
+        epoch, valid = device_dates_to_epoch(
+            self.dates, date_layout, utc_offset_seconds
+        )
+        columns = []
+        for values in (
+            self.lat_degrees,
+            self.lat_minutes,
+            self.lon_degrees,
+            self.lon_minutes,
+            self.speeds,
+            self.courses,
+        ):
+            column, column_valid = _float_column(values)
+            if column_valid is not None:
+                valid = valid & column_valid
+            columns.append(column)
+        lat_degrees, lat_minutes, lon_degrees, lon_minutes, speed, course = columns
+        latitude = nmea_to_decimal_columns(
+            lat_degrees, lat_minutes, self.lat_hemispheres, b"S"
+        )
+        longitude = nmea_to_decimal_columns(
+            lon_degrees, lon_minutes, self.lon_hemispheres, b"W"
+        )
+        if decimals is not None:
+            latitude = np.round(latitude, decimals)
+            longitude = np.round(longitude, decimals)
+        return (
+            PositionColumns(
+                np.array(self.imeis, dtype=object),
+                epoch,
+                latitude,
+                longitude,
+                speed * KNOTS_TO_KMH,
+                course,
+            ),
+            valid,
+        )
+
+
+def _empty_columns() -> PositionColumns:
+    empty = np.zeros(0, dtype=np.float64)
+    return PositionColumns(
+        np.zeros(0, dtype=object),
+        np.zeros(0, dtype=np.int64),
+        empty,
+        empty.copy(),
+        empty.copy(),
+        empty.copy(),
+    )
+
+
+def _valid_columns(columns: PositionColumns, valid) -> PositionColumns:
+    return columns if valid.all() else columns.select(valid)
+
+
+def _add_h02_position(rows: _PositionRows, fields: list) -> bool:
+    """Agrega un V1 / VI1 / BC. False si decode_h02 también lo descartaría."""
+    if not _has_valid_location(fields):
+        return False
+    rows.add(
+        fields[1],
+        fields[11] + fields[3],
+        fields[5],
+        fields[6],
+        fields[7],
+        fields[8],
+        fields[9],
+        fields[10],
+    )
+    return True
+
+
+def _h02_to_columns(rows: _PositionRows):
+    return rows.to_columns("ddmmyyhhmmss", decimals=H02_COORDINATE_DECIMALS)
+
+
+def _is_gps103_position(expression: bytes) -> bool:
+    """True si decode_gps103 trataría la expresión como posición (caso 4)."""
+    if b"tracker" not in expression:
+        return False
+    if GPS103_EVENT_KEYS_PATTERN.search(expression) is None:
+        return True
+    event_match = GPS103_EVENT_PATTERN.match(expression)
+    if event_match is None:
+        return True
+    event_text = event_match.group(2)
+    return not any(key in event_text for key, _ in _GPS103_EVENT_TYPES)
+
+
+def _add_gps103_position(rows: _PositionRows, expression: bytes) -> bool:
+    position_match = GPS103_POSITION_PATTERN.match(expression)
+    if not position_match:
+        return False
+    imei, datetime_bytes, lat, lat_dir, lon, lon_dir = position_match.groups()
+    speed_course_match = GPS103_SPEED_COURSE_PATTERN.search(expression)
+    speed, course = speed_course_match.groups() if speed_course_match else (b"0", b"0")
+    rows.add(imei, datetime_bytes, lat, lat_dir, lon, lon_dir, speed, course)
+    return True
+
+
+def _gps103_to_columns(rows: _PositionRows):
+    return rows.to_columns(
+        "yymmddhhmmss", utc_offset_seconds=-GPS103_HOURS_OFFSET * 3600
+    )
+
+
+def decode_h02_columns(frames) -> PositionColumns:
+    """
+    Posiciones H02 (V1, VI1, BC) de un lote de frames en columnas. Los
+    mensajes sin fix válido, con campos no numéricos o con una fecha
+    imposible se descartan, como en decode_h02.
+    """
+    _require_numpy()
+    rows = _PositionRows()
+    for frame in frames:
+        if isinstance(frame, str):
+            frame = frame.encode("utf-8")
+        for raw_message in _split_messages(frame):
+            fields = raw_message.split(b",")
+            if len(fields) >= 3 and fields[2] in H02_POSITION_COMMANDS:
+                _add_h02_position(rows, fields)
+    if not rows:
+        return _empty_columns()
+    return _valid_columns(*_h02_to_columns(rows))
+
+
+def decode_gps103_columns(frames) -> PositionColumns:
+    """
+    Posiciones GPS103 ("imei:...,tracker,...;") de un lote de frames en
+    columnas, con la misma corrección horaria que decode_gps103. Las filas
+    con una fecha imposible se descartan (decode_gps103 rechaza el frame).
+    """
+    _require_numpy()
+    rows = _PositionRows()
+    for frame in frames:
+        if isinstance(frame, str):
+            frame = frame.encode("utf-8")
+        bodies = frame.split(b";")
+        bodies.pop()  # Lo que queda tras el último ";" no es una expresión.
+        for body in bodies:
+            expression = body + b";"
+            if _is_gps103_position(expression):
+                _add_gps103_position(rows, expression)
+    if not rows:
+        return _empty_columns()
+    return _valid_columns(*_gps103_to_columns(rows))
+
+
+def _merge_positions(results: list, slots: list, columns, valid) -> list:
+    """Ubica cada posición en el lugar de su mensaje y quita las inválidas."""
+    for slot, position, is_valid in zip(slots, columns.to_records(), valid.tolist()):
+        if is_valid:
+            results[slot] = position
+    if valid.all():
+        return results
+    return [record for record in results if record is not None]
+
+
+def decode_h02_frame(full_string):
+    """
+    Igual que decode_h02 (mismos registros, en el mismo orden). Con
+    COLUMNAR_MIN_MESSAGES mensajes o más en el frame (subidas de zona ciega)
+    las posiciones se convierten en arrays.
+    """
+    if isinstance(full_string, str):
+        full_string = full_string.encode("utf-8")
+    if np is None or full_string.count(b"#") < COLUMNAR_MIN_MESSAGES:
+        return decode_h02(full_string)
+    rows = _PositionRows()
+    results = []
+    slots = []  # Posición en results de cada fila de rows.
+    for raw_message in _split_messages(full_string):
+        fields = raw_message.split(b",")
+        if len(fields) < 3:
+            continue
+        if fields[2] in H02_POSITION_COMMANDS:
+            if _add_h02_position(rows, fields):
+                slots.append(len(results))
+                results.append(None)
+            continue
+        handler = H02_COMMAND_HANDLERS.get(fields[2])
+        if handler is None:
+            continue
+        try:
+            record = handler(fields)
+        except (ValueError, IndexError):
+            continue
+        if record is not None:
+            results.append(record)
+    if not rows:
+        return results
+    return _merge_positions(results, slots, *_h02_to_columns(rows))
+
+
+def decode_gps103_frame(raw_data):
+    """
+    Igual que decode_gps103 (mismos registros, en el mismo orden). Con
+    COLUMNAR_MIN_MESSAGES expresiones o más en el frame las posiciones se
+    convierten en arrays; si alguna es inválida se decodifica con
+    decode_gps103, que rechaza el frame igual que siempre.
+    """
+    if isinstance(raw_data, str):
+        raw_data = raw_data.encode("utf-8")
+    if np is None or raw_data.count(b";") < COLUMNAR_MIN_MESSAGES:
+        return decode_gps103(raw_data)
+    bodies = raw_data.split(b";")
+    bodies.pop()
+    rows = _PositionRows()
+    results = []
+    slots = []
+    for body in bodies:
+        expression = body + b";"
+        if _is_gps103_position(expression):
+            if _add_gps103_position(rows, expression):
+                slots.append(len(results))
+                results.append(None)
+            continue
+        results.extend(decode_gps103(expression))
+    if not rows:
+        return results
+    columns, valid = _gps103_to_columns(rows)
+    if not valid.all():
+        return decode_gps103(raw_data)
+    return _merge_positions(results, slots, columns, valid)
+
+
+def _scalar_positions(decode_function, frames) -> list:
+    positions = []
+    for frame in frames:
+        positions.extend(
+            record for record in decode_function(frame) if type(record) is Position
+        )
+    return positions
+
+
+def decode_h02_batch(frames, as_arrays: bool = False):
+    """
+    Posiciones H02 de un lote de frames: list de Position o, con
+    as_arrays=True, PositionColumns. Sin NumPy se usa decode_h02 frame a
+    frame (as_arrays=True requiere NumPy).
+    """
+    if np is None and not as_arrays:
+        return _scalar_positions(decode_h02, frames)
+    columns = decode_h02_columns(frames)
+    return columns if as_arrays else columns.to_records()
+
+
+def decode_gps103_batch(frames, as_arrays: bool = False):
+    """Como decode_h02_batch, para GPS103 (Coban)."""
+    if np is None and not as_arrays:
+        return _scalar_positions(decode_gps103, frames)
+    columns = decode_gps103_columns(frames)
+    return columns if as_arrays else columns.to_records()
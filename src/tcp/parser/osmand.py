@@ -1,40 +1,46 @@
 from urllib.parse import urlparse, parse_qs
-from datetime import datetime, timezone
 
+from src.tcp.records import Position
 
-def format_timestamp(ts_string: str) -> str:
+# Último segundo representable como "YYYY-MM-DD HH:MM:SS" (9999-12-31 23:59:59).
+MAX_UNIX_TIMESTAMP = 253402300799
+
+
+def parse_unix_timestamp(ts_string: str) -> int | None:
     """
-    Convierte un timestamp de Unix (en formato string) a una fecha y hora
-    formateada como "YYYY-MM-DD HH:MM:SS" en UTC.
+    Convierte un timestamp de Unix (en formato string, UTC) a segundos epoch.
+    Retorna None si el timestamp no es válido.
     """
     try:
         timestamp = int(ts_string)
-        # El timestamp de Unix está en UTC, lo especificamos para que sea explícito
-        dt_object = datetime.fromtimestamp(timestamp, tz=timezone.utc)
-        return dt_object.strftime("%Y-%m-%d %H:%M:%S")
     except (ValueError, TypeError):
-        # En caso de que el timestamp no sea válido, retornamos None
         return None
+    if not 0 <= timestamp <= MAX_UNIX_TIMESTAMP:
+        return None
+    return timestamp
 
 
-def decode_osmand(fullstring: str) -> list:
+def decode_osmand(fullstring: bytes | str) -> list:
     """
     Parsea una cadena de datos del protocolo OsmAnd de Traccar.
 
     La función puede manejar una o múltiples peticiones HTTP en la misma cadena.
     Extrae los parámetros de la URL, los transforma y los devuelve en una lista
-    de diccionarios con un formato estandarizado.
+    de registros Position con un formato estandarizado.
 
     Args:
-        fullstring (str): La cadena completa de datos recibida del dispositivo.
+        fullstring (bytes | str): La cadena completa de datos recibida del dispositivo.
 
     Returns:
-        list: Una lista de diccionarios, donde cada diccionario representa una
-              posición decodificada. Retorna una lista vacía si no se pueden
-              parsear datos válidos.
+        list: Una lista de Position, una por cada posición decodificada.
+              Retorna una lista vacía si no se pueden parsear datos válidos.
     """
     positions = []
 
+    # Las peticiones HTTP se parsean con urllib, que trabaja sobre str.
+    if isinstance(fullstring, (bytes, bytearray)):
+        fullstring = fullstring.decode("utf-8", errors="replace")
+
     # La cadena puede contener múltiples peticiones HTTP concatenadas.
     # El separador estándar entre cabeceras y cuerpo (vacío en este caso) es '\r\n\r\n'.
     # Usamos esto para dividir la cadena en peticiones individuales.
@@ -63,7 +69,7 @@ def decode_osmand(fullstring: str) -> list:
             # Ej: {'id': '865224', 'lat': '-9.9354446'}
             data = {k: v[0] for k, v in query_params.items()}
 
-            # 4. Construir el diccionario de salida con las transformaciones requeridas
+            # 4. Construir el registro de salida con las transformaciones requeridas
             # Usamos .get() para evitar errores si un parámetro opcional no está presente
 
             imei = data.get("id")
@@ -76,23 +82,20 @@ def decode_osmand(fullstring: str) -> list:
             speed_knots = float(data.get("speed", 0.0))
             speed_kmh = round(speed_knots, 2)
 
-            # Formatear la fecha
-            formatted_dt = format_timestamp(data["timestamp"])
-            if not formatted_dt:
+            # El timestamp ya viene en segundos epoch UTC
+            timestamp = parse_unix_timestamp(data["timestamp"])
+            if timestamp is None:
                 # Si la fecha no es válida, descartamos el registro
                 continue
 
-            position = {
-                "type": "position",
-                "imei": imei,
-                "datetime": formatted_dt,
-                "latitude": round(float(data["lat"]), 6),
-                "longitude": round(float(data["lon"]), 6),
-                "speed": speed_kmh,
-                "course": float(
-                    data.get("bearing", 0.0)
-                ),  # 'bearing' es el rumbo en OsmAnd
-            }
+            position = Position(
+                imei,
+                timestamp,
+                round(float(data["lat"]), 6),
+                round(float(data["lon"]), 6),
+                speed_kmh,
+                float(data.get("bearing", 0.0)),  # 'bearing' es el rumbo en OsmAnd
+            )
 
             positions.append(position)
 
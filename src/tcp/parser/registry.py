@@ -0,0 +1,249 @@
+import importlib
+import logging
+from importlib.metadata import entry_points
+from typing import Callable
+
+from src.tcp.parser.columnar import decode_gps103_frame, decode_h02_frame
+from src.tcp.parser.osmand import decode_osmand
+from src.tcp.parser.stream import (
+    GPS103_TERMINATOR,
+    H02_TERMINATOR,
+    OSMAND_TERMINATOR,
+    StreamFramer,
+)
+from src.tcp.parser.teltonika import (
+    TeltonikaFramer,
+    decode_teltonika,
+    sniff_teltonika,
+    teltonika_requires_stream,
+)
+
+logger = logging.getLogger(__name__)
+
+PORT_COBAN = 6001
+PORT_SINOTRACK = 6013
+PORT_TELTONIKA = 6027
+PORT_TRACCAR_CLIENT = 6055
+
+# Grupo de entry points con el que un paquete instalado registra decodificadores.
+PLUGIN_ENTRY_POINT_GROUP = "ws_interceptor.decoders"
+# Atributo que se busca en un módulo de TCP_DECODER_PLUGINS sin ":atributo".
+DEFAULT_PLUGIN_ATTRIBUTE = "register_decoders"
+
+# Las firmas se buscan solo al inicio del frame.
+SNIFF_WINDOW = 64
+MAX_CACHED_STREAMS = 100000
+
+
+class DecoderSpec:
+    """
+    Decodificador registrado.
+
+    decode debe ser una función de módulo (bytes -> list de registros de
+    src.tcp.records) para poder enviarse por referencia al pool de
+    decodificación; recibe el frame como bytes tal como llegó del socket. Los
+    dicts con el formato anterior se siguen aceptando. ports son los puertos
+    del forwarder que usa por defecto; signatures, textos que identifican el
+    protocolo al inicio del frame (o sniff, una función propia de detección).
+    Los frames de un stream se reensamblan con StreamFramer(terminator), o con
+    framer_factory(max_frame_size) en protocolos sin terminador.
+    requires_stream(raw_data) indica si un frame solo se puede decodificar con
+    el contexto de su stream (p. ej. un paquete Teltonika sin el handshake con
+    el IMEI); esos frames se rechazan si el wrapper no trae "stream".
+    """
+
+    def __init__(
+        self,
+        name: str,
+        decode: Callable[[bytes], list],
+        ports: tuple = (),
+        signatures: tuple = (),
+        terminator: bytes | None = None,
+        sniff: Callable[[bytes], bool] | None = None,
+        framer_factory: Callable[[int], object] | None = None,
+        requires_stream: Callable[[bytes], bool] | None = None,
+    ):
+        self.name = name
+        self.decode = decode
+        self.ports = tuple(ports)
+        self.signatures = tuple(
+            signature.encode("utf-8") if isinstance(signature, str) else signature
+            for signature in signatures
+        )
+        self.terminator = terminator
+        self._sniff = sniff
+        self.framer_factory = framer_factory
+        self._requires_stream = requires_stream
+
+    def sniff(self, raw_data: bytes) -> bool:
+        if self._sniff is not None:
+            return self._sniff(raw_data)
+        head = raw_data[:SNIFF_WINDOW]
+        return any(signature in head for signature in self.signatures)
+
+    def requires_stream(self, raw_data: bytes) -> bool:
+        return self._requires_stream is not None and self._requires_stream(raw_data)
+
+    @property
+    def reassembles(self) -> bool:
+        return self.framer_factory is not None or self.terminator is not None
+
+    def new_framer(self, max_frame_size: int):
+        if self.framer_factory is not None:
+            return self.framer_factory(max_frame_size)
+        return StreamFramer(self.terminator, max_frame_size)
+
+    def __repr__(self):
+        return f"DecoderSpec({self.name!r}, ports={self.ports})"
+
+
+class DecoderRegistry:
+    """
+    Decodificadores disponibles, por puerto y por firma.
+
+    resolve() prueba primero el decodificador del puerto; si su firma no
+    coincide, detecta el protocolo con las firmas de los demás (un equipo
+    movido a otro puerto del forwarder se sigue decodificando). Si nada
+    coincide se usa el del puerto. Con una clave de stream el resultado se
+    cachea y los frames siguientes no vuelven a detectar.
+    """
+
+    def __init__(self):
+        self.specs: dict[str, DecoderSpec] = {}
+        self.by_port: dict[int, DecoderSpec] = {}
+        self._stream_cache: dict = {}
+
+    def register(self, spec: DecoderSpec):
+        if spec.name in self.specs:
+            logger.info(f"Decodificador '{spec.name}' reemplazado.")
+            self.unregister(spec.name)
+        self.specs[spec.name] = spec
+        for port in spec.ports:
+            previous = self.by_port.get(port)
+            if previous is not None:
+                logger.info(
+                    f"Puerto {port}: '{spec.name}' reemplaza a '{previous.name}'."
+                )
+            self.by_port[port] = spec
+        self._stream_cache.clear()
+
+    def unregister(self, name: str):
+        spec = self.specs.pop(name, None)
+        if spec is None:
+            return
+        for port in spec.ports:
+            if self.by_port.get(port) is spec:
+                del self.by_port[port]
+        self._stream_cache.clear()
+
+    def detect(self, device_port: int, raw_data: bytes) -> DecoderSpec | None:
+        port_spec = self.by_port.get(device_port)
+        if port_spec is not None and port_spec.sniff(raw_data):
+            return port_spec
+        for spec in self.specs.values():
+            if spec is not port_spec and spec.sniff(raw_data):
+                return spec
+        return port_spec
+
+    def resolve(
+        self, device_port: int, raw_data: bytes, stream_key=None
+    ) -> DecoderSpec | None:
+        if stream_key is not None:
+            spec = self._stream_cache.get(stream_key)
+            if spec is not None:
+                return spec
+        spec = self.detect(device_port, raw_data)
+        if spec is not None and stream_key is not None:
+            if len(self._stream_cache) >= MAX_CACHED_STREAMS:
+                del self._stream_cache[next(iter(self._stream_cache))]
+            self._stream_cache[stream_key] = spec
+        return spec
+
+    def forget(self, stream_key):
+        """Olvida el protocolo detectado para un stream (al expirar o cerrarse)."""
+        self._stream_cache.pop(stream_key, None)
+
+    def add_plugin(self, plugin):
+        """Registra un plugin: un DecoderSpec, una lista de ellos o callable(registry)."""
+        if isinstance(plugin, DecoderSpec):
+            self.register(plugin)
+        elif isinstance(plugin, (list, tuple)):
+            for spec in plugin:
+                self.add_plugin(spec)
+        elif callable(plugin):
+            plugin(self)
+        else:
+            raise TypeError(f"Plugin de decodificador no soportado: {plugin!r}")
+
+
+def build_default_registry() -> DecoderRegistry:
+    registry = DecoderRegistry()
+    registry.register(
+        DecoderSpec(
+            "gps103",
+            decode_gps103_frame,
+            ports=(PORT_COBAN,),
+            signatures=("imei:",),
+            terminator=GPS103_TERMINATOR,
+        )
+    )
+    registry.register(
+        DecoderSpec(
+            "h02",
+            decode_h02_frame,
+            ports=(PORT_SINOTRACK,),
+            signatures=("HQ,",),
+            terminator=H02_TERMINATOR,
+        )
+    )
+    registry.register(
+        DecoderSpec(
+            "osmand",
+            decode_osmand,
+            ports=(PORT_TRACCAR_CLIENT,),
+            signatures=("POST /?", "GET /?"),
+            terminator=OSMAND_TERMINATOR,
+        )
+    )
+    registry.register(
+        DecoderSpec(
+            "teltonika",
+            decode_teltonika,
+            ports=(PORT_TELTONIKA,),
+            sniff=sniff_teltonika,
+            framer_factory=TeltonikaFramer,
+            requires_stream=teltonika_requires_stream,
+        )
+    )
+    return registry
+
+
+def _load_plugin_reference(reference: str):
+    module_name, _, attribute = reference.partition(":")
+    module = importlib.import_module(module_name.strip())
+    return getattr(module, attribute.strip() or DEFAULT_PLUGIN_ATTRIBUTE)
+
+
+def load_decoder_plugins(registry: DecoderRegistry, references: str | None = None):
+    """
+    Carga plugins desde los entry points instalados y desde references
+    ("modulo:atributo" separados por comas, p. ej. TCP_DECODER_PLUGINS).
+    Un plugin que falla se registra en el log y no impide el arranque.
+    """
+    plugins = []
+    for entry_point in entry_points(group=PLUGIN_ENTRY_POINT_GROUP):
+        plugins.append((entry_point.name, entry_point.load))
+    for reference in (references or "").split(","):
+        if reference.strip():
+            plugins.append(
+                (reference.strip(), lambda ref=reference: _load_plugin_reference(ref))
+            )
+    for name, load in plugins:
+        try:
+            registry.add_plugin(load())
+            logger.info(f"Plugin de decodificador '{name}' cargado.")
+        except Exception as e:
+            logger.error(
+                f"Error cargando plugin de decodificador '{name}': {e}", exc_info=True
+            )
+    return registry
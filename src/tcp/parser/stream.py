@@ -0,0 +1,71 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Terminador de frame de cada protocolo de texto.
+GPS103_TERMINATOR = b";"
+H02_TERMINATOR = b"#"
+OSMAND_TERMINATOR = b"\r\n\r\n"
+
+DEFAULT_MAX_FRAME_SIZE = 64 * 1024
+
+
+class StreamFramer:
+    """
+    Separa un flujo de bytes en la parte con frames completos y la cola sin terminar.
+
+    La cola se guarda en un bytearray que se reutiliza entre llamadas y cada
+    byte se busca una sola vez. Si la cola supera max_frame_size se descarta,
+    ya que no puede pertenecer a un frame válido.
+    """
+
+    def __init__(self, terminator: bytes, max_frame_size: int = DEFAULT_MAX_FRAME_SIZE):
+        if not terminator:
+            raise ValueError("El terminador de frame no puede estar vacío.")
+        self.terminator = terminator
+        self.max_frame_size = max_frame_size
+        self.dropped_bytes = 0
+        self.last_fed_at = time.monotonic()
+        self._buffer = bytearray()
+
+    @property
+    def pending(self) -> int:
+        """Bytes de la cola pendiente de completar."""
+        return len(self._buffer)
+
+    def feed(self, data: bytes) -> bytes | None:
+        """
+        Agrega data al flujo y devuelve los frames completos (hasta el último
+        terminador inclusive), o None si todavía no hay ninguno.
+        """
+        self.last_fed_at = time.monotonic()
+        buffer = self._buffer
+        # Un terminador puede empezar en los últimos bytes de la cola anterior.
+        search_from = max(0, len(buffer) - len(self.terminator) + 1)
+        buffer += data
+        end = buffer.rfind(self.terminator, search_from)
+        if end < 0:
+            self._enforce_max_size()
+            return None
+        end += len(self.terminator)
+        complete = bytes(buffer[:end])
+        del buffer[:end]
+        self._enforce_max_size()
+        return complete
+
+    def _enforce_max_size(self):
+        if len(self._buffer) > self.max_frame_size:
+            self.dropped_bytes += len(self._buffer)
+            logger.warning(
+                "Cola de %d bytes sin terminador %r excede el máximo de frame. Descartada.",
+                len(self._buffer),
+                self.terminator,
+            )
+            self._buffer.clear()
+
+    def reset(self) -> bytes:
+        """Vacía la cola y devuelve lo que quedaba pendiente."""
+        tail = bytes(self._buffer)
+        self._buffer.clear()
+        return tail
@@ -0,0 +1,414 @@
+import binascii
+import logging
+import struct
+import time
+
+from src.tcp.records import Connection, DeviceEvent, Position
+from src.utils.timestamps import now_epoch
+
+logger = logging.getLogger(__name__)
+
+# Protocolo binario Teltonika (FMB y similares), Codec 8 y Codec 8 Extended.
+#
+# Handshake:   <longitud u16><IMEI ascii>            -> el servidor responde 0x01
+# Paquete AVL: <0x00000000><longitud u32><codec u8><N u8><N registros AVL>
+#              <N u8><CRC u32>                       -> el servidor responde N (u32)
+#
+# El CRC es CRC-16/IBM (ARC) sobre el campo de datos (desde el codec hasta el
+# segundo N). Todos los enteros son big-endian. El forwarder envía los bytes
+# del dispositivo codificados en hexadecimal dentro del campo "data".
+#
+# Solo el handshake trae el IMEI, así que los wrappers de un equipo Teltonika
+# deben llevar el campo "stream" (la conexión del equipo en el forwarder):
+# TeltonikaFramer recuerda el handshake y lo antepone a cada paquete AVL. Un
+# paquete AVL sin "stream" ni handshake delante se rechaza en el broker.
+
+CODEC_8 = 0x08
+CODEC_8_EXTENDED = 0x8E
+SUPPORTED_CODECS = (CODEC_8, CODEC_8_EXTENDED)
+
+AVL_PREAMBLE = b"\x00\x00\x00\x00"
+MIN_IMEI_LENGTH = 15
+MAX_IMEI_LENGTH = 17
+
+HANDSHAKE_LENGTH = struct.Struct(">H")
+AVL_HEADER = struct.Struct(">4sIBB")  # Preámbulo, longitud de datos, codec, N
+AVL_CRC = struct.Struct(">I")
+# Timestamp (ms), prioridad, longitud, latitud, altitud, ángulo, satélites, velocidad.
+AVL_RECORD = struct.Struct(">QBiihHBH")
+AVL_HEADER_SIZE = AVL_HEADER.size  # 10 bytes: hasta el primer registro
+AVL_DATA_OFFSET = 8  # El campo de datos (y el CRC) empieza en el codec
+
+U8 = struct.Struct(">B")
+U16 = struct.Struct(">H")
+IO_VALUE_STRUCTS = {
+    1: U8,
+    2: U16,
+    4: struct.Struct(">I"),
+    8: struct.Struct(">Q"),
+}
+
+COORDINATE_PRECISION = 10_000_000
+# Último segundo representable como "YYYY-MM-DD HH:MM:SS" (9999-12-31 23:59:59).
+MAX_AVL_TIMESTAMP = 253402300799
+
+# IO de evento (el registro AVL indica qué IO lo generó) -> tipo de evento según su valor.
+# None como clave aplica a cualquier valor distinto de cero.
+TELTONIKA_EVENT_IO_MAP = {
+    239: {1: "ignitionOn", 0: "ignitionOff"},  # Ignition
+    252: {1: "powerCut"},  # Unplug (batería externa desconectada)
+    247: {None: "accidentAlarm"},  # Crash detection
+    255: {None: "deviceOverspeed"},  # Overspeeding
+    236: {1: "sos"},  # Alarm (botón de pánico)
+    246: {1: "tow"},  # Towing
+    251: {None: "idle"},  # Idling
+}
+
+
+def _build_crc16_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return tuple(table)
+
+
+_CRC16_TABLE = _build_crc16_table()
+
+
+def crc16_ibm(data) -> int:
+    """CRC-16/IBM (ARC): polinomio 0xA001 reflejado, valor inicial 0."""
+    crc = 0
+    table = _CRC16_TABLE
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+    return crc
+
+
+def parse_imei_handshake(buffer, offset: int = 0):
+    """
+    Lee un handshake <longitud u16><IMEI> en buffer[offset:].
+
+    Returns:
+        tuple: (imei, bytes consumidos), (None, 0) si faltan bytes, o
+            (None, -1) si lo que hay no es un handshake.
+    """
+    if len(buffer) - offset < HANDSHAKE_LENGTH.size:
+        return None, 0
+    (length,) = HANDSHAKE_LENGTH.unpack_from(buffer, offset)
+    if not MIN_IMEI_LENGTH <= length <= MAX_IMEI_LENGTH:
+        return None, -1
+    end = offset + HANDSHAKE_LENGTH.size + length
+    if len(buffer) < end:
+        return None, 0
+    imei = bytes(buffer[offset + HANDSHAKE_LENGTH.size : end])
+    if not imei.isdigit():
+        return None, -1
+    return imei.decode("ascii"), end - offset
+
+
+def avl_packet_size(buffer, offset: int = 0) -> int:
+    """
+    Tamaño total del paquete AVL que empieza en buffer[offset:], 0 si todavía
+    no llegó la cabecera o -1 si no empieza con el preámbulo.
+    """
+    if len(buffer) - offset < AVL_DATA_OFFSET:
+        return 0
+    if buffer[offset : offset + 4] != AVL_PREAMBLE:
+        return -1
+    (data_length,) = AVL_CRC.unpack_from(buffer, offset + 4)
+    return AVL_DATA_OFFSET + data_length + AVL_CRC.size
+
+
+def _find_io_value(view, offset: int, codec: int, wanted_io: int):
+    """
+    Recorre el bloque de IO de un registro. Devuelve (valor del IO buscado o
+    None, offset del siguiente registro). Solo desempaqueta el IO buscado; el
+    resto se salta por aritmética de offsets.
+    """
+    extended = codec == CODEC_8_EXTENDED
+    count_struct = U16 if extended else U8
+    id_size = 2 if extended else 1
+    # Codec 8: id de evento u8 + total u8. Codec 8E: ambos u16.
+    offset += 2 * id_size
+    value = None
+    for value_size in (1, 2, 4, 8):
+        (count,) = count_struct.unpack_from(view, offset)
+        offset += id_size
+        entry_size = id_size + value_size
+        if value is None and wanted_io is not None:
+            value_struct = IO_VALUE_STRUCTS[value_size]
+            id_struct = U16 if extended else U8
+            for entry in range(count):
+                entry_offset = offset + entry * entry_size
+                if id_struct.unpack_from(view, entry_offset)[0] == wanted_io:
+                    value = value_struct.unpack_from(view, entry_offset + id_size)[0]
+                    break
+        offset += count * entry_size
+    if extended:
+        # IO de longitud variable (solo 8E): <id u16><longitud u16><valor>.
+        (count,) = U16.unpack_from(view, offset)
+        offset += 2
+        for _ in range(count):
+            (value_length,) = U16.unpack_from(view, offset + 2)
+            offset += 4 + value_length
+    return value, offset
+
+
+def _event_type_for(event_io: int, value) -> str | None:
+    event_values = TELTONIKA_EVENT_IO_MAP.get(event_io)
+    if event_values is None or value is None:
+        return None
+    event_type = event_values.get(value)
+    if event_type is None and value:
+        event_type = event_values.get(None)
+    return event_type
+
+
+def decode_avl_packet(buffer, imei: str, offset: int = 0):
+    """
+    Decodifica un paquete AVL completo en buffer[offset:] sin copiarlo
+    (memoryview + struct.unpack_from).
+
+    Returns:
+        tuple: (registros normalizados, cantidad de registros AVL del paquete).
+
+    Raises:
+        ValueError: Paquete incompleto, CRC inválido o codec no soportado.
+    """
+    # El memoryview se libera al salir: el llamador puede recortar su bytearray.
+    with memoryview(buffer) as view:
+        return _decode_avl_view(view, imei, offset)
+
+
+def _decode_avl_view(view, imei: str, offset: int):
+    packet_size = avl_packet_size(view, offset)
+    if packet_size <= 0 or len(view) - offset < packet_size:
+        raise ValueError("Paquete AVL incompleto o sin preámbulo.")
+    _, data_length, codec, record_count = AVL_HEADER.unpack_from(view, offset)
+    data_start = offset + AVL_DATA_OFFSET
+    data_end = data_start + data_length
+    (expected_crc,) = AVL_CRC.unpack_from(view, data_end)
+    with view[data_start:data_end] as data_field:
+        crc = crc16_ibm(data_field)
+    if crc != expected_crc:
+        raise ValueError("CRC de paquete AVL inválido.")
+    if codec not in SUPPORTED_CODECS:
+        raise ValueError(f"Codec Teltonika 0x{codec:02X} no soportado.")
+    if view[data_end - 1] != record_count:
+        raise ValueError("Cantidad de registros AVL inconsistente.")
+
+    event_id_struct = U16 if codec == CODEC_8_EXTENDED else U8
+    results = []
+    record_offset = offset + AVL_HEADER_SIZE
+    for _ in range(record_count):
+        (
+            timestamp_ms,
+            _priority,
+            longitude,
+            latitude,
+            _altitude,
+            angle,
+            _satellites,
+            speed,
+        ) = AVL_RECORD.unpack_from(view, record_offset)
+        io_offset = record_offset + AVL_RECORD.size
+        (event_io,) = event_id_struct.unpack_from(view, io_offset)
+        wanted_io = event_io if event_io in TELTONIKA_EVENT_IO_MAP else None
+        event_value, record_offset = _find_io_value(view, io_offset, codec, wanted_io)
+        if record_offset > data_end - 1:
+            raise ValueError("Registro AVL excede el campo de datos.")
+        if latitude == 0 and longitude == 0:
+            continue  # Sin fix GPS: el equipo reporta 0,0.
+        timestamp = timestamp_ms // 1000
+        if timestamp > MAX_AVL_TIMESTAMP:
+            raise ValueError(f"Timestamp AVL fuera de rango: {timestamp_ms}")
+        latitude_deg = round(latitude / COORDINATE_PRECISION, 6)
+        longitude_deg = round(longitude / COORDINATE_PRECISION, 6)
+        results.append(
+            Position(
+                imei,
+                timestamp,
+                latitude_deg,
+                longitude_deg,
+                float(speed),  # Teltonika ya reporta km/h
+                float(angle),
+            )
+        )
+        event_type = _event_type_for(event_io, event_value)
+        if event_type is not None:
+            results.append(
+                DeviceEvent(imei, event_type, timestamp, latitude_deg, longitude_deg)
+            )
+    return results, record_count
+
+
+def iter_teltonika_packets(buffer, imei: str | None = None):
+    """
+    Recorre un flujo Teltonika completo (handshake y paquetes AVL).
+
+    Yields:
+        tuple: (imei, registros, cantidad de registros AVL). El handshake
+            genera un registro de conexión y fija el IMEI de los paquetes
+            siguientes. Un paquete con CRC inválido se descarta sin afectar
+            al resto; un paquete truncado termina el recorrido.
+    """
+    view = memoryview(buffer)
+    offset = 0
+    while offset < len(view):
+        packet_size = avl_packet_size(view, offset)
+        if packet_size > 0:
+            if len(view) - offset < packet_size:
+                return
+            if imei is None:
+                logger.debug("Paquete AVL Teltonika sin handshake previo. Descartado.")
+            else:
+                try:
+                    records, record_count = decode_avl_packet(view, imei, offset)
+                    yield imei, records, record_count
+                except (ValueError, struct.error) as e:
+                    logger.debug(f"Paquete AVL Teltonika descartado: {e}")
+            offset += packet_size
+            continue
+        if packet_size == 0:
+            return
+        handshake_imei, consumed = parse_imei_handshake(view, offset)
+        if consumed <= 0:
+            return
+        imei = handshake_imei
+        offset += consumed
+        yield imei, [Connection(imei, now_epoch())], 0
+
+
+def decode_teltonika(full_string: bytes | str) -> list:
+    """
+    Decodifica un flujo Teltonika (Codec 8 / 8E) recibido en hexadecimal:
+    un handshake de IMEI seguido de cero o más paquetes AVL.
+
+    Args:
+        full_string (bytes | str): Bytes del dispositivo en hexadecimal.
+
+    Returns:
+        list: Registros de posición y evento en el formato común de los
+            parsers. Un handshake sin paquetes, o paquetes válidos cuyos
+            registros no tienen fix GPS, generan un registro de conexión.
+
+    Raises:
+        ValueError: Si full_string no es hexadecimal válido.
+    """
+    buffer = binascii.unhexlify(full_string.strip())
+    results = []
+    pending_connection = None
+    for imei, records, record_count in iter_teltonika_packets(buffer):
+        if record_count == 0:
+            pending_connection = records
+        elif records:
+            # Las posiciones ya indican que el equipo está conectado.
+            pending_connection = None
+            results.extend(records)
+        elif not results:
+            # Paquete válido sin fix GPS (todos los registros en 0,0): no hay
+            # posición, pero el equipo está en línea.
+            pending_connection = [Connection(imei, now_epoch())]
+    if pending_connection is not None:
+        results.extend(pending_connection)
+    return results
+
+
+def sniff_teltonika(raw_data: bytes) -> bool:
+    """Reconoce el inicio hexadecimal de un handshake o de un paquete Codec 8/8E."""
+    head = raw_data[:20].lower()
+    if head.startswith(b"00000000"):
+        return head[16:18] in (b"08", b"8e")
+    # Handshake: longitud 0x000F..0x0011 seguida de dígitos ASCII (0x30-0x39).
+    return head[:4] in (b"000f", b"0010", b"0011") and head[4:5] == b"3"
+
+
+def teltonika_requires_stream(raw_data: bytes) -> bool:
+    """True si el frame empieza con un paquete AVL: sin handshake no hay IMEI."""
+    return raw_data.lstrip()[:8] == b"00000000"
+
+
+class TeltonikaFramer:
+    """
+    Reensamblado de un stream Teltonika en hexadecimal partido entre wrappers.
+
+    Misma interfaz que StreamFramer: feed() devuelve, también en hexadecimal,
+    los paquetes AVL completos precedidos del handshake de la conexión, de
+    modo que decode_teltonika() los decodifique sin estado. El IMEI se
+    conserva durante toda la vida del stream.
+    """
+
+    def __init__(self, max_frame_size: int):
+        self.max_frame_size = max_frame_size
+        self.imei: str | None = None
+        self.dropped_bytes = 0
+        self.last_fed_at = time.monotonic()
+        self._handshake = b""
+        self._hex_nibble = b""
+        self._buffer = bytearray()
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def feed(self, data: bytes) -> bytes | None:
+        self.last_fed_at = time.monotonic()
+        hex_data = self._hex_nibble + b"".join(data.split())
+        if len(hex_data) % 2:
+            hex_data, self._hex_nibble = hex_data[:-1], hex_data[-1:]
+        else:
+            self._hex_nibble = b""
+        try:
+            self._buffer += bytes.fromhex(hex_data.decode("ascii"))
+        except (UnicodeDecodeError, ValueError):
+            self.dropped_bytes += len(data)
+            logger.warning("Fragmento Teltonika no hexadecimal. Descartado.")
+            return None
+
+        buffer = self._buffer
+        complete = bytearray()
+        if self.imei is None:
+            imei, consumed = parse_imei_handshake(buffer)
+            if consumed == 0:
+                return None
+            if consumed < 0:
+                self._drop("sin handshake de IMEI")
+                return None
+            self.imei = imei
+            self._handshake = bytes(buffer[:consumed])
+            del buffer[:consumed]
+            complete += self._handshake  # Genera el registro de conexión.
+
+        offset = 0
+        while True:
+            packet_size = avl_packet_size(buffer, offset)
+            if packet_size <= 0 or len(buffer) - offset < packet_size:
+                break
+            offset += packet_size
+        if offset:
+            if not complete:
+                complete += self._handshake
+            complete += buffer[:offset]
+            del buffer[:offset]
+        if packet_size < 0:
+            # Basura después de los paquetes completos: solo se descarta la cola.
+            self._drop("sin preámbulo AVL")
+        elif len(buffer) > self.max_frame_size:
+            self._drop("excede el máximo de frame")
+        return complete.hex().encode("ascii") if complete else None
+
+    def _drop(self, reason: str):
+        self.dropped_bytes += len(self._buffer)
+        logger.warning(
+            "Cola Teltonika de %d bytes %s. Descartada.", len(self._buffer), reason
+        )
+        self._buffer.clear()
+
+    def reset(self) -> bytes:
+        tail = bytes(self._buffer)
+        self._buffer.clear()
+        self._hex_nibble = b""
+        return tail
@@ -0,0 +1,72 @@
+import time
+from collections import deque
+
+# Número de muestras recientes que se guardan por etapa para calcular percentiles.
+LATENCY_SAMPLES_PER_STAGE = 2048
+
+
+class StageLatency:
+    """Acumula latencias (en segundos) de una etapa del pipeline de ingesta."""
+
+    def __init__(self, max_samples: int = LATENCY_SAMPLES_PER_STAGE):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=max_samples)
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.samples.append(seconds)
+
+    def percentile(self, pct: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(len(ordered) * pct / 100.0))
+        return ordered[index]
+
+    def summary_ms(self) -> dict:
+        avg = self.total / self.count if self.count else 0.0
+        return {
+            "count": self.count,
+            "avg_ms": round(avg * 1000, 3),
+            "p99_ms": round(self.percentile(99) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+class PipelineStats:
+    """Métricas del pipeline TCP: profundidad de cola, backpressure y latencia por etapa."""
+
+    def __init__(self):
+        self.stages: dict[str, StageLatency] = {}
+        self.frames_enqueued = 0
+        self.backpressure_waits = 0
+        self.window_started_at = time.monotonic()
+
+    def record(self, stage: str, seconds: float):
+        stage_latency = self.stages.get(stage)
+        if stage_latency is None:
+            stage_latency = self.stages[stage] = StageLatency()
+        stage_latency.add(seconds)
+
+    def snapshot_and_reset(self, queue_depth: int, queue_capacity: int) -> dict:
+        """Devuelve las métricas de la ventana actual y empieza una nueva."""
+        now = time.monotonic()
+        elapsed = max(now - self.window_started_at, 1e-9)
+        snapshot = {
+            "queue_depth": queue_depth,
+            "queue_capacity": queue_capacity,
+            "frames_enqueued": self.frames_enqueued,
+            "frames_per_second": round(self.frames_enqueued / elapsed, 2),
+            "backpressure_waits": self.backpressure_waits,
+            "stages": {name: stage.summary_ms() for name, stage in self.stages.items()},
+        }
+        self.stages = {}
+        self.frames_enqueued = 0
+        self.backpressure_waits = 0
+        self.window_started_at = now
+        return snapshot
@@ -0,0 +1,117 @@
+import logging
+import mmap
+import os
+import struct
+import time
+
+logger = logging.getLogger(__name__)
+
+# Formato de una grabación de tráfico del broker (solo se agregan registros al final):
+#   cabecera: RECORDING_MAGIC (8 bytes)
+#   registro: timestamp de recepción (float64 epoch) + longitud (uint32) + wrapper
+# El wrapper se guarda tal cual llegó del forwarder (bytes JSON), así una
+# reproducción ejercita también el parseo y los lotes.
+RECORDING_MAGIC = b"WSIREC01"
+RECORD_HEADER = struct.Struct("<dI")
+DEFAULT_RECORD_BUFFER_SIZE = 1024 * 1024
+DEFAULT_RECORD_FLUSH_INTERVAL = 1.0  # segundos
+
+
+class RecordingFormatError(ValueError):
+    pass
+
+
+class TrafficRecorder:
+    """
+    Graba los wrappers recibidos por el broker en un archivo binario append-only.
+
+    record() solo copia al buffer del archivo; el volcado a disco lo hace
+    flush(), llamado periódicamente por el servidor. Si se supera max_bytes,
+    la grabación se detiene sin afectar a la ingesta.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.records = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "ab", buffering=DEFAULT_RECORD_BUFFER_SIZE)
+        if self._file.tell() == 0:
+            self._file.write(RECORDING_MAGIC)
+        self.bytes_written = self._file.tell()
+        logger.info(f"Grabando tráfico del broker en {path}.")
+
+    @property
+    def active(self) -> bool:
+        return self._file is not None
+
+    def record(self, wrapper_bytes: bytes, received_at: float | None = None):
+        if self._file is None:
+            return
+        record_size = RECORD_HEADER.size + len(wrapper_bytes)
+        if self.max_bytes and self.bytes_written + record_size > self.max_bytes:
+            logger.warning(
+                f"Grabación {self.path} alcanzó el máximo de {self.max_bytes} bytes. Deteniendo."
+            )
+            self.close()
+            return
+        self._file.write(
+            RECORD_HEADER.pack(
+                received_at if received_at is not None else time.time(),
+                len(wrapper_bytes),
+            )
+        )
+        self._file.write(wrapper_bytes)
+        self.bytes_written += record_size
+        self.records += 1
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            logger.info(
+                f"Grabación {self.path} cerrada: {self.records} wrappers, {self.bytes_written} bytes."
+            )
+
+
+def open_recorder_from_env(worker_index: int | None = None) -> TrafficRecorder | None:
+    """Crea el grabador si TCP_RECORD_PATH está definido (un archivo por worker del clúster)."""
+    path = os.getenv("TCP_RECORD_PATH")
+    if not path:
+        return None
+    if worker_index is not None:
+        path = f"{path}.{worker_index}"
+    return TrafficRecorder(path, max_bytes=int(os.getenv("TCP_RECORD_MAX_BYTES", 0)))
+
+
+def iter_recording(path: str):
+    """
+    Itera (timestamp, wrapper_bytes) de una grabación usando mmap.
+
+    Un registro final incompleto (proceso interrumpido a mitad de escritura)
+    se ignora.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < len(RECORDING_MAGIC):
+            raise RecordingFormatError(f"{path} no es una grabación válida.")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[: len(RECORDING_MAGIC)] != RECORDING_MAGIC:
+                raise RecordingFormatError(f"{path} no es una grabación válida.")
+            offset = len(RECORDING_MAGIC)
+            total_size = len(mm)
+            while offset + RECORD_HEADER.size <= total_size:
+                received_at, length = RECORD_HEADER.unpack_from(mm, offset)
+                offset += RECORD_HEADER.size
+                if offset + length > total_size:
+                    logger.warning(
+                        f"Registro final incompleto en {path} (offset {offset}). Ignorado."
+                    )
+                    return
+                yield received_at, mm[offset : offset + length]
+                offset += length
@@ -0,0 +1,125 @@
+# Registros normalizados que emiten los decodificadores. Son clases con
+# __slots__ en vez de dicts: ocupan menos memoria, el acceso a los campos es
+# más rápido en el camino caliente y viajan por el pool de decodificación como
+# cualquier objeto. Solo se convierten a dict en el borde JSON/WebSocket
+# (to_dict) o en los logs. timestamp son segundos epoch (UTC), ya corregidos
+# según el huso de cada protocolo.
+
+from src.utils.timestamps import format_timestamp, parse_timestamp
+
+TYPE_CONNECTION = "conexion"
+TYPE_POSITION = "position"
+TYPE_EVENT = "event"
+EVENT_TYPE_UNKNOWN = "unknown"
+
+
+class Record:
+    __slots__ = ("imei", "timestamp")
+    type = None
+
+    def to_dict(self) -> dict:
+        """Dict con el formato de salida: la fecha como "datetime" en texto."""
+        data = {"type": self.type}
+        for cls in reversed(type(self).__mro__):
+            for field in cls.__dict__.get("__slots__", ()):
+                data[field] = getattr(self, field)
+        data["datetime"] = format_timestamp(data.pop("timestamp"))
+        return data
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        fields = ", ".join(
+            f"{key}={value!r}" for key, value in self.to_dict().items() if key != "type"
+        )
+        return f"{type(self).__name__}({fields})"
+
+
+class Connection(Record):
+    """El equipo se conectó o envió un latido; actualiza su última conexión."""
+
+    __slots__ = ()
+    type = TYPE_CONNECTION
+
+    def __init__(self, imei: str, timestamp: int):
+        self.imei = imei
+        self.timestamp = timestamp
+
+
+class Position(Record):
+    """Posición GPS. speed en km/h, course en grados."""
+
+    __slots__ = ("latitude", "longitude", "speed", "course")
+    type = TYPE_POSITION
+
+    def __init__(
+        self,
+        imei: str,
+        timestamp: int,
+        latitude: float,
+        longitude: float,
+        speed: float = 0.0,
+        course: float = 0.0,
+    ):
+        self.imei = imei
+        self.timestamp = timestamp
+        self.latitude = latitude
+        self.longitude = longitude
+        self.speed = speed
+        self.course = course
+
+
+class DeviceEvent(Record):
+    """Evento reportado por el equipo (alarma, encendido, SOS...)."""
+
+    __slots__ = ("event_type", "latitude", "longitude")
+    type = TYPE_EVENT
+
+    def __init__(
+        self,
+        imei: str,
+        event_type: str,
+        timestamp: int,
+        latitude: float | None = None,
+        longitude: float | None = None,
+    ):
+        self.imei = imei
+        self.event_type = event_type
+        self.timestamp = timestamp
+        self.latitude = latitude
+        self.longitude = longitude
+
+
+def record_from_dict(data: dict) -> Record | None:
+    """
+    Convierte un dict con el formato anterior de los parsers (p. ej. de un
+    plugin de decodificador) en su registro. None si el tipo no se reconoce o
+    la fecha no es "YYYY-MM-DD HH:MM:SS".
+    """
+    record_type = data.get("type")
+    timestamp = parse_timestamp(data.get("datetime"))
+    if timestamp is None:
+        return None
+    if record_type == TYPE_POSITION:
+        return Position(
+            data.get("imei"),
+            timestamp,
+            data.get("latitude", 0.0),
+            data.get("longitude", 0.0),
+            data.get("speed", 0.0),
+            data.get("course", 0.0),
+        )
+    if record_type == TYPE_CONNECTION:
+        return Connection(data.get("imei"), timestamp)
+    if record_type == TYPE_EVENT:
+        return DeviceEvent(
+            data.get("imei"),
+            data.get("event_type", EVENT_TYPE_UNKNOWN),
+            timestamp,
+            data.get("latitude"),
+            data.get("longitude"),
+        )
+    return None
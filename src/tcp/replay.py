@@ -0,0 +1,229 @@
+"""
+Reproduce una grabación de tráfico (TCP_RECORD_PATH) contra un broker.
+
+Uso:
+    python -m src.tcp.replay grabacion.bin --port 7005 --speed 1
+    python -m src.tcp.replay grabacion.bin --speed 10 --framing newline
+    python -m src.tcp.replay grabacion.bin --speed max --connections 4
+"""
+
+import argparse
+import asyncio
+import logging
+import struct
+import sys
+import time
+
+from src.tcp.pipeline_stats import StageLatency
+from src.tcp.recorder import iter_recording
+from src.utils import serialization
+
+logger = logging.getLogger(__name__)
+
+LENGTH_PREFIX = struct.Struct("!I")
+REPLAY_FRAMINGS = ("length", "newline", "eof")
+SPEED_MAX = "max"
+
+
+def parse_speed(value: str) -> float | None:
+    """Convierte "1", "10", "10x" o "max" en factor de velocidad (None = sin esperas)."""
+    value = value.strip().lower()
+    if value == SPEED_MAX:
+        return None
+    factor = float(value.rstrip("x"))
+    if factor <= 0:
+        raise argparse.ArgumentTypeError("La velocidad debe ser > 0 o 'max'.")
+    return factor
+
+
+def encode_for_framing(wrapper: bytes, framing: str) -> bytes:
+    if framing == "length":
+        return LENGTH_PREFIX.pack(len(wrapper)) + wrapper
+    if framing == "newline":
+        wrapper = wrapper.rstrip(b"\r\n")
+        if b"\n" in wrapper:
+            # Wrapper grabado en modo eof con saltos de línea: se re-serializa compacto.
+            wrapper = serialization.dumps(serialization.loads(wrapper))
+        return wrapper + b"\n"
+    return wrapper
+
+
+class ReplayStats:
+    def __init__(self):
+        self.wrappers = 0
+        self.bytes = 0
+        self.errors = 0
+        self.elapsed = 0.0
+        self.recorded_span = 0.0
+        self.send_latency = StageLatency()  # write + drain
+        self.schedule_lag = StageLatency()  # retraso respecto al horario grabado
+
+    def report(self) -> str:
+        elapsed = max(self.elapsed, 1e-9)
+        lines = [
+            f"Wrappers enviados: {self.wrappers} ({self.errors} errores)",
+            f"Bytes enviados: {self.bytes}",
+            f"Duración: {self.elapsed:.3f}s (grabación: {self.recorded_span:.3f}s)",
+            f"Throughput: {self.wrappers / elapsed:.1f} wrappers/s, "
+            f"{self.bytes / elapsed / 1024 / 1024:.2f} MiB/s",
+        ]
+        for name, stage in (
+            ("Latencia de envío", self.send_latency),
+            ("Retraso vs. horario", self.schedule_lag),
+        ):
+            if stage.count:
+                lines.append(
+                    f"{name}: p50 {stage.percentile(50) * 1000:.3f}ms "
+                    f"p99 {stage.percentile(99) * 1000:.3f}ms "
+                    f"max {stage.max * 1000:.3f}ms"
+                )
+        return "\n".join(lines)
+
+
+async def _send_persistent(host, port, queue: asyncio.Queue, stats):
+    """
+    Conexión persistente (length/newline) que envía lo que llega por la cola.
+
+    Si la conexión falla, el resto de wrappers se cuentan como errores (la
+    cola se sigue vaciando para no bloquear al productor).
+    """
+    writer = None
+    try:
+        _, writer = await asyncio.open_connection(host, port)
+    except OSError as e:
+        logger.error(f"No se pudo conectar a {host}:{port}: {e}")
+    try:
+        while True:
+            payload = await queue.get()
+            if payload is None:
+                break
+            if writer is None:
+                stats.errors += 1
+                continue
+            started = time.perf_counter()
+            try:
+                writer.write(payload)
+                await writer.drain()
+            except (ConnectionError, OSError) as e:
+                logger.error(f"Conexión con {host}:{port} perdida: {e}")
+                stats.errors += 1
+                writer.close()
+                writer = None
+                continue
+            stats.send_latency.add(time.perf_counter() - started)
+    finally:
+        if writer is not None:
+            writer.close()
+            await writer.wait_closed()
+
+
+async def _send_eof(host, port, queue: asyncio.Queue, stats):
+    """Modo legado: una conexión por wrapper, cerrada tras enviarlo."""
+    while True:
+        payload = await queue.get()
+        if payload is None:
+            break
+        started = time.perf_counter()
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.write(payload)
+            writer.write_eof()
+            await writer.drain()
+            writer.close()
+            await writer.wait_closed()
+        except OSError as e:
+            stats.errors += 1
+            logger.warning(f"Error enviando wrapper: {e}")
+            continue
+        stats.send_latency.add(time.perf_counter() - started)
+
+
+async def replay(
+    path: str,
+    host: str = "127.0.0.1",
+    port: int = 7005,
+    speed: float | None = 1.0,
+    framing: str = "length",
+    connections: int = 1,
+) -> ReplayStats:
+    """
+    Envía los wrappers de la grabación respetando los intervalos grabados
+    divididos por speed (speed None = lo más rápido posible).
+    """
+    stats = ReplayStats()
+    queues = [asyncio.Queue(maxsize=1000) for _ in range(connections)]
+    if framing == "eof":
+        senders = [_send_eof(host, port, q, stats) for q in queues]
+    else:
+        senders = [_send_persistent(host, port, q, stats) for q in queues]
+    sender_tasks = [asyncio.create_task(sender) for sender in senders]
+
+    first_recorded_at = None
+    last_recorded_at = None
+    started = time.perf_counter()
+    try:
+        for index, (recorded_at, wrapper) in enumerate(iter_recording(path)):
+            if first_recorded_at is None:
+                first_recorded_at = recorded_at
+            last_recorded_at = recorded_at
+            if speed is not None:
+                scheduled = started + (recorded_at - first_recorded_at) / speed
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                stats.schedule_lag.add(max(0.0, time.perf_counter() - scheduled))
+            payload = encode_for_framing(bytes(wrapper), framing)
+            await queues[index % connections].put(payload)
+            stats.wrappers += 1
+            stats.bytes += len(payload)
+    finally:
+        for q in queues:
+            await q.put(None)
+        results = await asyncio.gather(*sender_tasks, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                stats.errors += 1
+                logger.error(f"Conexión de reproducción falló: {result}")
+    stats.elapsed = time.perf_counter() - started
+    stats.recorded_span = (
+        last_recorded_at - first_recorded_at if first_recorded_at is not None else 0.0
+    )
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Reproduce una grabación de tráfico contra el broker JSON."
+    )
+    parser.add_argument("recording", help="Archivo generado con TCP_RECORD_PATH")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7005)
+    parser.add_argument(
+        "--speed",
+        type=parse_speed,
+        default=1.0,
+        help="Factor de velocidad (1, 10, 10x...) o 'max'",
+    )
+    parser.add_argument("--framing", choices=REPLAY_FRAMINGS, default="length")
+    parser.add_argument("--connections", type=int, default=1)
+    args = parser.parse_args(argv)
+    if args.connections < 1:
+        parser.error("--connections debe ser >= 1")
+
+    logging.basicConfig(level=logging.INFO)
+    stats = asyncio.run(
+        replay(
+            args.recording,
+            host=args.host,
+            port=args.port,
+            speed=args.speed,
+            framing=args.framing,
+            connections=args.connections,
+        )
+    )
+    print(stats.report())
+    return 0 if not stats.errors else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,9 +4,12 @@ from datetime import datetime
 import aiohttp
 
 from src.controllers.user_devices_controller import UserDevicesController
+from src.tcp.records import DeviceEvent
 from src.utils.common import API_URL_ADMIN_NWPERU
 from src.ws.ws_manager import WebSocketManager
 from src.utils.common import send_message_whatsapp
+from src.utils.logger_config import log_sampled
+from src.utils.timestamps import format_timestamp
 
 logger = logging.getLogger(__name__)
 
@@ -239,39 +242,49 @@ class EventNotifierService:
             *push_notify_tasks, *ws_notify_tasks, return_exceptions=True
         )
 
-    async def process_event_from_device(self, parsed_device_event: dict):
-        imei = parsed_device_event.get("imei")
-        event_type = parsed_device_event.get("event_type")
+    async def process_event_from_device(self, device_event: DeviceEvent):
+        imei = device_event.imei
+        event_type = device_event.event_type
         if not imei or not event_type:
             return
 
         device_in_cache = self.ws_manager.get_device_by_uniqueid(str(imei))
         if not device_in_cache:
-            logger.warning(
-                f"No se encontró dispositivo para IMEI {imei} al procesar evento TCP '{event_type}'."
+            log_sampled(
+                logger,
+                logging.WARNING,
+                ("event_unknown_imei", imei),
+                "No se encontró dispositivo para IMEI %s al procesar evento TCP '%s'.",
+                imei,
+                event_type,
             )
             # Podría ser un dispositivo nuevo que aún no se ha refrescado en el caché global.
             # PositionUpdater se encarga de refrescar el caché si el IMEI es nuevo para una posición.
             # Para un evento, si el dispositivo no está, usualmente no se puede hacer mucho más.
             return
 
+        # Payload del borde WebSocket/push: único punto donde el evento pasa a dict.
         final_event_payload = {
             "deviceid": device_in_cache["id"],
             "name": device_in_cache.get("name", "Desconocido"),
             "uniqueid": imei,
             "type": event_type,
-            "eventtime": parsed_device_event.get(
-                "datetime", datetime.now().isoformat()
+            "eventtime": (
+                format_timestamp(device_event.timestamp)
+                if device_event.timestamp is not None
+                else datetime.now().isoformat()
             ),
-            "latitude": parsed_device_event.get(
-                "latitude", device_in_cache.get("latitude")
+            "latitude": (
+                device_event.latitude
+                if device_event.latitude is not None
+                else device_in_cache.get("latitude")
             ),
-            "longitude": parsed_device_event.get(
-                "longitude", device_in_cache.get("longitude")
+            "longitude": (
+                device_event.longitude
+                if device_event.longitude is not None
+                else device_in_cache.get("longitude")
             ),
         }
-        if "geofencename" in parsed_device_event:
-            final_event_payload["geofencename"] = parsed_device_event["geofencename"]
 
         # Usar instancia local de UserDevicesController para esta operación
         ud_controller_local = UserDevicesController()
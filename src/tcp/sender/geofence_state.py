@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import os
+import struct
+
+logger = logging.getLogger(__name__)
+
+# Geozonas en las que está cada dispositivo según su última posición. Cada
+# posición evalúa solo el punto nuevo y las entradas/salidas salen de la
+# diferencia con este conjunto. Con GEOFENCE_STATE_PATH el estado se guarda
+# en un snapshot binario (un archivo por worker del clúster) para que un
+# reinicio no repita ni pierda transiciones:
+#   cabecera: GEOFENCE_STATE_MAGIC (8 bytes) + cantidad de dispositivos (uint32)
+#   registro: device id (int64) + cantidad de geozonas (uint32) + ids (int64 c/u)
+# El archivo se escribe aparte y se reemplaza con os.replace (atómico).
+GEOFENCE_STATE_MAGIC = b"WSIGEO01"
+STATE_HEADER = struct.Struct("<I")
+DEVICE_HEADER = struct.Struct("<qI")
+DEFAULT_STATE_FLUSH_INTERVAL = 30.0  # segundos
+
+
+class GeofenceStateFormatError(ValueError):
+    pass
+
+
+class GeofenceMembership:
+    """
+    Conjunto (frozenset de ids de geozona) por dispositivo. Solo se modifica
+    desde el event loop; save() serializa ahí y escribe el archivo en un hilo.
+    """
+
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self.inside: dict = {}
+        self.dirty = False
+
+    def get(self, device_id) -> frozenset | None:
+        """Geozonas del dispositivo, o None si aún no se conoce su estado."""
+        return self.inside.get(device_id)
+
+    def set(self, device_id, geofence_ids: frozenset):
+        if self.inside.get(device_id) != geofence_ids:
+            self.inside[device_id] = geofence_ids
+            self.dirty = True
+
+    def discard(self, device_id):
+        if self.inside.pop(device_id, None) is not None:
+            self.dirty = True
+
+    def dumps(self) -> bytes:
+        parts = [GEOFENCE_STATE_MAGIC, b""]
+        count = 0
+        for device_id, geofence_ids in self.inside.items():
+            # Los ids de Traccar son enteros; otro tipo no entra en el formato.
+            if not isinstance(device_id, int) or not all(
+                isinstance(geofence_id, int) for geofence_id in geofence_ids
+            ):
+                continue
+            parts.append(DEVICE_HEADER.pack(device_id, len(geofence_ids)))
+            parts.append(struct.pack(f"<{len(geofence_ids)}q", *sorted(geofence_ids)))
+            count += 1
+        parts[1] = STATE_HEADER.pack(count)
+        return b"".join(parts)
+
+    @staticmethod
+    def loads(data: bytes) -> dict:
+        if data[: len(GEOFENCE_STATE_MAGIC)] != GEOFENCE_STATE_MAGIC:
+            raise GeofenceStateFormatError("cabecera de snapshot inválida")
+        offset = len(GEOFENCE_STATE_MAGIC)
+        try:
+            (count,) = STATE_HEADER.unpack_from(data, offset)
+            offset += STATE_HEADER.size
+            inside = {}
+            for _ in range(count):
+                device_id, length = DEVICE_HEADER.unpack_from(data, offset)
+                offset += DEVICE_HEADER.size
+                inside[device_id] = frozenset(
+                    struct.unpack_from(f"<{length}q", data, offset)
+                )
+                offset += length * 8
+        except struct.error as e:
+            raise GeofenceStateFormatError(f"snapshot truncado: {e}") from e
+        return inside
+
+    def load(self) -> int:
+        """Carga el snapshot de self.path. Devuelve la cantidad de dispositivos."""
+        if not self.path:
+            return 0
+        try:
+            with open(self.path, "rb") as f:
+                self.inside = self.loads(f.read())
+        except FileNotFoundError:
+            return 0
+        except (OSError, GeofenceStateFormatError) as e:
+            logger.warning(
+                f"No se pudo leer el estado de geozonas {self.path}: {e}. Se inicia vacío."
+            )
+            self.inside = {}
+            return 0
+        self.dirty = False
+        logger.info(
+            f"Estado de geozonas cargado de {self.path}: {len(self.inside)} dispositivos."
+        )
+        return len(self.inside)
+
+    async def save(self) -> bool:
+        """Escribe el snapshot si hubo cambios. False si no había nada que escribir o falló."""
+        if not self.path or not self.dirty:
+            return False
+        data = self.dumps()
+        self.dirty = False
+        try:
+            await asyncio.to_thread(self._write, self.path, data)
+        except OSError as e:
+            self.dirty = True
+            logger.error(f"Error guardando el estado de geozonas en {self.path}: {e}")
+            return False
+        return True
+
+    @staticmethod
+    def _write(path: str, data: bytes):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary_path, path)
+
+    async def save_periodically(self, interval: float = DEFAULT_STATE_FLUSH_INTERVAL):
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                await self.save()
+        except asyncio.CancelledError:
+            logger.info("Guardado periódico del estado de geozonas detenido.")
+
+
+def open_membership_from_env(worker_index: int | None = None) -> GeofenceMembership:
+    """Estado de geozonas, persistido si GEOFENCE_STATE_PATH está definido (un archivo por worker del clúster)."""
+    path = os.getenv("GEOFENCE_STATE_PATH") or None
+    if path and worker_index is not None:
+        path = f"{path}.{worker_index}"
+    membership = GeofenceMembership(path)
+    membership.load()
+    return membership
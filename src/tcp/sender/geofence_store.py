@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import os
+import time
+
+from src.controllers.device_geofence_controller import DeviceGeofenceController
+from src.utils.geofence import CompiledGeofence, GeofenceIndex
+
+logger = logging.getLogger(__name__)
+
+# Geozonas por dispositivo en memoria. Se cargan en bloque desde
+# tc_device_geofence / tc_geofences (una consulta) y se recargan cada
+# GEOFENCE_REFRESH_INTERVAL segundos o a pedido (/api/update-geofences). En la
+# recarga solo se vuelven a compilar las geozonas nuevas o con el área
+# cambiada. El camino de posiciones solo lee el mapa ya armado: sin consultas
+# a la BD ni parseo de WKT por posición.
+GEOFENCE_REFRESH_INTERVAL = float(os.getenv("GEOFENCE_REFRESH_INTERVAL", 300))
+# Sin una primera carga exitosa, las posiciones reintentan como mucho cada tanto.
+GEOFENCE_LOAD_RETRY_INTERVAL = 30
+
+EMPTY_GEOFENCE_INDEX = GeofenceIndex(())
+
+
+class GeofenceStore:
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super(GeofenceStore, cls).__new__(cls)
+            # geofence id -> CompiledGeofence; device id -> GeofenceIndex.
+            # Ambos se reemplazan enteros en cada recarga.
+            cls._instance.geofences = {}
+            cls._instance.by_device = {}
+            cls._instance.loaded = False
+            cls._instance.last_loaded_at = None
+            cls._instance._refresh_task = None
+            cls._instance._last_attempt_at = None
+            logger.info("GeofenceStore instanciado.")
+        return cls._instance
+
+    def get_device_geofences(self, device_id) -> GeofenceIndex:
+        """Índice de las geozonas asignadas al dispositivo (vacío si no tiene)."""
+        return self.by_device.get(device_id, EMPTY_GEOFENCE_INDEX)
+
+    async def ensure_loaded(self) -> bool:
+        """Carga el store si aún no se cargó. False si no hay geozonas cargadas."""
+        if self.loaded:
+            return True
+        if (
+            self._last_attempt_at is None
+            or time.monotonic() - self._last_attempt_at >= GEOFENCE_LOAD_RETRY_INTERVAL
+            or (self._refresh_task is not None and not self._refresh_task.done())
+        ):
+            await self.refresh()
+        return self.loaded
+
+    async def refresh(self) -> bool:
+        """
+        Recarga las geozonas. Con una recarga en curso, espera esa misma
+        (single-flight) en vez de lanzar otra consulta.
+
+        Returns:
+            bool: True si la recarga terminó bien; si falla se conserva lo anterior.
+        """
+        task = self._refresh_task
+        if task is None or task.done():
+            task = asyncio.create_task(self._run_refresh())
+            self._refresh_task = task
+        return await asyncio.shield(task)
+
+    async def refresh_periodically(self, interval: float = GEOFENCE_REFRESH_INTERVAL):
+        try:
+            while True:
+                await self.refresh()
+                await asyncio.sleep(interval)
+        except asyncio.CancelledError:
+            logger.info("Recarga periódica de geozonas detenida.")
+
+    async def _run_refresh(self) -> bool:
+        self._last_attempt_at = time.monotonic()
+        started = time.perf_counter()
+        try:
+            rows = await asyncio.to_thread(self._load_rows)
+        except Exception as e:
+            logger.error(f"Error cargando geozonas: {e}", exc_info=True)
+            return False
+        if rows is None:
+            logger.warning(
+                "No se pudieron cargar las geozonas. Se conservan las actuales."
+            )
+            return False
+        compiled = self.apply_rows(rows)
+        logger.info(
+            f"Geozonas cargadas: {len(self.geofences)} geozonas, {len(self.by_device)} "
+            f"dispositivos, {compiled} compiladas en "
+            f"{(time.perf_counter() - started) * 1000:.0f} ms."
+        )
+        return True
+
+    @staticmethod
+    def _load_rows():
+        controller = DeviceGeofenceController()
+        try:
+            return controller.get_all_device_geofences()
+        finally:
+            controller.close()
+
+    def apply_rows(self, rows: list) -> int:
+        """
+        Arma el store a partir de filas (deviceid, geofenceid, name, area).
+        Reutiliza las geozonas ya compiladas con la misma área.
+
+        Returns:
+            int: Cantidad de geozonas compiladas en esta carga.
+        """
+        geofences = {}
+        device_geofences = {}
+        invalid = set()
+        compiled_count = 0
+        for row in rows:
+            geofence_id = row.get("geofenceid")
+            area = row.get("area")
+            if geofence_id is None or not area or geofence_id in invalid:
+                continue
+            geofence = geofences.get(geofence_id)
+            if geofence is None:
+                previous = self.geofences.get(geofence_id)
+                if previous is not None and previous.area == area:
+                    geofence = previous
+                    geofence.name = row.get("name", "N/A")
+                else:
+                    try:
+                        geofence = CompiledGeofence(
+                            geofence_id, row.get("name", "N/A"), area
+                        )
+                    except Exception as e:
+                        logger.warning(f"Geozona {geofence_id} inválida, se omite: {e}")
+                        invalid.add(geofence_id)
+                        continue
+                    compiled_count += 1
+                geofences[geofence_id] = geofence
+            device_geofences.setdefault(row.get("deviceid"), []).append(geofence)
+
+        # Los dispositivos con el mismo conjunto de geozonas comparten índice.
+        indexes = {}
+        by_device = {}
+        for device_id, items in device_geofences.items():
+            key = tuple(geofence.id for geofence in items)
+            index = indexes.get(key)
+            if index is None:
+                index = indexes[key] = GeofenceIndex(items)
+            by_device[device_id] = index
+
+        self.geofences = geofences
+        self.by_device = by_device
+        self.loaded = True
+        self.last_loaded_at = time.time()
+        return compiled_count
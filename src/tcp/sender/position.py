@@ -1,42 +1,44 @@
 import asyncio
 import logging
-from datetime import datetime
-from src.controllers.device_geofence_controller import (
-    DeviceGeofenceController,
-)
-from src.utils.geofence import check_geofence_event
+from src.tcp.sender.geofence_state import GeofenceMembership
+from src.tcp.sender.geofence_store import GeofenceStore
 from src.ws.ws_manager import WebSocketManager
 from src.controllers.devices_controller import (
     DevicesController,
 )
+from src.tcp.records import Connection, Position
 from src.tcp.sender.events import EventNotifierService
-from src.utils.common import get_datetime_now
+from src.utils.timestamps import format_timestamp, now_epoch, parse_timestamp
+from src.utils.logger_config import log_sampled
 
 logger = logging.getLogger(__name__)
 
 
-def is_more_recent_gps_date(prev_dt_str: str | None, curr_dt_str: str) -> bool:
+def is_more_recent_gps_date(prev_dt_str: str | None, curr_timestamp: int) -> bool:
+    # lastupdate es casi siempre un texto que se formateó aquí mismo: su
+    # conversión a epoch sale del caché de src.utils.timestamps.
     if not prev_dt_str:
         return True
-    try:
-        return datetime.strptime(prev_dt_str, "%Y-%m-%d %H:%M:%S") < datetime.strptime(
-            curr_dt_str, "%Y-%m-%d %H:%M:%S"
-        )
-    except ValueError:
-        logger.warning(f"Error comparando fechas: '{prev_dt_str}' vs '{curr_dt_str}'")
+    prev_timestamp = parse_timestamp(prev_dt_str)
+    if prev_timestamp is None:
+        logger.warning("Error comparando fechas: '%s' vs '%s'", prev_dt_str, curr_timestamp)
         return False
+    return prev_timestamp < curr_timestamp
 
 
 class PositionUpdater:
     def __init__(
-        self, ws_manager: WebSocketManager, event_notifier: EventNotifierService
+        self,
+        ws_manager: WebSocketManager,
+        event_notifier: EventNotifierService,
+        geofence_membership: GeofenceMembership | None = None,
     ):
         self.ws_manager = ws_manager
         self.event_notifier = event_notifier
         self.devices_controller_internal = DevicesController()
-        self._refresh_lock = (
-            asyncio.Lock()
-        )
+        self.geofence_store = GeofenceStore()  # Accede al singleton
+        # Geozonas en las que está cada dispositivo (sin persistir si no se pasa).
+        self.geofence_membership = geofence_membership or GeofenceMembership()
         logger.info("PositionUpdater instanciado.")
 
     async def _close_internal_controllers(self):
@@ -47,122 +49,118 @@ class PositionUpdater:
             await asyncio.to_thread(self.devices_controller_internal.close)
             logger.info("DevicesController interno de PositionUpdater cerrado.")
 
-    async def process_position_update(self, position_event_data: dict):
-        imei = position_event_data.get("imei")
-        new_dt_str = position_event_data.get("datetime")
-        if not imei or not new_dt_str:
+    async def process_position_update(self, position: Position):
+        imei = position.imei
+        new_timestamp = position.timestamp
+        if not imei or new_timestamp is None:
             return
 
-        device_in_cache = self.ws_manager.get_device_by_uniqueid(str(imei))
-
+        # Un IMEI desconocido se une al refresco compartido del caché; si
+        # sigue sin existir queda en el caché negativo del WebSocketManager.
+        device_in_cache = await self.ws_manager.get_device_by_uniqueid_or_refresh(
+            str(imei)
+        )
         if not device_in_cache:
-            logger.info(
-                f"IMEI {imei} no encontrado en caché. Disparando refresco completo desde API."
+            log_sampled(
+                logger,
+                logging.WARNING,
+                ("still_unknown_imei", imei),
+                "Posición IMEI %s: dispositivo no encontrado en caché ni en la API.",
+                imei,
             )
-            await self.ws_manager._update_selective_devices_cache()
-            device_in_cache = self.ws_manager.get_device_by_uniqueid(
-                str(imei)
-            )
-            if not device_in_cache:
-                logger.warning(
-                    f"Posición IMEI {imei}: dispositivo aún no encontrado en caché después de refresco completo desde API."
-                )
-                return
+            return
 
-        prev_geo = {
-            "id": device_in_cache["id"],
-            "name": device_in_cache.get("name"),
-            "uniqueid": device_in_cache["uniqueid"],
-            "latitude": device_in_cache.get("latitude"),
-            "longitude": device_in_cache.get("longitude"),
-            "lastupdate": device_in_cache.get("lastupdate"),
-            "contactos": device_in_cache.get("contactos"),
-        }
-
-        if not is_more_recent_gps_date(prev_geo["lastupdate"], new_dt_str):
+        if not is_more_recent_gps_date(device_in_cache.get("lastupdate"), new_timestamp):
             return
 
-        laststop_val = device_in_cache.get(
-            "laststop", get_datetime_now()
-        )
+        # Solo se conserva la posición anterior; no se copia el dispositivo.
+        prev_latitude = device_in_cache.get("latitude")
+        prev_longitude = device_in_cache.get("longitude")
+        laststop_val = device_in_cache.get("laststop")
 
-        device_in_cache["latitude"] = position_event_data.get("latitude", 0.0)
-        device_in_cache["longitude"] = position_event_data.get("longitude", 0.0)
-        current_speed = position_event_data.get("speed", 0.0)
+        current_speed = position.speed
+        device_in_cache["latitude"] = position.latitude
+        device_in_cache["longitude"] = position.longitude
         device_in_cache["speed"] = current_speed
-        device_in_cache["course"] = position_event_data.get("course", 0.0)
+        device_in_cache["course"] = position.course
+        # El caché publicado conserva el formato de texto de la API.
+        new_dt_str = format_timestamp(new_timestamp)
         device_in_cache["lastupdate"] = new_dt_str
         device_in_cache["status"] = "online"
-        device_in_cache["laststop"] = (
-            laststop_val if current_speed == 0.0 else new_dt_str
-        )
+        if current_speed != 0.0:
+            device_in_cache["laststop"] = new_dt_str
+        elif laststop_val is None:
+            device_in_cache["laststop"] = format_timestamp(now_epoch())
+        self.ws_manager.publish_device_state(device_in_cache)
 
-        await self._check_geofence_transitions(prev_geo, position_event_data)
+        prev_point = None
+        if prev_latitude is not None and prev_longitude is not None:
+            prev_point = (prev_latitude, prev_longitude)
+        await self._check_geofence_transitions(device_in_cache, prev_point, position)
 
     async def _check_geofence_transitions(
-        self, prev_dev_state: dict, curr_pos_data: dict
+        self, device: dict, prev_point: tuple | None, position: Position
     ):
-        dev_id = prev_dev_state.get("id")
+        dev_id = device.get("id")
         if dev_id is None:
             return
 
-        local_dgc = DeviceGeofenceController()
+        # Geozonas ya compiladas en memoria: sin consulta a la BD por posición.
+        if not await self.geofence_store.ensure_loaded():
+            return
         try:
-            geofences = await asyncio.to_thread(local_dgc.get_geofences, dev_id)
+            geofences = self.geofence_store.get_device_geofences(dev_id)
             if not geofences:
+                self.geofence_membership.discard(dev_id)
                 return
 
-            curr_pt = {
-                "latitude": curr_pos_data["latitude"],
-                "longitude": curr_pos_data["longitude"],
-            }
-            prev_pt = {
-                "latitude": prev_dev_state["latitude"],
-                "longitude": prev_dev_state["longitude"],
-            }
-            if prev_pt["latitude"] is None or prev_pt["longitude"] is None:
-                return
-
-            for gf in geofences:
-                if not gf.get("area"):
-                    continue
-                trans_type = check_geofence_event(gf["area"], prev_pt, curr_pt)
-                if trans_type:
-                    await self.event_notifier.create_and_notify_custom_event(
-                        device_info=prev_dev_state,
-                        event_type=trans_type,
-                        additional_data={"geofencename": gf.get("name", "N/A")},
-                    )
+            # Solo se evalúa el punto nuevo; las transiciones salen de la
+            # diferencia con las geozonas en las que estaba el dispositivo.
+            curr_inside = geofences.containing_ids(position.latitude, position.longitude)
+            prev_inside = self.geofence_membership.get(dev_id)
+            if prev_inside is None:
+                # Sin estado previo (dispositivo nuevo o sin snapshot): se
+                # reconstruye con la posición anterior, si la hay.
+                if prev_point is None:
+                    self.geofence_membership.set(dev_id, curr_inside)
+                    return
+                prev_inside = geofences.containing_ids(prev_point[0], prev_point[1])
+            self.geofence_membership.set(dev_id, curr_inside)
+
+            for gf, trans_type in geofences.transitions(prev_inside, curr_inside):
+                await self.event_notifier.create_and_notify_custom_event(
+                    device_info=device,
+                    event_type=trans_type,
+                    additional_data={"geofencename": gf.name},
+                )
         except Exception as e:
-            logger.error(
-                f"Error procesando geocercas para device_id {dev_id}: {e}",
-                exc_info=False,
+            log_sampled(
+                logger,
+                logging.ERROR,
+                ("geofence_error", dev_id),
+                "Error procesando geocercas para device_id %s: %s",
+                dev_id,
+                e,
             )  # Menos verboso
-        finally:
-            if hasattr(local_dgc, "close") and callable(getattr(local_dgc, "close")):
-                await asyncio.to_thread(
-                    local_dgc.close
-                )  # Cerrar instancia local de DGC
-
-    async def update_device_last_seen(self, conn_event_data: dict):
-        imei = conn_event_data.get("imei")
-        conn_dt = conn_event_data.get("datetime")
-        if not imei or not conn_dt:
+
+    async def update_device_last_seen(self, connection: Connection):
+        imei = connection.imei
+        conn_timestamp = connection.timestamp
+        if not imei or conn_timestamp is None:
             return
 
-        dev_cache = self.ws_manager.get_device_by_uniqueid(str(imei))
+        dev_cache = await self.ws_manager.get_device_by_uniqueid_or_refresh(str(imei))
         if not dev_cache:
-            logger.info(
-                f"Conexión de IMEI {imei} no encontrado en caché. Disparando refresco completo desde API."
+            log_sampled(
+                logger,
+                logging.WARNING,
+                ("still_unknown_imei", imei),
+                "Conexión IMEI %s: dispositivo no encontrado en caché ni en la API.",
+                imei,
             )
-            await self.ws_manager._update_selective_devices_cache() 
-            dev_cache = self.ws_manager.get_device_by_uniqueid(str(imei))
-            if not dev_cache:
-                logger.warning(
-                    f"Conexión IMEI {imei}: dispositivo aún no encontrado en caché después de refresco completo desde API."
-                )
-                return
+            return
 
-        if is_more_recent_gps_date(dev_cache.get("lastupdate"), conn_dt):
-            dev_cache["lastupdate"] = conn_dt
+        if is_more_recent_gps_date(dev_cache.get("lastupdate"), conn_timestamp):
+            dev_cache["lastupdate"] = format_timestamp(conn_timestamp)
             dev_cache["status"] = "online"
+            self.ws_manager.publish_device_state(dev_cache)
@@ -1,155 +1,637 @@
 # src/tcp/tcp_server.py
 import asyncio
-import json
 import logging
-from src.tcp.parser.h02 import decode_h02
-from src.tcp.parser.gps103 import decode_gps103
-from src.tcp.parser.osmand import decode_osmand
+import os
+import re
+import struct
+import time
+import zlib
+from collections import OrderedDict
+from src.tcp.parser.registry import (
+    PORT_COBAN,
+    DecoderSpec,
+    build_default_registry,
+    load_decoder_plugins,
+)
+from src.tcp.parser.stream import DEFAULT_MAX_FRAME_SIZE
 from src.tcp.sender.position import PositionUpdater
 from src.tcp.sender.events import EventNotifierService
+from src.tcp.sender.geofence_store import GEOFENCE_REFRESH_INTERVAL
+from src.tcp.sender.geofence_state import open_membership_from_env
+from src.tcp.pipeline_stats import PipelineStats
+from src.tcp.decode_pool import DecodePool, DEFAULT_DECODE_CHUNK_SIZE
+from src.tcp.cluster import (
+    INVALIDATE_DEVICES,
+    INVALIDATE_GEOFENCES,
+    OP_INVALIDATE,
+    BrokerCluster,
+)
+from src.tcp.recorder import DEFAULT_RECORD_FLUSH_INTERVAL, open_recorder_from_env
+from src.tcp.records import (
+    EVENT_TYPE_UNKNOWN,
+    Connection,
+    DeviceEvent,
+    Position,
+    Record,
+    record_from_dict,
+)
 from src.ws.ws_manager import WebSocketManager
+from src.utils import serialization
+from src.utils.logger_config import log_sampled
 
 logger = logging.getLogger(__name__)
 
-PORT_COBAN = 6001
-PORT_SINOTRACK = 6013
-# PORT_TELTONIKA = 6027
-PORT_TRACCAR_CLIENT = 6055
+MAX_MESSAGE_SIZE = 10 * 1024 * 1024
 
-TYPE_CONNECTION = "conexion"
-TYPE_POSITION = "position"
-TYPE_EVENT = "event"
-EVENT_TYPE_UNKNOWN = "unknown"
+# Modos de framing de la conexión con el forwarder:
+# - "eof": un único wrapper JSON por conexión, leído hasta EOF (forwarders antiguos).
+# - "newline": conexión persistente, un wrapper JSON por línea (terminado en "\n").
+# - "length": conexión persistente, cada wrapper precedido por su longitud (uint32 big-endian).
+FRAMING_EOF = "eof"
+FRAMING_NEWLINE = "newline"
+FRAMING_LENGTH = "length"
+SUPPORTED_FRAMINGS = (FRAMING_EOF, FRAMING_NEWLINE, FRAMING_LENGTH)
+
+LENGTH_PREFIX = struct.Struct("!I")
+
+# Pipeline de ingesta: los lectores encolan frames en shards por IMEI y cada
+# shard tiene un único worker, así un dispositivo se procesa siempre en orden.
+DEFAULT_INGEST_QUEUE_SIZE = 10000
+DEFAULT_INGEST_WORKERS = 4
+DEFAULT_STATS_INTERVAL = 60  # segundos
+
+# Reensamblado de frames partidos entre wrappers: solo para wrappers con un
+# campo "stream" (identificador de la conexión del dispositivo en el forwarder).
+# Teltonika lo requiere: sin él, un paquete AVL no trae el IMEI y se rechaza.
+DEFAULT_STREAM_IDLE_TTL = 300  # segundos sin datos antes de descartar la cola
+MAX_TRACKED_STREAMS = 100000
+
+# Extrae el IMEI de un frame crudo sin decodificarlo (GPS103, H02, OsmAnd).
+IMEI_HINT_PATTERN = re.compile(rb"imei:(\d+)|HQ,(\d+),|[?&]id=([^&\s]+)|^\s*(\d+);")
+# Teltonika (hexadecimal): handshake con la longitud (u16, 15-17) y el IMEI en
+# ASCII, que TeltonikaFramer antepone a cada grupo de paquetes AVL.
+TELTONIKA_IMEI_HINT_PATTERN = re.compile(rb"^\s*00(?:0[fF]|1[01])((?:3\d){15,17})")
 
-MAX_MESSAGE_SIZE = 10 * 1024 * 1024
+
+def extract_imei_hint(raw_gps_data: bytes) -> bytes | None:
+    """Devuelve el primer IMEI visible en el frame crudo, o None."""
+    match = IMEI_HINT_PATTERN.search(raw_gps_data)
+    if match:
+        return next(group for group in match.groups() if group)
+    match = TELTONIKA_IMEI_HINT_PATTERN.match(raw_gps_data)
+    if match:
+        return bytes.fromhex(match.group(1).decode("ascii"))
+    return None
 
 
 class TCPServer:
     def __init__(
-        self, host: str = "0.0.0.0", port: int = 7005
-    ):  # Puerto del broker JSON
+        self,
+        host: str = "0.0.0.0",
+        port: int = 7005,  # Puerto del broker JSON
+        framing: str | None = None,
+        queue_size: int | None = None,
+        workers: int | None = None,
+        cluster: BrokerCluster | None = None,
+    ):
         self.host = host
         self.port = port
+        self.framing = (framing or os.getenv("TCP_BROKER_FRAMING", FRAMING_EOF)).lower()
+        if self.framing not in SUPPORTED_FRAMINGS:
+            logger.warning(
+                f"Framing '{self.framing}' no soportado. Usando '{FRAMING_EOF}'."
+            )
+            self.framing = FRAMING_EOF
+        self.queue_size = max(
+            1,
+            queue_size
+            or int(os.getenv("TCP_INGEST_QUEUE_SIZE", DEFAULT_INGEST_QUEUE_SIZE)),
+        )
+        self.worker_count = max(
+            1, workers or int(os.getenv("TCP_INGEST_WORKERS", DEFAULT_INGEST_WORKERS))
+        )
+        self.stats_interval = int(
+            os.getenv("TCP_STATS_INTERVAL", DEFAULT_STATS_INTERVAL)
+        )
+        # Una cola acotada por shard: cuando se llena, los lectores esperan (backpressure).
+        self.shard_queue_size = max(1, self.queue_size // self.worker_count)
+        self.shard_queues: list[asyncio.Queue] = [
+            asyncio.Queue(maxsize=self.shard_queue_size)
+            for _ in range(self.worker_count)
+        ]
+        self.stats = PipelineStats()
+        # En modo multi-proceso, solo se procesan aquí los IMEIs de este worker.
+        self.cluster = cluster
+        # Decodificación opcional en procesos aparte (0 = inline en el event loop).
+        self.decode_pool = DecodePool(
+            processes=int(os.getenv("TCP_DECODE_PROCESSES", 0)),
+            chunk_size=int(
+                os.getenv("TCP_DECODE_CHUNK_SIZE", DEFAULT_DECODE_CHUNK_SIZE)
+            ),
+        )
+        # Grabación opcional de los wrappers recibidos (TCP_RECORD_PATH) para reproducirlos luego.
+        self.recorder = open_recorder_from_env(
+            cluster.worker_index if cluster is not None else None
+        )
+        self._worker_tasks: list[asyncio.Task] = []
         self.ws_manager = WebSocketManager()  # Accede al singleton
         self.event_notifier = EventNotifierService(self.ws_manager)
-        self.position_updater = PositionUpdater(self.ws_manager, self.event_notifier)
+        # Estado de geozonas por dispositivo, persistido con GEOFENCE_STATE_PATH.
+        self.geofence_membership = open_membership_from_env(
+            cluster.worker_index if cluster is not None else None
+        )
+        self.position_updater = PositionUpdater(
+            self.ws_manager, self.event_notifier, self.geofence_membership
+        )
 
-        self.protocol_decoders = {
-            PORT_COBAN: decode_gps103,  # Usa los nombres de función de tus parsers
-            PORT_SINOTRACK: decode_h02,
-            PORT_TRACCAR_CLIENT: decode_osmand,
-        }
+        # Decodificadores por puerto y por firma; TCP_DECODER_PLUGINS agrega otros.
+        self.decoder_registry = load_decoder_plugins(
+            build_default_registry(), os.getenv("TCP_DECODER_PLUGINS")
+        )
+        self.stream_max_frame_size = int(
+            os.getenv("TCP_STREAM_MAX_FRAME_SIZE", DEFAULT_MAX_FRAME_SIZE)
+        )
+        self.stream_idle_ttl = int(
+            os.getenv("TCP_STREAM_IDLE_TTL", DEFAULT_STREAM_IDLE_TTL)
+        )
+        # Orden de uso (LRU): al alcanzar MAX_TRACKED_STREAMS se descarta el
+        # stream que lleva más tiempo sin recibir datos.
+        self.stream_framers: OrderedDict[tuple, object] = OrderedDict()
         logger.info(
-            f"TCPServer inicializado para JSON broker en {self.host}:{self.port}."
+            f"TCPServer inicializado para JSON broker en {self.host}:{self.port} "
+            f"(framing: {self.framing}, cola: {self.queue_size}, shards: {self.worker_count})."
         )
 
-    async def _process_decoded_data(
-        self, device_original_port: int, data_payload: dict
+    async def _process_decoded_data(self, device_original_port: int, record: Record):
+        record_class = type(record)
+        if record_class is Position:
+            await self.position_updater.process_position_update(record)
+        elif record_class is Connection:
+            await self.position_updater.update_device_last_seen(record)
+        elif record_class is DeviceEvent and record.event_type != EVENT_TYPE_UNKNOWN:
+            await self.event_notifier.process_event_from_device(record)
+
+    async def _process_decoded_list(
+        self, device_original_port: int, decoded_records: list
     ):
-        data_type = data_payload.get("type")
-        if data_type == TYPE_CONNECTION:
-            await self.position_updater.update_device_last_seen(data_payload)
-        elif data_type == TYPE_POSITION:
-            await self.position_updater.process_position_update(data_payload)
-        elif (
-            data_type == TYPE_EVENT
-            and data_payload.get("event_type") != EVENT_TYPE_UNKNOWN
+        for record in decoded_records:
+            if isinstance(record, dict):
+                # Formato anterior (p. ej. plugins de decodificador).
+                decoded_dict = record
+                record = record_from_dict(decoded_dict)
+                if record is None:
+                    logger.warning(
+                        "Dato sin 'type' válido de puerto %s: %s",
+                        device_original_port,
+                        decoded_dict,
+                    )
+                    continue
+            elif not isinstance(record, Record):
+                logger.warning(
+                    "Decodificador para %s no devolvió un registro: %s",
+                    device_original_port,
+                    record,
+                )
+                continue
+            # logger.info(f"{device_original_port} - {record}")  # Log de datos decodificados
+            if device_original_port == PORT_COBAN:
+                log_sampled(
+                    logger,
+                    logging.INFO,
+                    ("decoded", device_original_port),
+                    "Datos decodificados de Coban (puerto 6001): %s",
+                    record,
+                )
+            await self._process_decoded_data(device_original_port, record)
+
+    async def _decode_and_process_raw_gps_data(self, frames: list):
+        """
+        Decodifica un lote de frames (port, raw_data, DecoderSpec) de un mismo
+        shard y despacha los resultados en el orden de llegada.
+        """
+        jobs = [
+            (decoder.decode, raw_message_data)
+            for _, raw_message_data, decoder in frames
+        ]
+        job_ports = [device_original_port for device_original_port, _, _ in frames]
+        if not jobs:
+            return
+
+        # Tus parsers devuelven una lista de dicts
+        decode_started_at = time.perf_counter()
+        decode_results = await self.decode_pool.decode(jobs)
+        self.stats.record("decode", time.perf_counter() - decode_started_at)
+
+        for device_original_port, job, decode_result in zip(
+            job_ports, jobs, decode_results
         ):
-            await self.event_notifier.process_event_from_device(data_payload)
-        elif data_type is None:
-            logger.warning(
-                f"Dato sin 'type' de puerto {device_original_port}: {data_payload}"
+            decoder_function, raw_message_data = job
+            decoded_ok, decoded_result = decode_result
+            if not decoded_ok:
+                log_sampled(
+                    logger,
+                    logging.ERROR,
+                    ("decode_error", device_original_port),
+                    "Error decodificando datos para puerto %s con %s: %s",
+                    device_original_port,
+                    decoder_function.__name__,
+                    decoded_result,
+                )
+                logger.debug(
+                    "Datos crudos (GPS) que causaron error: %s", raw_message_data[:500]
+                )
+                continue
+            dispatch_started_at = time.perf_counter()
+            try:
+                await self._process_decoded_list(device_original_port, decoded_result)
+            except Exception as e:
+                logger.error(
+                    "Error procesando datos decodificados del puerto %s: %s",
+                    device_original_port,
+                    e,
+                    exc_info=True,
+                )
+            self.stats.record("dispatch", time.perf_counter() - dispatch_started_at)
+
+    def _shard_for_frame(self, device_port: int, raw_gps_data: bytes) -> int:
+        """Elige el shard por hash del IMEI; sin IMEI visible, por puerto."""
+        shard_key = extract_imei_hint(raw_gps_data) or str(device_port).encode()
+        shard_hash = zlib.crc32(shard_key)
+        if self.cluster is not None:
+            # El resto módulo N ya fijó el worker dueño; usar el cociente reparte
+            # los IMEIs de este worker entre todos sus shards.
+            shard_hash //= self.cluster.worker_count
+        return shard_hash % self.worker_count
+
+    def _ingest_queue_depth(self) -> int:
+        return sum(queue.qsize() for queue in self.shard_queues)
+
+    async def _enqueue_frame(
+        self, device_port: int, raw_gps_data: bytes, decoder: DecoderSpec
+    ):
+        """Encola un frame en el shard de su IMEI. Espera si ese shard está lleno."""
+        shard_queue = self.shard_queues[
+            self._shard_for_frame(device_port, raw_gps_data)
+        ]
+        frame = (device_port, raw_gps_data, decoder, time.perf_counter())
+        try:
+            shard_queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            self.stats.backpressure_waits += 1
+            await shard_queue.put(frame)
+        self.stats.frames_enqueued += 1
+
+    async def _ingest_worker(self, worker_id: int):
+        """Único consumidor de su shard: decodifica y despacha frames en orden."""
+        logger.debug(f"Worker de ingesta {worker_id} iniciado.")
+        shard_queue = self.shard_queues[worker_id]
+        while True:
+            # Toma lo que haya en el shard (hasta chunk_size) para decodificarlo en lote.
+            batch = [await shard_queue.get()]
+            while len(batch) < self.decode_pool.chunk_size:
+                try:
+                    batch.append(shard_queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            try:
+                dequeued_at = time.perf_counter()
+                for _, _, _, enqueued_at in batch:
+                    self.stats.record("queue_wait", dequeued_at - enqueued_at)
+                await self._decode_and_process_raw_gps_data(
+                    [
+                        (device_port, raw_gps_data, decoder)
+                        for device_port, raw_gps_data, decoder, _ in batch
+                    ]
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(
+                    f"Error inesperado en worker de ingesta {worker_id}: {e}",
+                    exc_info=True,
+                )
+            finally:
+                for _ in batch:
+                    shard_queue.task_done()
+
+    async def _report_pipeline_stats_periodically(self):
+        while True:
+            await asyncio.sleep(self.stats_interval)
+            snapshot = self.stats.snapshot_and_reset(
+                self._ingest_queue_depth(),
+                self.shard_queue_size * self.worker_count,
+            )
+            stages_desc = ", ".join(
+                f"{name}: avg {st['avg_ms']}ms p99 {st['p99_ms']}ms max {st['max_ms']}ms"
+                for name, st in snapshot["stages"].items()
+            )
+            logger.info(
+                f"Pipeline TCP: cola {snapshot['queue_depth']}/{snapshot['queue_capacity']}, "
+                f"{snapshot['frames_enqueued']} frames ({snapshot['frames_per_second']}/s), "
+                f"backpressure {snapshot['backpressure_waits']}. {stages_desc}"
             )
 
-    async def _decode_and_process_raw_gps_data(
-        self, device_original_port: int, raw_message_data: str
+    def _reassemble_stream(
+        self, stream_key: tuple, decoder: DecoderSpec, raw_gps_data: bytes
     ):
-        decoder_function = self.protocol_decoders.get(device_original_port)
-        if not decoder_function:
-            logger.warning(
-                f"No hay decodificador para puerto original {device_original_port}."
+        """
+        Agrega el fragmento a la cola de su stream y devuelve los frames
+        completos, o None si el fragmento quedó pendiente.
+        """
+        if not decoder.reassembles:
+            return raw_gps_data
+        framer = self.stream_framers.get(stream_key)
+        if framer is None:
+            if len(self.stream_framers) >= MAX_TRACKED_STREAMS:
+                # Descarta el stream usado hace más tiempo.
+                idle_key, _ = self.stream_framers.popitem(last=False)
+                self.decoder_registry.forget(idle_key)
+            framer = self.stream_framers[stream_key] = decoder.new_framer(
+                self.stream_max_frame_size
             )
-            return
-        try:
-            # Tus parsers devuelven una lista de dicts
-            decoded_data_list = decoder_function(raw_message_data)
-            for data_dict in decoded_data_list:
-                if isinstance(data_dict, dict):
-                    # logger.info(f"{device_original_port} - {data_dict}")  # Log de datos decodificados
-                    if device_original_port == PORT_COBAN:
-                        logger.info(
-                            f"Datos decodificados de Coban (puerto 6001): {data_dict}"
-                        )
-                    await self._process_decoded_data(device_original_port, data_dict)
-                else:
-                    logger.warning(
-                        f"Decodificador para {device_original_port} no devolvió dict: {data_dict}"
+        else:
+            self.stream_framers.move_to_end(stream_key)
+        return framer.feed(raw_gps_data)
+
+    async def _expire_idle_streams_periodically(self):
+        while True:
+            await asyncio.sleep(max(1, self.stream_idle_ttl // 2))
+            cutoff = time.monotonic() - self.stream_idle_ttl
+            idle_keys = [
+                key
+                for key, framer in self.stream_framers.items()
+                if framer.last_fed_at < cutoff
+            ]
+            for key in idle_keys:
+                framer = self.stream_framers.pop(key)
+                self.decoder_registry.forget(key)
+                if framer.pending:
+                    log_sampled(
+                        logger,
+                        logging.WARNING,
+                        ("stream_expired", key[0]),
+                        "Stream %s (puerto %s) expirado con %d bytes sin terminar.",
+                        key[1],
+                        key[0],
+                        framer.pending,
                     )
-        except Exception as e:
+
+    async def _handle_frame(self, peername, frame) -> bool:
+        """Valida un frame {"port", "data"} y lo encola. Devuelve False si se descarta."""
+        if not isinstance(frame, dict):
+            logger.error("Frame de %s no es un objeto JSON: %.200s", peername, frame)
+            return False
+        device_port = frame.get("port")
+        raw_gps_data = frame.get("data")
+        if device_port is None or raw_gps_data is None:
+            logger.error(
+                "JSON de %s sin 'port' o 'data'. Datos: %.200s...", peername, frame
+            )
+            return False
+        if not isinstance(raw_gps_data, str):
             logger.error(
-                f"Error decodificando datos para puerto {device_original_port} con {decoder_function.__name__}: {e}",
-                exc_info=True,
+                "Frame de %s (puerto %s) con 'data' no textual: %.200s",
+                peername,
+                device_port,
+                raw_gps_data,
             )
-            logger.debug(
-                f"Datos crudos (GPS) que causaron error: {raw_message_data[:500]}"
+            return False
+        # Desde aquí el frame viaja como bytes hasta el decodificador.
+        raw_gps_data = raw_gps_data.encode("utf-8")
+        stream_id = frame.get("stream")
+        stream_key = None
+        if stream_id is not None:
+            if not isinstance(stream_id, (str, int)):
+                logger.error(
+                    "Frame de %s con 'stream' inválido: %.200s", peername, stream_id
+                )
+                return False
+            stream_key = (device_port, stream_id)
+        # Con stream, el protocolo se detecta con el primer fragmento y queda cacheado.
+        decoder = self.decoder_registry.resolve(device_port, raw_gps_data, stream_key)
+        if decoder is None:
+            log_sampled(
+                logger,
+                logging.WARNING,
+                ("no_decoder", device_port),
+                "No hay decodificador para puerto original %s ni protocolo detectado: %.100s",
+                device_port,
+                raw_gps_data,
             )
+            return False
+        if stream_key is not None:
+            raw_gps_data = self._reassemble_stream(stream_key, decoder, raw_gps_data)
+            if raw_gps_data is None:
+                return True  # Fragmento guardado hasta que llegue su terminador.
+        elif decoder.requires_stream(raw_gps_data):
+            log_sampled(
+                logger,
+                logging.WARNING,
+                ("requires_stream", device_port),
+                "Frame %s de %s (puerto %s) sin 'stream': no se puede decodificar "
+                "sin el contexto de la conexión del equipo. Descartado.",
+                decoder.name,
+                peername,
+                device_port,
+            )
+            return False
+        if self.cluster is not None:
+            imei_hint = extract_imei_hint(raw_gps_data)
+            if imei_hint is not None:
+                owner_index = self.cluster.owner_for_imei(imei_hint)
+                if owner_index != self.cluster.worker_index:
+                    self.cluster.forward_frame(owner_index, device_port, raw_gps_data)
+                    return True
+        if device_port == PORT_COBAN:
+            log_sampled(
+                logger,
+                logging.INFO,
+                ("received", device_port),
+                "Datos recibidos de Coban (puerto 6001): %s",
+                raw_gps_data,
+            )
+        await self._enqueue_frame(device_port, raw_gps_data, decoder)
+        return True
+
+    async def _flush_recorder_periodically(self):
+        while True:
+            await asyncio.sleep(DEFAULT_RECORD_FLUSH_INTERVAL)
+            self.recorder.flush()
+
+    async def _handle_client_wrapper(self, peername, wrapper_bytes: bytes):
+        """Wrapper recibido del forwarder: se graba (si está activo) y se procesa."""
+        if self.recorder is not None:
+            self.recorder.record(wrapper_bytes)
+        await self._handle_json_wrapper(peername, wrapper_bytes)
+
+    async def _handle_json_wrapper(self, peername, wrapper_bytes: bytes):
+        """
+        Parsea un wrapper y encola sus frames.
+
+        Acepta un frame simple {"port", "data"} o un lote con frames de
+        puertos mezclados: un array JSON de frames o {"frames": [...]}.
+        Un frame inválido se descarta sin afectar al resto del lote. Los frames
+        con "stream" se reensamblan con los fragmentos previos del mismo stream.
+        """
+        try:
+            json_wrapper = serialization.loads(wrapper_bytes)
+        except serialization.JSON_DECODE_ERRORS as e:
+            # Reintento tolerante a bytes UTF-8 inválidos (como el decode con "replace").
+            decoded_json_str = wrapper_bytes.decode("utf-8", errors="replace")
+            try:
+                json_wrapper = serialization.loads(decoded_json_str)
+            except serialization.JSON_DECODE_ERRORS:
+                logger.error(
+                    f"JSON inválido (wrapper) de {peername}: {e}. Datos: {decoded_json_str[:500]}"
+                )
+                return
+
+        if isinstance(json_wrapper, list):
+            frames = json_wrapper
+        elif isinstance(json_wrapper, dict) and "frames" in json_wrapper:
+            frames = json_wrapper["frames"]
+            if not isinstance(frames, list):
+                logger.error(f"Lote de {peername} con 'frames' que no es una lista.")
+                return
+        else:
+            frames = [json_wrapper]
+
+        dropped_frames = 0
+        for index, frame in enumerate(frames):
+            try:
+                if not await self._handle_frame(peername, frame):
+                    dropped_frames += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                dropped_frames += 1
+                logger.error(
+                    f"Error procesando frame {index} del wrapper de {peername}: {e}",
+                    exc_info=True,
+                )
+        if dropped_frames and len(frames) > 1:
+            logger.warning(
+                f"Lote de {peername}: {dropped_frames} de {len(frames)} frames descartados."
+            )
+
+    async def _read_until_eof(
+        self, peername, reader: asyncio.StreamReader, handle_wrapper
+    ):
+        """Modo legado: un único wrapper por conexión, leído hasta EOF."""
+        full_data_buffer = bytearray()
+        while True:
+            data_chunk = await reader.read(4096)
+            if not data_chunk:
+                if not full_data_buffer:
+                    logger.debug(f"Conexión de {peername} cerrada sin datos.")
+                break
+            full_data_buffer.extend(data_chunk)
+            if len(full_data_buffer) > MAX_MESSAGE_SIZE:
+                logger.error(
+                    f"Mensaje de {peername} excede MAX_MESSAGE_SIZE. Descartando y cerrando."
+                )
+                return
+
+        if full_data_buffer:
+            await handle_wrapper(peername, bytes(full_data_buffer))
+
+    async def _read_newline_frames(
+        self, peername, reader: asyncio.StreamReader, handle_wrapper
+    ):
+        """Conexión persistente: un wrapper JSON por línea."""
+        while True:
+            try:
+                line = await reader.readuntil(b"\n")
+            except asyncio.IncompleteReadError as e:
+                # EOF: un último wrapper sin "\n" final se procesa igualmente.
+                if e.partial.strip():
+                    await handle_wrapper(peername, e.partial)
+                return
+            except asyncio.LimitOverrunError:
+                logger.error(
+                    f"Línea de {peername} excede MAX_MESSAGE_SIZE. Descartando y cerrando."
+                )
+                return
+            if line.strip():
+                await handle_wrapper(peername, line)
+
+    async def _read_length_prefixed_frames(
+        self, peername, reader: asyncio.StreamReader, handle_wrapper
+    ):
+        """Conexión persistente: cada wrapper precedido por su longitud (uint32 BE)."""
+        while True:
+            try:
+                header = await reader.readexactly(LENGTH_PREFIX.size)
+            except asyncio.IncompleteReadError as e:
+                if e.partial:
+                    logger.warning(f"Cabecera de longitud incompleta de {peername}.")
+                return
+            (frame_length,) = LENGTH_PREFIX.unpack(header)
+            if frame_length > MAX_MESSAGE_SIZE:
+                logger.error(
+                    f"Frame de {peername} declara {frame_length} bytes (> MAX_MESSAGE_SIZE). Cerrando."
+                )
+                return
+            if frame_length == 0:
+                continue  # Keep-alive
+            try:
+                frame = await reader.readexactly(frame_length)
+            except asyncio.IncompleteReadError:
+                logger.warning(
+                    f"Frame incompleto de {peername} (esperados {frame_length} bytes)."
+                )
+                return
+            await handle_wrapper(peername, frame)
 
     async def handle_client_connection(
         self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        await self._serve_connection(
+            reader, writer, self.framing, self._handle_client_wrapper
+        )
+
+    async def handle_forwarded_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        """Frames reenviados por otros workers del clúster (socket Unix local)."""
+        # Ya se grabaron en el worker que los recibió del forwarder.
+        await self._serve_connection(
+            reader, writer, FRAMING_LENGTH, self._handle_json_wrapper
+        )
+
+    async def _apply_cluster_control(self, message: dict):
+        """Operaciones del proceso WebSocket sobre los cachés de este worker."""
+        op = message.get("op")
+        target = message.get("target")
+        if op != OP_INVALIDATE:
+            logger.warning(f"Operación de control desconocida: {op}")
+        elif target == INVALIDATE_DEVICES:
+            await self.ws_manager.refresh_devices_cache(force=True)
+        elif target == INVALIDATE_GEOFENCES:
+            await self.position_updater.geofence_store.refresh()
+        else:
+            logger.warning(f"Caché a invalidar desconocido: {target}")
+
+    async def _serve_connection(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        framing: str,
+        handle_wrapper,
     ):
         peername = writer.get_extra_info("peername")
-        logger.debug(f"Nueva conexión TCP (JSON broker) de: {peername}")
-        full_data_buffer = bytearray()
+        logger.debug(
+            f"Nueva conexión TCP (JSON broker, framing {framing}) de: {peername}"
+        )
         try:
-            while True:
-                data_chunk = await reader.read(4096)
-                if not data_chunk:
-                    if not full_data_buffer:
-                        logger.debug(f"Conexión de {peername} cerrada sin datos.")
-                    break
-                full_data_buffer.extend(data_chunk)
-                if len(full_data_buffer) > MAX_MESSAGE_SIZE:
-                    logger.error(
-                        f"Mensaje de {peername} excede MAX_MESSAGE_SIZE. Descartando y cerrando."
-                    )
-                    full_data_buffer.clear()
-                    writer.close()
-                    await writer.wait_closed()
-                    return
-
-            if full_data_buffer:
-                try:
-                    decoded_json_str = full_data_buffer.decode(
-                        "utf-8", errors="replace"
-                    )
-                    json_wrapper = json.loads(decoded_json_str)
-                    device_port = json_wrapper.get("port")
-                    raw_gps_data = json_wrapper.get("data")
-                    if device_port == PORT_COBAN:
-                        logger.info(
-                            f"Datos recibidos de Coban (puerto 6001): {raw_gps_data}"
-                        )
-                    if device_port is not None and raw_gps_data is not None:
-                        await self._decode_and_process_raw_gps_data(
-                            device_port, raw_gps_data
-                        )
-                    else:
-                        logger.error(
-                            f"JSON de {peername} sin 'port' o 'data'. Datos: {decoded_json_str[:200]}..."
-                        )
-                except json.JSONDecodeError as e:
-                    logger.error(
-                        f"JSON inválido (wrapper) de {peername}: {e}. Datos: {full_data_buffer.decode('utf-8', errors='replace')[:500]}"
-                    )
-                except UnicodeDecodeError as e:
-                    logger.error(
-                        f"Error de decodificación Unicode (wrapper) de {peername}: {e}. Datos (hex): {full_data_buffer[:256].hex()}"
-                    )
-                except Exception as e:
-                    logger.error(
-                        f"Error procesando JSON wrapper de {peername}: {e}",
-                        exc_info=True,
-                    )
+            if framing == FRAMING_NEWLINE:
+                await self._read_newline_frames(peername, reader, handle_wrapper)
+            elif framing == FRAMING_LENGTH:
+                await self._read_length_prefixed_frames(
+                    peername, reader, handle_wrapper
+                )
+            else:
+                await self._read_until_eof(peername, reader, handle_wrapper)
         except ConnectionResetError:
             logger.warning(f"Conexión reseteada por {peername}")
         except asyncio.CancelledError:
@@ -167,7 +649,12 @@ class TCPServer:
 
     async def start(self):
         server = await asyncio.start_server(
-            self.handle_client_connection, self.host, self.port
+            self.handle_client_connection,
+            self.host,
+            self.port,
+            limit=MAX_MESSAGE_SIZE,  # Tamaño máximo de línea en framing "newline"
+            # Varios workers del clúster comparten el puerto; el kernel reparte conexiones.
+            reuse_port=self.cluster is not None,
         )
         addr = (
             server.sockets[0].getsockname()
@@ -175,6 +662,50 @@ class TCPServer:
             else (self.host, self.port)
         )
         logger.info(f"Servidor TCP (JSON broker) escuchando en {addr[0]}:{addr[1]}")
+        self.decode_pool.start()
+        if self.cluster is not None:
+            await self.cluster.start(
+                self.handle_forwarded_connection, self._apply_cluster_control
+            )
+            self.ws_manager.state_publisher = self.cluster.publish_state
+        self._worker_tasks = [
+            asyncio.create_task(self._ingest_worker(i), name=f"TCPIngestWorker-{i}")
+            for i in range(self.worker_count)
+        ]
+        if self.stats_interval > 0:
+            self._worker_tasks.append(
+                asyncio.create_task(
+                    self._report_pipeline_stats_periodically(),
+                    name="TCPPipelineStats",
+                )
+            )
+        if self.stream_idle_ttl > 0:
+            self._worker_tasks.append(
+                asyncio.create_task(
+                    self._expire_idle_streams_periodically(), name="TCPStreamExpiry"
+                )
+            )
+        if GEOFENCE_REFRESH_INTERVAL > 0:
+            # Primera carga de geozonas al arrancar y recarga periódica.
+            self._worker_tasks.append(
+                asyncio.create_task(
+                    self.position_updater.geofence_store.refresh_periodically(),
+                    name="GeofenceRefresh",
+                )
+            )
+        if self.recorder is not None:
+            self._worker_tasks.append(
+                asyncio.create_task(
+                    self._flush_recorder_periodically(), name="TCPTrafficRecorder"
+                )
+            )
+        if self.geofence_membership.path:
+            self._worker_tasks.append(
+                asyncio.create_task(
+                    self.geofence_membership.save_periodically(),
+                    name="GeofenceStateSnapshot",
+                )
+            )
         try:
             async with server:
                 await server.serve_forever()
@@ -186,6 +717,17 @@ class TCPServer:
             )
         finally:
             logger.info("Servidor TCP (JSON broker) finalizando...")
+            for task in self._worker_tasks:
+                task.cancel()
+            await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+            self._worker_tasks = []
+            self.decode_pool.shutdown()
+            if self.recorder is not None:
+                self.recorder.close()
+            await self.geofence_membership.save()
+            if self.cluster is not None:
+                self.ws_manager.state_publisher = None
+                await self.cluster.stop()
             if self.event_notifier:
                 await self.event_notifier.close_http_session()
             if self.position_updater:
@@ -1,7 +1,19 @@
 import re
 import math
+import shapely
 from shapely.geometry import Point, Polygon
 
+EARTH_RADIUS_M = 6371000
+# Desde esta cantidad de geozonas, GeofenceIndex usa una grilla de cajas
+# envolventes; con menos basta recorrerlas descartando por caja.
+GEOFENCE_INDEX_MIN_SIZE = 8
+# Celda mínima de la grilla (grados, ~10 m) y tope de celdas por geozona: las
+# más grandes se evalúan con cada punto.
+GRID_MIN_CELL_DEG = 1e-4
+GRID_MAX_CELLS_PER_GEOFENCE = 64
+# Margen (grados) de la caja de un círculo frente al redondeo de haversine.
+CIRCLE_BBOX_MARGIN_DEG = 1e-7
+
 
 def parse_geofence(geofence_str):
     """Parsea una cadena de geozona en formato POLYGON o CIRCLE y retorna un objeto para realizar verificaciones."""
@@ -47,7 +59,7 @@ def is_point_in_geofence(lat, lon, geofence):
         radius = geofence["radius"]
 
         # Distancia haversine (considerando la Tierra como esfera)
-        R = 6371000  # Radio de la Tierra en metros
+        R = EARTH_RADIUS_M  # Radio de la Tierra en metros
 
         lat1, lon1 = math.radians(center_lat), math.radians(center_lon)
         lat2, lon2 = math.radians(lat), math.radians(lon)
@@ -97,3 +109,206 @@ def check_geofence_event(geofence_str, prev_position, current_position):
         return "geofenceExit"
     else:
         return None  # No hubo cambio
+
+
+class CompiledGeofence:
+    """
+    Geozona ya parseada para evaluarla muchas veces: el polígono queda
+    preparado (shapely.prepare) y el círculo con el centro en radianes y su
+    coseno precalculados. Ambos guardan su caja envolvente (x = latitud,
+    y = longitud) para descartar puntos lejanos sin la prueba exacta.
+    contains() da el mismo resultado que is_point_in_geofence() sobre
+    parse_geofence(area).
+    """
+
+    __slots__ = (
+        "id",
+        "name",
+        "area",
+        "kind",
+        "geometry",
+        "center_lat",
+        "center_lon",
+        "cos_center_lat",
+        "radius",
+        "min_x",
+        "min_y",
+        "max_x",
+        "max_y",
+    )
+
+    def __init__(self, geofence_id, name, area):
+        self.id = geofence_id
+        self.name = name
+        self.area = area
+        parsed = parse_geofence(area)
+        self.kind = parsed["type"]
+        self.geometry = None
+        self.center_lat = self.center_lon = self.cos_center_lat = None
+        self.radius = None
+        if self.kind == "polygon":
+            self.geometry = parsed["geometry"]
+            shapely.prepare(self.geometry)
+            self.min_x, self.min_y, self.max_x, self.max_y = self.geometry.bounds
+        else:
+            center_lat, center_lon = parsed["center"]
+            self.center_lat = math.radians(center_lat)
+            self.center_lon = math.radians(center_lon)
+            self.cos_center_lat = math.cos(self.center_lat)
+            self.radius = parsed["radius"]
+            self._set_circle_bounds(center_lat, center_lon)
+
+    def _set_circle_bounds(self, center_lat, center_lon):
+        # Caja que contiene todo punto a distancia haversine <= radio.
+        angular = self.radius / EARTH_RADIUS_M
+        dlat = math.degrees(angular) + CIRCLE_BBOX_MARGIN_DEG
+        self.min_x = center_lat - dlat
+        self.max_x = center_lat + dlat
+        sin_angular = math.sin(min(angular, math.pi / 2))
+        if angular >= math.pi / 2 or self.cos_center_lat <= sin_angular:
+            # El círculo alcanza un polo: cualquier longitud.
+            self.min_y, self.max_y = -math.inf, math.inf
+            return
+        dlon = (
+            math.degrees(math.asin(sin_angular / self.cos_center_lat))
+            + CIRCLE_BBOX_MARGIN_DEG
+        )
+        self.min_y = center_lon - dlon
+        self.max_y = center_lon + dlon
+        if self.min_y < -180.0 or self.max_y > 180.0:
+            # Cruza el antimeridiano: no se acota la longitud.
+            self.min_y, self.max_y = -math.inf, math.inf
+
+    def contains(self, lat, lon):
+        if not (self.min_x <= lat <= self.max_x and self.min_y <= lon <= self.max_y):
+            return False
+        if self.geometry is not None:
+            # Mismo orden de ejes que parse_geofence: x = latitud, y = longitud.
+            return bool(shapely.contains_xy(self.geometry, lat, lon))
+        lat2, lon2 = math.radians(lat), math.radians(lon)
+        dlat = lat2 - self.center_lat
+        dlon = lon2 - self.center_lon
+        a = (
+            math.sin(dlat / 2) ** 2
+            + self.cos_center_lat * math.cos(lat2) * math.sin(dlon / 2) ** 2
+        )
+        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+        return EARTH_RADIUS_M * c <= self.radius
+
+    def __repr__(self):
+        return f"CompiledGeofence({self.id!r}, {self.name!r}, {self.kind})"
+
+
+class GeofenceIndex:
+    """
+    Conjunto de geozonas compiladas (las de un dispositivo) con prefiltro
+    espacial: un punto solo recibe la prueba exacta de las geozonas cuya caja
+    envolvente lo contiene. Desde GEOFENCE_INDEX_MIN_SIZE geozonas las cajas
+    se registran en una grilla uniforme (celda del tamaño típico de una
+    geozona) y la búsqueda es una consulta a un dict; con menos se recorren
+    comparando la caja.
+    """
+
+    __slots__ = ("geofences", "ids", "cell_size", "cells", "oversized")
+
+    def __init__(self, geofences):
+        self.geofences = tuple(geofences)
+        self.ids = frozenset(geofence.id for geofence in self.geofences)
+        self.cell_size = None
+        self.cells = {}
+        # Geozonas sin límite de longitud o que cubrirían demasiadas celdas:
+        # se evalúan con cada punto.
+        self.oversized = ()
+        if len(self.geofences) >= GEOFENCE_INDEX_MIN_SIZE:
+            self._build_grid()
+
+    def _build_grid(self):
+        # Las cajas sin límite de longitud (círculos en un polo o el
+        # antimeridiano) no cuentan para el tamaño de la celda.
+        extents = sorted(
+            max(g.max_x - g.min_x, g.max_y - g.min_y)
+            for g in self.geofences
+            if not math.isinf(g.min_y)
+        )
+        median = extents[len(extents) // 2] if extents else 0.0
+        cell_size = max(median, GRID_MIN_CELL_DEG)
+        cells = {}
+        oversized = []
+        for position, g in enumerate(self.geofences):
+            if math.isinf(g.min_y) or math.isinf(g.max_y):
+                oversized.append(position)
+                continue
+            x0, x1 = math.floor(g.min_x / cell_size), math.floor(g.max_x / cell_size)
+            y0, y1 = math.floor(g.min_y / cell_size), math.floor(g.max_y / cell_size)
+            if (x1 - x0 + 1) * (y1 - y0 + 1) > GRID_MAX_CELLS_PER_GEOFENCE:
+                oversized.append(position)
+                continue
+            for x in range(x0, x1 + 1):
+                for y in range(y0, y1 + 1):
+                    cells.setdefault((x, y), []).append(position)
+        self.cell_size = cell_size
+        self.cells = {key: tuple(items) for key, items in cells.items()}
+        self.oversized = tuple(oversized)
+
+    def __len__(self):
+        return len(self.geofences)
+
+    def __iter__(self):
+        return iter(self.geofences)
+
+    def __repr__(self):
+        mode = "lineal" if self.cell_size is None else f"grilla {self.cell_size:.4g}°"
+        return f"GeofenceIndex({len(self.geofences)} geozonas, {mode})"
+
+    def containing(self, lat, lon) -> list:
+        """Posiciones (en self.geofences, en orden) de las geozonas que contienen el punto."""
+        geofences = self.geofences
+        if self.cell_size is None:
+            return [
+                position
+                for position, geofence in enumerate(geofences)
+                if geofence.contains(lat, lon)
+            ]
+        try:
+            key = (math.floor(lat / self.cell_size), math.floor(lon / self.cell_size))
+        except (ValueError, OverflowError):
+            # Coordenada NaN o infinita: solo la pueden contener las sin límite.
+            key = None
+        candidates = self.cells.get(key, ())
+        if self.oversized:
+            candidates = sorted(candidates + self.oversized)
+        return [
+            position
+            for position in candidates
+            if geofences[position].contains(lat, lon)
+        ]
+
+    def containing_ids(self, lat, lon) -> frozenset:
+        """Ids de las geozonas que contienen el punto."""
+        geofences = self.geofences
+        return frozenset(
+            geofences[position].id for position in self.containing(lat, lon)
+        )
+
+    def transitions(self, prev_ids: frozenset, current_ids: frozenset) -> list:
+        """
+        Transiciones entre dos conjuntos de ids (containing_ids): primero las
+        salidas y luego las entradas, cada una en el orden de las geozonas.
+        Los ids que ya no pertenecen al índice (geozona desasignada) se ignoran.
+
+        Returns:
+            list: (CompiledGeofence, "geofenceEnter" | "geofenceExit")
+        """
+        if prev_ids == current_ids:
+            return []
+        exits = [
+            (geofence, "geofenceExit")
+            for geofence in self.geofences
+            if geofence.id in prev_ids and geofence.id not in current_ids
+        ]
+        enters = [
+            (geofence, "geofenceEnter")
+            for geofence in self.geofences
+            if geofence.id in current_ids and geofence.id not in prev_ids
+        ]
+        return exits + enters
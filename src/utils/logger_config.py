@@ -1,10 +1,51 @@
+import atexit
 import logging
+import logging.handlers
+import os
+import queue
 import sys
+import threading
+import time
 
 LOG_LEVEL = logging.INFO
 
+# Con LOG_ASYNC el hilo que loguea solo encola el registro; un QueueListener
+# en otro hilo hace el formateo final y la escritura a stdout.
+LOG_ASYNC = os.getenv("LOG_ASYNC", "true").lower() not in ("0", "false", "no")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+
+# Muestreo por clave (IMEI, puerto...) para logs del camino caliente:
+# LOG_SAMPLE_RATE mensajes/segundo por clave, con ráfagas de hasta LOG_SAMPLE_BURST.
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", 1.0))
+LOG_SAMPLE_BURST = float(os.getenv("LOG_SAMPLE_BURST", 5))
+MAX_SAMPLER_KEYS = 50000
+
+_queue_listener = None
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que descarta (y cuenta) registros si la cola está llena, sin bloquear."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # QueueHandler.prepare formatea el mensaje (y la traza de exc_info) en
+        # el hilo que loguea. La cola es en memoria, así que el registro se
+        # encola tal cual y el formateo lo hace el handler del QueueListener.
+        # Los args se leen al formatear: no pasar objetos que se mutan después.
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
 
 def setup_logging():
+    global _queue_listener
     logger = logging.getLogger()
     if not logger.handlers:
         logger.setLevel(LOG_LEVEL)
@@ -13,4 +54,84 @@ def setup_logging():
         )
         ch = logging.StreamHandler(sys.stdout)
         ch.setFormatter(formatter)
-        logger.addHandler(ch)
+        if LOG_ASYNC:
+            log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+            logger.addHandler(_DroppingQueueHandler(log_queue))
+            _queue_listener = logging.handlers.QueueListener(
+                log_queue, ch, respect_handler_level=True
+            )
+            _queue_listener.start()
+            atexit.register(stop_logging)
+        else:
+            logger.addHandler(ch)
+
+
+def stop_logging():
+    """Vacía la cola de logs pendientes y detiene el hilo del QueueListener."""
+    global _queue_listener
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        _queue_listener = None
+
+
+class LogSampler:
+    """
+    Token bucket por clave para limitar logs repetitivos.
+
+    Cada clave recibe `rate` mensajes por segundo con ráfagas de hasta `burst`.
+    Los mensajes descartados se cuentan y el total se reporta con el siguiente
+    mensaje permitido de esa clave.
+    """
+
+    def __init__(self, rate: float = LOG_SAMPLE_RATE, burst: float = LOG_SAMPLE_BURST):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._buckets: dict = {}  # clave -> [tokens, último_ts, suprimidos]
+        self._lock = threading.Lock()
+
+    def allow(self, key) -> tuple[bool, int]:
+        """Devuelve (permitido, suprimidos_desde_el_último_permitido)."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= MAX_SAMPLER_KEYS:
+                    self._buckets.clear()
+                bucket = self._buckets[key] = [self.burst, now, 0]
+            else:
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] < 1.0:
+                bucket[2] += 1
+                return False, 0
+            bucket[0] -= 1.0
+            suppressed, bucket[2] = bucket[2], 0
+            return True, suppressed
+
+
+_default_sampler = LogSampler()
+
+
+def log_sampled(
+    logger: logging.Logger,
+    level: int,
+    key,
+    msg: str,
+    *args,
+    sampler: LogSampler | None = None,
+):
+    """
+    Loguea con formato %-style diferido, limitado por `key` con un token bucket.
+
+    Si el nivel no está habilitado no se hace ningún trabajo; si la clave agotó
+    sus tokens el mensaje se cuenta como suprimido.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    allowed, suppressed = (sampler or _default_sampler).allow(key)
+    if not allowed:
+        return
+    if suppressed:
+        msg += " (%d mensajes similares suprimidos)"
+        args = (*args, suppressed)
+    logger.log(level, msg, *args, stacklevel=2)
@@ -0,0 +1,81 @@
+import json
+import logging
+import os
+from datetime import date, datetime
+
+logger = logging.getLogger(__name__)
+
+# Backend JSON: "auto" elige orjson, luego msgspec y por último la stdlib.
+JSON_BACKEND_SETTING = os.getenv("JSON_BACKEND", "auto").lower()
+
+
+def _stdlib_default(obj):
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Objeto de tipo {type(obj).__name__} no es serializable a JSON")
+
+
+def _load_orjson():
+    import orjson
+
+    def dumps(obj) -> bytes:
+        # orjson serializa datetime en ISO 8601, igual que datetime.isoformat().
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+    return "orjson", orjson.loads, dumps, (orjson.JSONDecodeError,)
+
+
+def _load_msgspec():
+    import msgspec
+
+    encoder = msgspec.json.Encoder()
+    decoder = msgspec.json.Decoder()
+    return "msgspec", decoder.decode, encoder.encode, (msgspec.DecodeError,)
+
+
+def _load_stdlib():
+    def loads(data):
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            data = bytes(data).decode("utf-8", errors="replace")
+        return json.loads(data)
+
+    def dumps(obj) -> bytes:
+        return json.dumps(obj, default=_stdlib_default).encode("utf-8")
+
+    return "json", loads, dumps, (json.JSONDecodeError,)
+
+
+_BACKEND_LOADERS = {
+    "orjson": _load_orjson,
+    "msgspec": _load_msgspec,
+    "json": _load_stdlib,
+}
+
+
+def _select_backend():
+    if JSON_BACKEND_SETTING in _BACKEND_LOADERS:
+        candidates = [JSON_BACKEND_SETTING, "json"]
+    else:
+        candidates = ["orjson", "msgspec", "json"]
+    for name in candidates:
+        try:
+            return _BACKEND_LOADERS[name]()
+        except ImportError:
+            if name == JSON_BACKEND_SETTING:
+                logger.warning(
+                    f"Backend JSON '{name}' no está instalado. Usando alternativa."
+                )
+    return _load_stdlib()
+
+
+JSON_BACKEND, _loads, _dumps, JSON_DECODE_ERRORS = _select_backend()
+
+
+def loads(data: bytes | bytearray | memoryview | str):
+    """Parsea JSON desde bytes o str con el backend activo."""
+    return _loads(data)
+
+
+def dumps(obj) -> bytes:
+    """Serializa a JSON en bytes UTF-8. Los datetime se emiten en ISO 8601."""
+    return _dumps(obj)
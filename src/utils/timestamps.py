@@ -0,0 +1,130 @@
+import calendar
+import time
+
+# Representación interna de las fechas: segundos epoch (int, UTC). El texto
+# "YYYY-MM-DD HH:MM:SS" solo se genera al armar payloads de salida (caché de
+# dispositivos publicado, WebSocket, push) y se parsea solo al leer fechas que
+# vienen de fuera (API de dispositivos).
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Corrección que get_datetime_now() aplica al reloj local del servidor.
+SERVER_CLOCK_OFFSET_SECONDS = -2 * 3600
+
+MAX_TIMESTAMP_CACHE_SIZE = 8192
+_formatted_cache: dict[int, str] = {}
+_parsed_cache: dict[str, int] = {}
+
+
+def _remember(epoch: int, text: str):
+    if len(_formatted_cache) >= MAX_TIMESTAMP_CACHE_SIZE:
+        _formatted_cache.clear()
+    if len(_parsed_cache) >= MAX_TIMESTAMP_CACHE_SIZE:
+        _parsed_cache.clear()
+    _formatted_cache[epoch] = text
+    _parsed_cache[text] = epoch
+
+
+def format_timestamp(epoch: int) -> str:
+    """Segundos epoch -> "YYYY-MM-DD HH:MM:SS" (UTC)."""
+    text = _formatted_cache.get(epoch)
+    if text is None:
+        text = time.strftime(TIMESTAMP_FORMAT, time.gmtime(epoch))
+        # El texto generado aquí es el que luego vuelve como "lastupdate":
+        # queda en el caché inverso para que parsearlo sea una búsqueda.
+        _remember(epoch, text)
+    return text
+
+
+def parse_timestamp(text: str) -> int | None:
+    """
+    "YYYY-MM-DD HH:MM:SS" (UTC) -> segundos epoch, o None si el texto no
+    tiene ese formato o la fecha no es válida.
+    """
+    epoch = _parsed_cache.get(text)
+    if epoch is not None:
+        return epoch
+    if (
+        not isinstance(text, str)
+        or len(text) != 19
+        or text[4] != "-"
+        or text[7] != "-"
+        or text[10] != " "
+        or text[13] != ":"
+        or text[16] != ":"
+    ):
+        return None
+    try:
+        epoch = datetime_to_epoch(
+            int(text[0:4]),
+            int(text[5:7]),
+            int(text[8:10]),
+            int(text[11:13]),
+            int(text[14:16]),
+            int(text[17:19]),
+        )
+    except ValueError:
+        return None
+    _remember(epoch, text)
+    return epoch
+
+
+def datetime_to_epoch(
+    year: int,
+    month: int,
+    day: int,
+    hour: int,
+    minute: int,
+    second: int,
+    utc_offset_seconds: int = 0,
+) -> int:
+    """
+    Fecha del equipo -> segundos epoch. utc_offset_seconds es el huso en que
+    reporta el equipo (p. ej. -5 * 3600 para hora de Perú).
+
+    Raises:
+        ValueError: Si la fecha no es válida.
+    """
+    if not (
+        1 <= month <= 12
+        and 1 <= day <= calendar.monthrange(year, month)[1]
+        and hour < 24
+        and minute < 60
+        and second < 60
+    ):
+        raise ValueError(
+            f"Fecha inválida: {year}-{month}-{day} {hour}:{minute}:{second}"
+        )
+    return (
+        calendar.timegm((year, month, day, hour, minute, second, 0, 0, 0))
+        - utc_offset_seconds
+    )
+
+
+def now_epoch() -> int:
+    """Hora actual con la misma corrección que get_datetime_now()."""
+    now = time.time()
+    return int(now) + time.localtime(now).tm_gmtoff + SERVER_CLOCK_OFFSET_SECONDS
+
+
+class DeviceDateCache:
+    """
+    Caché por protocolo de fecha cruda del equipo -> segundos epoch.
+
+    Muchos equipos reportan en el mismo segundo: la conversión (con su
+    corrección de huso) se hace una vez por valor distinto.
+    """
+
+    def __init__(self, convert, max_size: int = MAX_TIMESTAMP_CACHE_SIZE):
+        self._convert = convert
+        self._max_size = max_size
+        self._cache = {}
+
+    def get(self, raw_date) -> int:
+        epoch = self._cache.get(raw_date)
+        if epoch is None:
+            epoch = self._convert(raw_date)
+            if len(self._cache) >= self._max_size:
+                self._cache.clear()
+            self._cache[raw_date] = epoch
+        return epoch
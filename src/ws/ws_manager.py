@@ -1,14 +1,36 @@
-import json
 import aiohttp
 import asyncio
-from datetime import datetime
 import logging
+import os
+import time
+from aiohttp import WSMsgType
 from src.controllers.devices_controller import DevicesController
 from src.controllers.user_devices_controller import UserDevicesController
 from src.utils.common import API_URL_ADMIN_NWPERU
+from src.utils import serialization
 
 logger = logging.getLogger(__name__)
 
+# Refresco del caché de dispositivos ante un IMEI desconocido: intervalo
+# mínimo entre descargas completas (s) y tiempo que un IMEI que sigue sin
+# existir tras un refresco se descarta sin volver a consultar la API (s).
+DEVICES_REFRESH_MIN_INTERVAL = float(os.getenv("DEVICES_REFRESH_MIN_INTERVAL", 30))
+DEVICES_UNKNOWN_TTL = float(os.getenv("DEVICES_UNKNOWN_TTL", 300))
+MAX_UNKNOWN_UNIQUEIDS = 10000
+
+# Campos del dispositivo que un worker del broker publica al proceso WebSocket
+# (modo multi-proceso) cada vez que cambia su estado.
+PUBLISHED_DEVICE_FIELDS = (
+    "id",
+    "latitude",
+    "longitude",
+    "speed",
+    "course",
+    "lastupdate",
+    "status",
+    "laststop",
+)
+
 
 class WebSocketManager:
     _instance = None
@@ -21,6 +43,22 @@ class WebSocketManager:
             cls._instance.devices = (
                 []
             )  # LA fuente de verdad para el estado de todos los dispositivos
+            # Índices sobre self.devices (id -> dispositivo, uniqueid ->
+            # dispositivo, id -> posición en la lista). Se mantienen en
+            # save_devices y update_single_device_in_cache; con varios
+            # dispositivos con el mismo id/uniqueid gana el primero de la lista,
+            # igual que en la búsqueda lineal anterior.
+            cls._instance._devices_by_id = {}
+            cls._instance._devices_by_uniqueid = {}
+            cls._instance._device_positions = {}
+            # Refresco compartido (single-flight) y caché negativo de uniqueid
+            # desconocidos (uniqueid -> vencimiento en time.monotonic()).
+            cls._instance._refresh_task = None
+            cls._instance._last_refresh_at = None
+            cls._instance._unknown_uniqueids = {}
+            # En un worker del broker multi-proceso: callable(dict) que publica
+            # estado y mensajes al proceso WebSocket. None en modo de un proceso.
+            cls._instance.state_publisher = None
             logger.info(
                 "WebSocketManager instanciado (usando self.devices como lista principal)."
             )
@@ -46,10 +84,29 @@ class WebSocketManager:
             return self.guest_clients.pop(websocket)  # Devuelve la info del invitado
         return None
 
+    def _serialize_message(self, message: dict) -> bytes | None:
+        try:
+            return serialization.dumps(message)
+        except Exception as e:
+            logger.error(
+                f"Error serializando mensaje para WebSocket: {e}", exc_info=True
+            )
+            return None
+
     async def send_to_client(self, websocket, message: dict):
+        payload = self._serialize_message(message)
+        if payload is not None:
+            await self.send_serialized_to_client(websocket, payload)
+
+    async def send_serialized_to_client(self, websocket, payload: bytes):
+        """Envía un mensaje ya serializado (JSON en bytes UTF-8) como frame de texto."""
         try:
-            serialized_message = self._serialize_datetime_objects(message)
-            await websocket.send_str(json.dumps(serialized_message))
+            send_frame = getattr(websocket, "send_frame", None)
+            if send_frame is not None:
+                # Envía los bytes tal cual, sin re-codificar el str en cada socket.
+                await send_frame(payload, WSMsgType.TEXT)
+            else:
+                await websocket.send_str(payload.decode("utf-8"))
         except ConnectionResetError:  # Cliente cerró abruptamente
             logger.debug(f"Conexión reseteada por cliente durante send_to_client.")
         except RuntimeError as e:  # ej. "WebSocket connection is closed."
@@ -70,45 +127,165 @@ class WebSocketManager:
             )
 
     async def send_to_all_clients_by_userid(self, user_id: int, message: dict):
+        if self.state_publisher is not None:
+            # Worker del broker: los clientes WebSocket viven en otro proceso.
+            self.state_publisher({"op": "user", "userid": user_id, "message": message})
+            return
         if not self.clients:
             return
         # Crear una copia de los items para iterar de forma segura
-        tasks = [
-            self.send_to_client(websocket, message)
+        websockets = [
+            websocket
             for websocket, client_info in list(self.clients.items())
             if client_info.get("userid") == user_id
         ]
-        if tasks:
+        if websockets:
+            # Serializar una sola vez para todos los sockets del usuario
+            payload = self._serialize_message(message)
+            if payload is None:
+                return
             # return_exceptions=True para que un error en un envío no detenga los demás
-            await asyncio.gather(*tasks, return_exceptions=True)
+            await asyncio.gather(
+                *(self.send_serialized_to_client(ws, payload) for ws in websockets),
+                return_exceptions=True,
+            )
 
     async def send_to_all_guest_clients_by_token(self, token: str, message: dict):
         if not self.guest_clients:
             return
-        tasks = [
-            self.send_to_client(websocket, message)
+        websockets = [
+            websocket
             for websocket, guest_info in list(self.guest_clients.items())
             if guest_info.get("token") == token
         ]
-        if tasks:
-            await asyncio.gather(*tasks, return_exceptions=True)
+        if websockets:
+            payload = self._serialize_message(message)
+            if payload is None:
+                return
+            await asyncio.gather(
+                *(self.send_serialized_to_client(ws, payload) for ws in websockets),
+                return_exceptions=True,
+            )
+
+    def _rebuild_device_indexes(self):
+        devices_by_id = {}
+        devices_by_uniqueid = {}
+        device_positions = {}
+        for position, device in enumerate(self.devices):
+            device_id = device.get("id")
+            if device_id is not None and device_id not in devices_by_id:
+                devices_by_id[device_id] = device
+                device_positions[device_id] = position
+            uniqueid = device.get("uniqueid")
+            if uniqueid is not None:
+                devices_by_uniqueid.setdefault(uniqueid, device)
+        self._devices_by_id = devices_by_id
+        self._devices_by_uniqueid = devices_by_uniqueid
+        self._device_positions = device_positions
 
     def get_device_by_id(self, device_id: int) -> dict | None:
         try:
             target_id = int(device_id)
         except (ValueError, TypeError):
             return None
-        for device in self.devices:
-            if device.get("id") == target_id:
-                return device
-        return None
+        return self._devices_by_id.get(target_id)
 
     def get_device_by_uniqueid(self, uniqueid: str) -> dict | None:
-        target_uniqueid = str(uniqueid)  # Asegurar que es string para comparación
-        for device in self.devices:
-            if device.get("uniqueid") == target_uniqueid:
-                return device
-        return None
+        # Asegurar que es string para comparación
+        return self._devices_by_uniqueid.get(str(uniqueid))
+
+    async def get_device_by_uniqueid_or_refresh(self, uniqueid: str) -> dict | None:
+        """
+        Como get_device_by_uniqueid, pero si el dispositivo no está en caché
+        se une al refresco del caché (refresh_devices_cache) y lo vuelve a
+        buscar. Si la descarga tuvo éxito y sigue sin existir, el uniqueid
+        queda en el caché negativo durante DEVICES_UNKNOWN_TTL y sus frames se
+        descartan sin refrescar. Si el refresco se omitió por el intervalo
+        mínimo o la API falló no se cachea: el siguiente frame lo reintenta.
+        """
+        target_uniqueid = str(uniqueid)
+        device = self._devices_by_uniqueid.get(target_uniqueid)
+        if device is not None:
+            return device
+        expires_at = self._unknown_uniqueids.get(target_uniqueid)
+        if expires_at is not None:
+            if time.monotonic() < expires_at:
+                return None
+            del self._unknown_uniqueids[target_uniqueid]
+
+        refreshed = await self.refresh_devices_cache()
+        device = self._devices_by_uniqueid.get(target_uniqueid)
+        if device is None and refreshed:
+            if len(self._unknown_uniqueids) >= MAX_UNKNOWN_UNIQUEIDS:
+                del self._unknown_uniqueids[next(iter(self._unknown_uniqueids))]
+            self._unknown_uniqueids[target_uniqueid] = (
+                time.monotonic() + DEVICES_UNKNOWN_TTL
+            )
+        return device
+
+    async def refresh_devices_cache(self, force: bool = False) -> bool:
+        """
+        Refresca el caché desde la API (_update_selective_devices_cache) con
+        una sola descarga en curso: las llamadas concurrentes esperan la misma.
+        Sin force no se inicia un refresco antes de DEVICES_REFRESH_MIN_INTERVAL
+        desde el anterior.
+
+        Returns:
+            bool: True si la descarga se completó, False si se omitió por el
+            intervalo o falló.
+        """
+        task = self._refresh_task
+        if task is None or task.done():
+            if (
+                not force
+                and self._last_refresh_at is not None
+                and time.monotonic() - self._last_refresh_at
+                < DEVICES_REFRESH_MIN_INTERVAL
+            ):
+                return False
+            task = asyncio.create_task(self._run_devices_refresh())
+            self._refresh_task = task
+        # shield: si se cancela quien espera, el refresco compartido sigue.
+        return await asyncio.shield(task)
+
+    async def _run_devices_refresh(self) -> bool:
+        # El intervalo cuenta desde el inicio: un refresco fallido tampoco se
+        # reintenta antes de tiempo.
+        self._last_refresh_at = time.monotonic()
+        logger.info("Refrescando caché de dispositivos desde la API.")
+        updated = await self._update_selective_devices_cache()
+        if updated:
+            # Un dispositivo recién registrado deja de estar en el caché negativo.
+            self._unknown_uniqueids.clear()
+        return updated
+
+    def get_devices_by_ids(self, device_ids) -> list:
+        """Dispositivos del caché con esos IDs, en el orden de self.devices."""
+        positions = self._device_positions
+        found = [device_id for device_id in set(device_ids) if device_id in positions]
+        found.sort(key=positions.__getitem__)
+        return [self._devices_by_id[device_id] for device_id in found]
+
+    def publish_device_state(self, device: dict):
+        """Publica el estado actual del dispositivo al proceso WebSocket (si aplica)."""
+        if self.state_publisher is None:
+            return
+        self.state_publisher(
+            {
+                "op": "device",
+                "device": {
+                    field: device.get(field) for field in PUBLISHED_DEVICE_FIELDS
+                },
+            }
+        )
+
+    def apply_device_state(self, device_state: dict) -> bool:
+        """Aplica en el caché local el estado publicado por un worker del broker."""
+        device = self.get_device_by_id(device_state.get("id"))
+        if device is None:
+            return False
+        device.update(device_state)
+        return True
 
     def get_all_devices(self) -> list:
         """Devuelve la referencia a la lista interna self.devices."""
@@ -123,8 +300,10 @@ class WebSocketManager:
             self.devices = (
                 []
             )  # Evitar error si el tipo es incorrecto, dejar caché vacío
+            self._rebuild_device_indexes()
             return
         self.devices = new_devices_list
+        self._rebuild_device_indexes()
         # logger.debug(f"Caché self.devices actualizado con {len(self.devices)} dispositivos.")
 
     async def update_single_device_in_cache(self, device_data: dict):
@@ -151,20 +330,28 @@ class WebSocketManager:
             )
             return
 
-        for i, existing_device in enumerate(self.devices):
-            if existing_device.get("id") == dev_id_to_update:
-                self.devices[i] = device_data  # Reemplazar
-                return
+        position = self._device_positions.get(dev_id_to_update)
+        if position is not None:
+            previous_device = self.devices[position]
+            self.devices[position] = device_data  # Reemplazar
+            self._devices_by_id[dev_id_to_update] = device_data
+            uniqueid = device_data.get("uniqueid")
+            if (
+                uniqueid is not None
+                and uniqueid == previous_device.get("uniqueid")
+                and self._devices_by_uniqueid.get(uniqueid) is previous_device
+            ):
+                self._devices_by_uniqueid[uniqueid] = device_data
+            else:
+                # Cambió el uniqueid: poco frecuente, se reconstruyen los índices.
+                self._rebuild_device_indexes()
+            return
         self.devices.append(device_data)  # Añadir si no existe
-
-    def _serialize_datetime_objects(self, obj):
-        if isinstance(obj, list):
-            return [self._serialize_datetime_objects(item) for item in obj]
-        if isinstance(obj, dict):
-            return {k: self._serialize_datetime_objects(v) for k, v in obj.items()}
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        return obj
+        self._devices_by_id[dev_id_to_update] = device_data
+        self._device_positions[dev_id_to_update] = len(self.devices) - 1
+        uniqueid = device_data.get("uniqueid")
+        if uniqueid is not None:
+            self._devices_by_uniqueid.setdefault(uniqueid, device_data)
 
     async def _load_initial_devices_cache(self):
         local_dc = DevicesController()
@@ -180,7 +367,7 @@ class WebSocketManager:
             if hasattr(local_dc, "close") and callable(getattr(local_dc, "close")):
                 await asyncio.to_thread(local_dc.close)
 
-    async def _update_selective_devices_cache(self):
+    async def _update_selective_devices_cache(self) -> bool:
         """
         Actualiza el caché de dispositivos de forma selectiva.
 
@@ -188,6 +375,10 @@ class WebSocketManager:
         el caché actual (self.devices). Actualiza solo campos
         específicos para dispositivos existentes, añade nuevos y elimina los obsoletos.
         Finalmente, guarda la lista resultante usando self.save_devices().
+
+        Returns:
+            bool: True si la lista se descargó y se guardó; False si la API
+            falló (el caché anterior se conserva).
         """
         local_dc = DevicesController()  # Para obtener la lista fresca de dispositivos
 
@@ -216,6 +407,12 @@ class WebSocketManager:
         try:
             # 1. Obtener la lista "fresca" de dispositivos desde el controlador
             fresh_devices_list = await asyncio.to_thread(local_dc.get_devices)
+            if not isinstance(fresh_devices_list, list):
+                # get_devices ya logueó el error de la API y devuelve None.
+                logger.warning(
+                    "No se pudo descargar la lista de dispositivos. Se conserva el caché actual."
+                )
+                return False
 
             # 2. Obtener la lista "antigua" (caché actual)
             #    y crear un mapa para acceso rápido por ID.
@@ -259,6 +456,7 @@ class WebSocketManager:
             if hasattr(self, "save_devices") and callable(self.save_devices):
                 await self.save_devices(merged_list_for_cache)
                 # logger.info(f"Caché selectivo guardado. {len(merged_list_for_cache)} dispositivos.") # Opcional
+                return True
             else:
                 # Fallback o error si save_devices no existe (según tu descripción, debería existir)
                 logger.error(
@@ -267,14 +465,14 @@ class WebSocketManager:
                 # Como alternativa, si save_devices no existiera y la única forma fuera la asignación directa:
                 # self.devices = merged_list_for_cache
                 # Pero sigo tu indicación de usar save_devices.
-                pass
+                return False
 
         except Exception as e:
             logger.error(
                 f"Error en _update_selective_devices_cache: {e}", exc_info=True
             )  # Opcional
             # Considerar cómo manejar el error (relanzar, etc.)
-            pass
+            return False
         finally:
             # Asegurar que los recursos del DevicesController se liberan, si es necesario
             if hasattr(local_dc, "close") and callable(getattr(local_dc, "close")):
@@ -1,6 +1,6 @@
 import asyncio
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
 import uuid
 import json
 from aiohttp import web
@@ -9,7 +9,9 @@ from src.ws.ws_manager import WebSocketManager
 from src.utils.common import login
 from src.controllers.user_devices_controller import UserDevicesController
 from src.tcp.sender.events import EventNotifierService
-from src.utils.common import get_datetime_now
+from src.tcp.sender.geofence_store import GeofenceStore
+from src.tcp.cluster import INVALIDATE_DEVICES, INVALIDATE_GEOFENCES
+from src.utils.timestamps import now_epoch, parse_timestamp
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +29,9 @@ class WebSocketServer:
         self.guest_tokens_active = {}
         self.app_runner = None
         self.event_notifier = EventNotifierService(self.ws_manager)
+        # Con el broker en procesos aparte (BrokerControl), los cachés de las
+        # posiciones viven en cada worker y se invalidan por el clúster.
+        self.broker_control = None
         logger.info("WebSocketServer instanciado.")
 
     async def websocket_handler(self, request):
@@ -61,14 +66,10 @@ class WebSocketServer:
         device_ids_assigned_to_user = {
             item["deviceid"] for item in user_device_assignments or []
         }
-        all_cached_devices = (
-            self.ws_manager.get_all_devices()
-        )  # Usa self.ws_manager.devices
-        devices_for_this_client = [
-            dev
-            for dev in all_cached_devices
-            if dev.get("id") in device_ids_assigned_to_user
-        ]
+        # Búsqueda por índice en el caché (self.ws_manager.devices)
+        devices_for_this_client = self.ws_manager.get_devices_by_ids(
+            device_ids_assigned_to_user
+        )
 
         logger.info(f"Cliente WebSocket conectado: {username} (ID: {user_id})")
         ws = web.WebSocketResponse()
@@ -206,8 +207,19 @@ class WebSocketServer:
         if path == "/api/sos" and method == "POST":
             return await self._handle_sos_request(request)
         if path == "/api/update-devices" and method == "GET":
-            asyncio.create_task(self.ws_manager._update_selective_devices_cache())
+            # Se une al refresco en curso si lo hay (single-flight).
+            asyncio.create_task(self.ws_manager.refresh_devices_cache(force=True))
+            if self.broker_control is not None:
+                self.broker_control.invalidate(INVALIDATE_DEVICES)
             return web.Response(text="Actualización iniciada.", status=202)
+        if path == "/api/update-geofences" and method == "GET":
+            if self.broker_control is not None:
+                # Las geozonas solo se usan en los workers del broker.
+                self.broker_control.invalidate(INVALIDATE_GEOFENCES)
+            else:
+                # Recarga las geozonas en memoria (se une a una recarga en curso).
+                asyncio.create_task(GeofenceStore().refresh())
+            return web.Response(text="Actualización de geozonas iniciada.", status=202)
         if path == "/api/share" and method == "POST":
             return await self._handle_share_request(request)
         return web.HTTPNotFound(reason="Ruta no encontrada")
@@ -235,12 +247,9 @@ class WebSocketServer:
                 device_ids_assigned_to_user = {
                     item["deviceid"] for item in user_device_assignments
                 }
-                all_cached_devices = self.ws_manager.get_all_devices()
-                devices_for_this_client = [
-                    dev
-                    for dev in all_cached_devices
-                    if dev.get("id") in device_ids_assigned_to_user
-                ]
+                devices_for_this_client = self.ws_manager.get_devices_by_ids(
+                    device_ids_assigned_to_user
+                )
 
                 await self.ws_manager.send_to_all_clients_by_userid(
                     user_id, {"devices": devices_for_this_client}
@@ -365,7 +374,7 @@ class WebSocketServer:
 
     async def _update_device_online_status_periodically(self):
         time_wait = 10
-        offline_thresh = timedelta(minutes=time_wait)
+        offline_thresh = time_wait * 60
         check_interval = 60 * time_wait
         logger.info(
             f"Iniciando tarea periódica de estado online/offline (intervalo: {check_interval}s)."
@@ -373,15 +382,9 @@ class WebSocketServer:
         try:
             while True:
                 await asyncio.sleep(check_interval)
-                now_str = get_datetime_now()
-                try:
-                    # Usamos un nombre de variable diferente para mayor claridad
-                    now_dt = datetime.strptime(now_str, "%Y-%m-%d %H:%M:%S")
-                except (ValueError, TypeError):
-                    logger.error(
-                        f"La función get_datetime_now() devolvió un formato inválido: {now_str}"
-                    )
-                    continue  # Saltar esta iteración si la fecha actual es inválida
+                # Comparación en segundos epoch; lastupdate se parsea con el
+                # caché de src.utils.timestamps (la mayoría se formateó aquí).
+                now_ts = now_epoch()
 
                 for dev in self.ws_manager.get_all_devices():
                     last_up_str = dev.get("lastupdate")
@@ -389,27 +392,23 @@ class WebSocketServer:
                     new_stat = None
                     notify_offline = False
 
-                    last_up_dt = None  # Reiniciar en cada iteración
+                    last_up_ts = None  # Reiniciar en cada iteración
                     if isinstance(last_up_str, str):
-                        try:
-                            last_up_dt = datetime.strptime(
-                                last_up_str, "%Y-%m-%d %H:%M:%S"
-                            )
-                        except ValueError:
+                        last_up_ts = parse_timestamp(last_up_str)
+                        if last_up_ts is None:
                             logger.warning(
                                 f"Formato de fecha inválido para el dispositivo {dev.get('id')}: '{last_up_str}'"
                             )
                             # Si la fecha es inválida, lo tratamos como si no existiera
-                            last_up_dt = None
 
                     # Ahora la lógica es más limpia
-                    if last_up_dt is None:
+                    if last_up_ts is None:
                         # No hay fecha válida, debería estar offline
                         if cur_stat != "offline":
                             new_stat = "offline"
                     else:
                         # Hay fecha válida, comparamos
-                        if (now_dt - last_up_dt) > offline_thresh:
+                        if (now_ts - last_up_ts) > offline_thresh:
                             # Ha pasado demasiado tiempo, está offline
                             if cur_stat != "offline":
                                 new_stat = "offline"